@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import timeit
+import numpy as np
+from cloudyfsps.gridEmulator import gridEmulator
+from cloudyfsps.contPCA import contPCA
+
+# Evaluation rate of gridEmulator on a synthetic logZ x Age x logU grid
+# the size of a large Cloudy run, with the 128 lines of .out_lines and
+# the 1963 FSPS wavelengths of .out_cont: the full (regular) grid, and
+# the same grid with a tenth of its models missing (irregular).
+# Continua are emulated from the full [nmod, 1963] table ('cont') and
+# through their contPCA within 0.01 dex ('cont pca', as
+# gridEmulator.fromStore(tol=0.01)); the continua are smooth in
+# wavelength, as nebular continua are, so the PCA has a few components.
+#
+#    python bench_emulator.py
+
+logZs = np.linspace(-2.0, 0.5, 11)
+ages = np.logspace(5.5, 7.0, 16)
+logUs = np.linspace(-4.0, -1.0, 13)
+npts = 100000
+
+def grid(rng, nflux, smooth=False):
+    Z, A, U = [col.ravel() for col in np.meshgrid(logZs, ages, logUs,
+                                                  indexing='ij')]
+    pars = dict(logZ=Z, Age=A, logU=U)
+    if smooth:
+        t = np.linspace(0., 1., nflux)
+        logA = np.log10(A) - 6.0
+        shape = np.array([np.sin(np.pi*k*t) for k in range(1, 5)])
+        amps = np.column_stack([np.sin(Z+k*logA)*np.cos(U*k) for k in range(4)])
+        logf = (np.dot(amps, shape) + rng.rand(len(Z), nflux)*1.0e-3 -
+                50.0 + Z[:,None] + U[:,None])
+    else:
+        logf = rng.rand(len(Z), nflux)*4.0 - 50.0 + Z[:,None] + U[:,None]
+    return pars, 10.**logf
+
+def points(rng, n):
+    return np.column_stack([rng.uniform(logZs[0], logZs[-1], n),
+                            10.**rng.uniform(5.5, 7.0, n),
+                            rng.uniform(logUs[0], logUs[-1], n)])
+
+def run(name, emu, pts):
+    t = min(timeit.repeat(lambda: emu(pts), number=1, repeat=3))
+    print('{0:<22} {1:>8.0f} points/s'.format(name, len(pts)/t))
+
+if __name__ == '__main__':
+    rng = np.random.RandomState(42)
+    pts = points(rng, npts)
+    for kind, nflux in [('lines', 128), ('cont', 1963), ('cont pca', 1963)]:
+        pars, fluxes = grid(rng, nflux, smooth=(nflux > 1000))
+        keep = rng.rand(len(fluxes)) > 0.1
+        sub = dict([(key, val[keep]) for key, val in pars.items()])
+        if kind == 'cont pca':
+            pca = contPCA.fit(fluxes, tol=0.01)
+            emus = [gridEmulator(pars, pca=pca),
+                    gridEmulator(sub, pca=contPCA.fit(fluxes[keep], tol=0.01))]
+            print('{0}: {1} components'.format(kind, pca.ncomp))
+        else:
+            emus = [gridEmulator(pars, fluxes), gridEmulator(sub, fluxes[keep])]
+        assert emus[0].regular and not emus[1].regular
+        n = npts if nflux < 1000 else npts//10
+        run('{} regular'.format(kind), emus[0], pts[:n])
+        run('{} irregular'.format(kind), emus[1], pts[:n])
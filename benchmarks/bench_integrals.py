@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import os
+import json
+import shutil
+import tempfile
+import timeit
+import numpy as np
+from cloudyfsps.radialStore import radialStore
+from cloudyfsps.gridIntegrals import gridIntegrals
+
+# Volume integrals of a 20k-model grid: gridIntegrals over a synthetic
+# radialStore (20-80 zones per model, 8 emission lines and the 48
+# columns of a .cool file) against the same integrals taken one model
+# at a time, as modObj does (T0, Tpiem, an ion-weighted temperature,
+# get_emis_vol of every line, the cooling fractions of _init_cool).
+# gridIntegrals is timed on first use and once its results are kept.
+#
+#    python bench_integrals.py
+
+nmods = 20000
+nemis = 8
+ncool = 48
+nrep = 3
+
+def make_store(dir_, rng):
+    '''
+    writes PREFIX.radial/ in the layout buildRadial makes
+    '''
+    path = os.path.join(dir_, 'ZAU.radial')
+    os.makedirs(path)
+    nzones = rng.randint(20, 80, nmods)
+    offsets = np.concatenate(([0], np.cumsum(nzones)))
+    n = offsets[-1]
+    dr = rng.uniform(1.0e15, 5.0e15, n)
+    cols = dict(depth=rng.rand(n), dr=dr, radius=1.0e19+np.cumsum(dr),
+                Te=rng.uniform(5.0e3, 1.5e4, n), ne=rng.uniform(80., 120., n),
+                nH=np.full(n, 100.), fillfac=rng.uniform(0.5, 1., n),
+                ion_O=rng.dirichlet(np.ones(4), n),
+                emis=10.**rng.uniform(-25., -20., (n, nemis)),
+                cool=rng.uniform(0., 1.0e-20, (n, ncool)))
+    for col, arr in cols.items():
+        np.save(os.path.join(path, col+'.npy'), arr)
+    np.save(os.path.join(path, 'offsets.npy'), offsets)
+    cool_labels = (['TempK', 'Htotergcm3s', 'Ctotergcm3s', 'x']
+                   +['c{}'.format(i) for i in range(ncool-4)])
+    info = dict(modnums=list(range(1, nmods+1)), columns=sorted(cols),
+                ion_names=dict(O=['O', 'O+', 'O+2', 'O+3']),
+                emis_labels=['e{}'.format(i) for i in range(nemis)],
+                cool_labels=cool_labels)
+    f = open(os.path.join(path, 'info.json'), 'w')
+    json.dump(info, f)
+    f.close()
+    return radialStore(dir_+'/', 'ZAU')
+
+def per_model(rs):
+    '''
+    the integrals of each model, taken from its own zones
+    '''
+    out = dict(T0=[], Tpiem=[], TO2=[], emis=[], Ctot=[], frac_CE=[])
+    for i in range(rs.nmods):
+        def col(name):
+            return np.asarray(rs.model(i, name))
+        dvff = 4.*np.pi*col('radius')**2*col('dr')*col('fillfac')
+        def vol_mean(a, b):
+            return (a*b*dvff).sum()/(b*dvff).sum()
+        Te, nenH = col('Te'), col('ne')*col('nH')
+        T0 = vol_mean(Te, nenH)
+        out['T0'].append(T0)
+        out['Tpiem'].append(vol_mean((Te-T0)**2./nenH, T0**2))
+        out['TO2'].append(vol_mean(Te, nenH*col('ion_O')[:,2]))
+        emis = col('emis')
+        out['emis'].append([(emis[:,j]*dvff).sum() for j in range(nemis)])
+        cool = col('cool')
+        Ctot = (cool[:,2]*dvff).sum()
+        out['Ctot'].append(Ctot)
+        out['frac_CE'].append(np.sum([(cool[:,j]*dvff).sum()/Ctot
+                                      for j in range(4, 32)]))
+    return dict([(key, np.array(val)) for key, val in out.items()])
+
+def grid(rs, gi=None):
+    if gi is None:
+        gi = gridIntegrals(rs)
+    cool = gi.cooling()
+    return dict(T0=gi.T0, Tpiem=gi.Tpiem, TO2=gi.ion_temp('O', 2),
+                emis=gi.emis_vol(), Ctot=cool['Ctot'],
+                frac_CE=cool['frac_cool_CE'])
+
+if __name__ == '__main__':
+    rng = np.random.RandomState(42)
+    dir_ = tempfile.mkdtemp()
+    try:
+        rs = make_store(dir_, rng)
+        ref, got = per_model(rs), grid(rs)
+        for key in ref:
+            assert np.allclose(got[key], ref[key], rtol=1.0e-10, atol=0.), key
+        t_old = min(timeit.repeat(lambda: per_model(rs), number=1, repeat=nrep))
+        t_new = min(timeit.repeat(lambda: grid(rs), number=1, repeat=nrep))
+        gi = gridIntegrals(rs)
+        grid(rs, gi)
+        t_ion = min(timeit.repeat(lambda: gridIntegrals(rs).ion_temp('O', 2),
+                                  number=1, repeat=nrep))
+        t_kept = min(timeit.repeat(lambda: grid(rs, gi), number=100,
+                                   repeat=nrep))/100
+        print('{0} models, {1} zones'.format(rs.nmods, rs.offsets[-1]))
+        print('{0:<24} {1:>10.1f} ms'.format('per model', t_old*1e3))
+        print('{0:<24} {1:>10.1f} ms {2:>8.0f}x'.format('gridIntegrals', t_new*1e3,
+                                                       t_old/t_new))
+        print('{0:<24} {1:>10.1f} ms'.format('ion_temp alone', t_ion*1e3))
+        print('{0:<24} {1:>10.3f} ms'.format('gridIntegrals, kept', t_kept*1e3))
+    finally:
+        shutil.rmtree(dir_)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import timeit
+import numpy as np
+from cloudyfsps.gridMatcher import gridMatcher
+
+# Matching a catalog the size of the SDSS sample to the k nearest models
+# of a large grid in a 3-ratio space (log_NII_Ha, log_OIII_Hb,
+# log_SII_Ha): gridMatcher against a brute-force scan of every model for
+# each object. A tenth of the objects lack one ratio.
+#
+#    python bench_match.py
+
+nmods = 20000
+nobj = 10000
+k = 5
+names = ['log_NII_Ha', 'log_OIII_Hb', 'log_SII_Ha']
+
+def brute(points, x, k):
+    dist = np.empty((len(x), k))
+    inds = np.empty((len(x), k), dtype=int)
+    for n, row in enumerate(x):
+        f = np.isfinite(row)
+        d = np.sqrt(((points[:,f] - row[f])**2).sum(axis=1))
+        inds[n] = np.argsort(d)[:k]
+        dist[n] = d[inds[n]]
+    return dist, inds
+
+if __name__ == '__main__':
+    rng = np.random.RandomState(42)
+    mods = dict([(name, rng.uniform(-2.0, 1.0, nmods)) for name in names])
+    obs = dict([(name, rng.uniform(-2.0, 1.0, nobj)) for name in names])
+    obs['log_SII_Ha'][::10] = np.nan
+    points = np.column_stack([mods[name] for name in names])
+    x = np.column_stack([obs[name] for name in names])
+    def new():
+        return gridMatcher(mods, names).match(obs, k=k)
+    ref, got = brute(points, x, k), new()
+    assert np.allclose(got[0], ref[0]) and (got[1] == ref[1]).all()
+    t_old = min(timeit.repeat(lambda: brute(points, x, k), number=1, repeat=3))
+    t_new = min(timeit.repeat(new, number=1, repeat=3))
+    print('{0} objects, {1} models, k={2}'.format(nobj, nmods, k))
+    print('{0:<12} {1:>10.1f} ms'.format('brute force', t_old*1e3))
+    print('{0:<12} {1:>10.1f} ms {2:>8.0f}x'.format('gridMatcher', t_new*1e3,
+                                                   t_old/t_new))
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import os
+import shutil
+import tempfile
+import timeit
+import numpy as np
+from cloudyfsps.outObj import _scan_out, parseOut, sextract, line_cool
+
+# Compares outObj._scan_out + parseOut with the line-by-line scan and
+# sextract calls modObj._read_out used before, on a synthetic .out file
+# with the summary blocks of a real one: an input SED block, zone
+# printouts for several iterations and a final summary per iteration.
+# That both give the same lines and numbers is tested in
+# tests/test_outParse.py.
+#
+#    python bench_outparse.py
+
+niter = 4
+nzones = 3000
+nrep = 5
+
+def write_out(fname, rng):
+    f = open(fname, 'w')
+    f.write(' '*20+'Cloudy 17.01\n')
+    for i in range(200):
+        f.write(' * input command {0}\n'.format(i))
+    f.write(' '*20+'Hi-Con\n')
+    f.write(' Hi-Con SED summary\n')
+    f.write('  Q(1.0-1.8):  49.900 Q(1.8-4.0):  49.200 Q(4.0-20):  47.900'
+            ' Q(20--):  44.000 Ion pht flx:1.000E+12\n')
+    for i in range(5):
+        f.write(' SED line {0}\n'.format(i+3))
+    f.write('         H :  0.0000  He: -1.0200  C : -3.5700  N : -4.1700'
+            '  O : -3.3100\n')
+    for it in range(niter):
+        for z in range(nzones):
+            f.write(' ####{0:3d}  Te:{1:10.3e} Hden:{2:10.3e} Ne:{3:10.3e}'
+                    ' R:{4:10.3e} R-R0:{5:10.3e}\n'.format(z+1,
+                                                           *rng.rand(5)))
+            f.write(' Hydrogen {0:9.3e} {1:9.3e} H+o/Hden {2:9.3e}'
+                    ' {3:9.3e}\n'.format(*rng.rand(4)))
+            f.write(' Helium   {0:9.3e} {1:9.3e} {2:9.3e}\n'.format(
+                *rng.rand(3)))
+        f.write(' IONIZE PARMET:  U(1)= -2.000  U(sp): {0:.3f}  Q(ion):'
+                '  50.000\n'.format(-2.1-0.01*it))
+        f.write(' Dust to gas ratio (by mass): 6.5e-03, AV(ext): 0.1{0}'
+                ' (pnt): 0.456\n'.format(it))
+        f.write(' ENERGY BUDGET:  Heat: {0:.3f}  Coolg: 38.120  Error:'
+                '  0.1%  Rec Lin: 37.500  F-F  H 0.000\n'.format(38.0+it))
+        f.write(' Cooling: HFBc  1.2345e+35:0.123 HFFc  2.3456e+34:0.045'
+                ' Clin 912.000A:0.012 N  2 6584.00A:0.034 S II 6731.00A:0.021'
+                ' S II 6716.00A:0.028 TOTL 3727.00A:0.111 S  3 9532.00A:0.043'
+                ' O  3 5007.00A:0.222 O  3 4959.00A:0.074\n')
+        f.write(' Heating: BFH1  3.4567e+35:0.876 BFHe 1.0e+34:0.100\n')
+        f.write(' HFBc'+' '*9+'1.23e+35  4.56e+34\n')
+        f.write(' The geometry is spherical.\n')
+    f.close()
+    return
+
+def old_scan(filename):
+    out = {}
+    file_ = open(filename, 'r')
+    for line in file_:
+        line = line.split('\n')[0]
+        if line[0:8] == ' ####  1':
+            out['###First'] = line
+        elif line[0:5] == ' ###':
+            out['###Last'] = line
+        elif 'Hi-Con' in line:
+            for i in range(7):
+                out['SED' + str(i+1)] = next(file_)
+        elif line[0:15] == ' IONIZE PARMET:':
+            out['INZ'] = line
+        elif 'H :' in line:
+            out['gascomp'] = line
+        elif 'Dust to gas ratio' in line:
+            out['dust'] = line
+        elif 'ENERGY BUDGET' in line:
+            out['energy'] = line
+        elif 'Cooling:' in line:
+            out['cool'] = line
+        elif 'Heating:' in line:
+            out['heat'] = line
+        elif line[0:5] == ' HFBc':
+            out['HFBc'] = line
+        elif 'The geometry is' in line:
+            out['geometry'] = line
+    file_.close()
+    return out
+
+def old_fields(out):
+    d = dict()
+    d['H_Rec_Lum'] = float(sextract(sextract(out['HFBc'], 'HFBc', 18), 9, 8))
+    d['strom_logU'] = float(sextract(out['INZ'], 'U(sp):', 'Q(ion):'))
+    bands = ['1.0-1.8', '1.8-4.0', '4.0-20', '20--', 'Ion pht']
+    d['Qarr'] = pow(10., np.array([float(sextract(out['SED2'],
+                                                  'Q({}):'.format(b1),
+                                                  'Q({}):'.format(b2)
+                                                  if b2 != 'Ion pht' else b2))
+                                   for b1, b2 in zip(bands[:-1], bands[1:])]))
+    for key, keyattr in line_cool:
+        if key[0] == 'H':
+            val = float(sextract(sextract(out['cool'], key, 14), ':', 5))
+        else:
+            val = float(sextract(out['cool'], key, 5))
+        d['Cool_'+keyattr] = val
+    d['Heat_BF'] = float(sextract(sextract(out['heat'], 'BFH1', 14), ':', 5))
+    d['Heat'] = float(sextract(out['energy'], 'Heat:', 'Coolg:'))
+    d['Cool'] = float(sextract(out['energy'], 'Coolg:', 'Error:'))
+    d['RecLin'] = float(sextract(out['energy'], 'Rec Lin:', 8))
+    d['gasC'] = float(sextract(out['gascomp'], 'C :', 8))
+    d['gasN'] = float(sextract(out['gascomp'], 'N :', 8))
+    d['gasO'] = float(sextract(out['gascomp'], 'O :', 8))
+    d['DGR'] = float(sextract(out['dust'], '(by mass):', ','))
+    d['Av_ex'] = float(sextract(out['dust'], 'AV(ext):', '(pnt)'))
+    d['Av_pt'] = float(sextract(out['dust'], ' (pnt):'))
+    return d
+
+def old(fname):
+    return old_fields(old_scan(fname))
+
+def new(fname):
+    return parseOut(_scan_out(fname))
+
+if __name__ == '__main__':
+    rng = np.random.RandomState(42)
+    dir_ = tempfile.mkdtemp()
+    try:
+        fname = os.path.join(dir_, 'bench.out')
+        write_out(fname, rng)
+        size = os.path.getsize(fname)/1.0e6
+        t_old = min(timeit.repeat(lambda: old(fname), number=nrep,
+                                  repeat=3))/nrep
+        t_new = min(timeit.repeat(lambda: new(fname), number=nrep,
+                                  repeat=3))/nrep
+        print('{0:.1f} MB .out, {1} iterations'.format(size, niter))
+        print('{0:<12} {1:>10.2f} ms'.format('line scan', t_old*1e3))
+        print('{0:<12} {1:>10.2f} ms'.format('parseOut', t_new*1e3))
+        print('{0:<12} {1:>10.1f}x'.format('speedup', t_old/t_new))
+    finally:
+        shutil.rmtree(dir_)
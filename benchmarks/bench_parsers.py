@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import os
+import shutil
+import tempfile
+import timeit
+import numpy as np
+from cloudyfsps.cloudyParsers import readLin, readCont, readSave, readTable
+from cloudyfsps.cloudyInputTools import emis_lines
+
+# Compares the cloudyParsers readers with the np.genfromtxt calls they
+# replace, on synthetic files with the layout and size of real Cloudy
+# output: the extended line list, a ~9000 point continuum mesh and a
+# deep model with 1000 zones.
+#
+#    python bench_parsers.py
+
+nzones = 1000
+ncont = 9000
+nrep = 10
+
+def write_save(fname, names, nrow, rng, title=None):
+    f = open(fname, 'w')
+    if title is not None:
+        f.write(title+'\n')
+    f.write('#'+'\t'.join(names)+'\n')
+    for row in rng.rand(nrow, len(names)):
+        f.write('\t'.join(['{0:.4e}'.format(x) for x in row])+'\n')
+    f.close()
+
+def make_files(dir_, rng):
+    files = dict()
+    lin = os.path.join(dir_, 'bench.lin')
+    labels = [line.strip() for line in open(os.path.join(os.path.dirname(__file__), '..', 'cloudyfsps', 'data', 'cloudyLinesEXT.dat'))]
+    f = open(lin, 'w')
+    f.write('#lineslist\n#\n')
+    for lab in labels:
+        f.write('{0}\t{1:.4e}\n'.format(lab, rng.rand()*1.0e35))
+    f.close()
+    files['lin'] = lin
+    cont = os.path.join(dir_, 'bench.outwcont')
+    f = open(cont, 'w')
+    f.write('#Cont  nu\tincident\ttrans\tDiffOut\tnet trans\treflc\ttotal\n')
+    for row in rng.rand(ncont, 7):
+        f.write('\t'.join(['{0:.3e}'.format(x) for x in row])+'\n')
+    f.close()
+    files['outwcont'] = cont
+    files['rad'] = os.path.join(dir_, 'bench.rad')
+    write_save(files['rad'], ['depth', 'radius', 'dr'], nzones, rng)
+    files['phys'] = os.path.join(dir_, 'bench.phys')
+    write_save(files['phys'], ['depth', 'Te', 'Htot', 'nH', 'ne', 'v',
+                               'fillfac'], nzones, rng)
+    files['ele_O'] = os.path.join(dir_, 'bench.ele_O')
+    write_save(files['ele_O'], ['depth']+['O']*9, nzones, rng)
+    emis = [lab for lab in emis_lines.strip().split('\n')[:-1]]
+    files['emis'] = os.path.join(dir_, 'bench.emis')
+    write_save(files['emis'], ['depth']+emis, nzones, rng)
+    files['lineflux'] = os.path.join(dir_, 'bench.lineflux')
+    np.savetxt(files['lineflux'], rng.rand(len(labels), 2), fmt=str('%4.6e'))
+    return files
+
+def bench(name, new, old):
+    t_new = min(timeit.repeat(new, number=nrep, repeat=3))/nrep
+    t_old = min(timeit.repeat(old, number=nrep, repeat=3))/nrep
+    print('{0:<10} {1:>10.2f} {2:>10.2f} {3:>8.1f}x'.format(name, t_old*1e3,
+                                                          t_new*1e3,
+                                                          t_old/t_new))
+
+def check(a, b):
+    if a.dtype.names is None:
+        assert np.array_equal(a, b)
+    else:
+        assert a.dtype.names == b.dtype.names
+        for name in a.dtype.names:
+            assert np.array_equal(a[name], b[name])
+
+if __name__ == '__main__':
+    rng = np.random.RandomState(42)
+    dir_ = tempfile.mkdtemp()
+    try:
+        fl = make_files(dir_, rng)
+        def gen_lin():
+            dat = np.genfromtxt(fl['lin'], skip_header=2, delimiter='\t',
+                                dtype='S20,f8')
+            return np.array([d[1] for d in dat])
+        def gen_save(key):
+            return np.genfromtxt(fl[key], delimiter='\t', comments=';',
+                                 names=True)
+        check(readLin(fl['lin']), gen_lin())
+        check(readCont(fl['outwcont']),
+              np.genfromtxt(fl['outwcont'], skip_header=1))
+        check(readTable(fl['lineflux']), np.genfromtxt(fl['lineflux']))
+        for key in ['rad', 'phys', 'ele_O', 'emis']:
+            check(readSave(fl[key]), gen_save(key))
+        print('{0:<10} {1:>10} {2:>10} {3:>9}'.format('file', 'genfromtxt',
+                                                      'parser', 'speedup'))
+        print('{0:<10} {1:>10} {2:>10}'.format('', '(ms)', '(ms)'))
+        bench('.lin', lambda: readLin(fl['lin']), gen_lin)
+        bench('.outwcont', lambda: readCont(fl['outwcont']),
+              lambda: np.genfromtxt(fl['outwcont'], skip_header=1))
+        bench('.lineflux', lambda: readTable(fl['lineflux']),
+              lambda: np.genfromtxt(fl['lineflux']))
+        for key in ['rad', 'phys', 'ele_O', 'emis']:
+            bench('.'+key, lambda: readSave(fl[key]),
+                  lambda: gen_save(key))
+    finally:
+        shutil.rmtree(dir_)
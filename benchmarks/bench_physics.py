@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import timeit
+import numpy as np
+try:
+    from scipy.integrate import simps
+except ImportError:
+    from scipy.integrate import simpson as simps
+from cloudyfsps.generalTools import (calcU, calcForLogQ, air_to_vac,
+                                     calcU_avg, calcRs)
+
+# Compares the array versions of the generalTools helpers with the
+# scalar versions they replace (copied below), called once per element,
+# on a million inputs that mix the units the helpers guess: Rinner in
+# pc, log cm and cm, Q and log Q, UV and optical wavelengths. calcU_avg
+# and calcRs take a stack of spectra (and arrays of nh, eff, mass) at
+# once, against a call per spectrum.
+#
+#    python bench_physics.py
+
+n = 1000000
+nspec = 5000
+nlam = 1000
+
+def old_calcU(Rinner=0.01, nh=30.0, Q=None):
+    if Q < 100.:
+        Q = 10.**Q
+    if Rinner < 16.:
+        Rin = Rinner*3.09e18
+    elif (Rinner >= 16. and Rinner <= 30.):
+        Rin = 10.**Rinner
+    else:
+        Rin = Rinner
+    c = 2.9979e10
+    return Q/(4.0*np.pi*Rin**2.0*nh*c)
+
+def old_calcForLogQ(logU=None, Rinner=None, nh=None):
+    c = 2.9979e10
+    if Rinner > 500.0:
+        Rin = Rinner
+    else:
+        Rin = Rinner*3.09e18
+    Q = 10.0**logU*(4.0*np.pi*Rin**2.0*nh*c)
+    return np.log10(Q)
+
+def old_air_to_vac(wl):
+    to_vac = lambda lam: (6.4328e-5 + (2.94981e-2/(146.0-(1.0e4/lam)**2.0)) + (2.554e-4/(41.0-(1.0e4/lam)**2.0)))*lam + lam
+    return np.array([to_vac(lam) if lam > 2000.0 else lam for lam in wl])
+
+def old_calcQ(lamin, specin, mstar=1.0):
+    c = 2.9979e18
+    h = 6.626e-27
+    inds, = np.nonzero(lamin <= 911.6)
+    lam = lamin[inds]
+    spec = specin[inds]
+    integrand = lam*spec/(h*c)
+    return simps(integrand, x=lam)*mstar
+
+def old_calcU_avg(lamin, specin, Rinner=0.01, nh=100.0, eff=1.0, mass=1.0):
+    Q = old_calcQ(lamin, specin)*mass
+    alphab = 2.59e-13
+    c = 2.9979e10
+    return ((3.0*Q*nh*eff**2)/(4.0*np.pi))**(1./3)*alphab**(2./3)/c
+
+def old_calcRs(lamin, specin, eff=1.0, nh=100.0):
+    alphab = 2.59e-13
+    Q = old_calcQ(lamin, specin)
+    return (3.0*Q/(4.0*np.pi*nh*nh*eff*alphab))**(1./3)
+
+def spectra(rng):
+    '''
+    nspec spectra (erg/s/A) on an uneven grid through the Lyman limit
+    '''
+    lam = np.sort(10.**rng.uniform(2., 4., nlam))
+    specs = 10.**(30.+rng.normal(size=(nspec, 1))
+                  +2.*np.log10(lam/911.6)*rng.uniform(0.5, 2., (nspec, 1)))
+    return dict(lam=lam, specs=specs, nh=10.**rng.uniform(0., 4., nspec),
+                eff=rng.uniform(0.1, 1., nspec),
+                mass=10.**rng.uniform(3., 6., nspec))
+
+def inputs(rng):
+    kind = rng.randint(3, size=n)
+    Rinner = np.choose(kind, [rng.uniform(0.01, 15., n),
+                              rng.uniform(16., 30., n),
+                              10.**rng.uniform(31., 40., n)])
+    Q = np.where(rng.rand(n) < 0.5, rng.uniform(45., 53., n),
+                 10.**rng.uniform(45., 53., n))
+    return dict(Rinner=Rinner, Q=Q, nh=10.**rng.uniform(0., 4., n),
+                logU=rng.uniform(-4., -1., n),
+                lam=rng.uniform(912., 1.0e5, n))
+
+def run(name, old, new, nrep=1, rtol=1e-14):
+    ref = old()
+    assert np.allclose(new(), ref, rtol=rtol, atol=0.), name
+    t_old = min(timeit.repeat(old, number=nrep, repeat=3))/nrep
+    t_new = min(timeit.repeat(new, number=nrep, repeat=3))/nrep
+    print('{0:<12} {1:>10.1f} ms {2:>10.2f} ms {3:>8.0f}x'.format(
+        name, t_old*1e3, t_new*1e3, t_old/t_new))
+
+if __name__ == '__main__':
+    d = inputs(np.random.RandomState(42))
+    sp = spectra(np.random.RandomState(43))
+    print('{0} inputs'.format(n))
+    print('{0:<12} {1:>13} {2:>13} {3:>9}'.format('', 'scalar', 'array',
+                                                  'speedup'))
+    run('calcU',
+        lambda: np.array([old_calcU(Rinner=R, nh=nh, Q=Q) for R, nh, Q
+                          in zip(d['Rinner'], d['nh'], d['Q'])]),
+        lambda: calcU(Rinner=d['Rinner'], nh=d['nh'], Q=d['Q']))
+    run('calcForLogQ',
+        lambda: np.array([old_calcForLogQ(logU=U, Rinner=R, nh=nh)
+                          for U, R, nh in zip(d['logU'], d['Rinner'],
+                                              d['nh'])]),
+        lambda: calcForLogQ(logU=d['logU'], Rinner=d['Rinner'], nh=d['nh']))
+    run('air_to_vac',
+        lambda: old_air_to_vac(d['lam']),
+        lambda: air_to_vac(d['lam']))
+    print('{0} spectra, {1} wavelengths'.format(nspec, nlam))
+    # the weights of calcQs sum in another order than simps
+    run('calcU_avg',
+        lambda: np.array([old_calcU_avg(sp['lam'], spec, nh=nh, eff=eff,
+                                        mass=m) for spec, nh, eff, m
+                          in zip(sp['specs'], sp['nh'], sp['eff'],
+                                 sp['mass'])]),
+        lambda: calcU_avg(sp['lam'], sp['specs'], nh=sp['nh'], eff=sp['eff'],
+                          mass=sp['mass']), rtol=1e-12)
+    run('calcRs',
+        lambda: np.array([old_calcRs(sp['lam'], spec, eff=eff, nh=nh)
+                          for spec, nh, eff in zip(sp['specs'], sp['nh'],
+                                                   sp['eff'])]),
+        lambda: calcRs(sp['lam'], sp['specs'], eff=sp['eff'], nh=sp['nh']),
+        rtol=1e-12)
@@ -12,4 +12,4 @@ except KeyError:
 
 __version__ = "0.1"
 
-__all__ = ["generalTools", "cloudyInputTools", "ASCIItools", "cloudyOutputTools", "outputFormatting", "nebAbundTools", "outObj"]
+__all__ = ["generalTools", "dataTools", "cloudyParsers", "gridStore", "gridIndex", "radialStore", "gridIntegrals", "gridEmulator", "contPCA", "lineRatios", "gridMatcher", "cloudyInputTools", "ASCIItools", "cloudyOutputTools", "outputFormatting", "fspsTables", "nebAbundTools", "outObj"]
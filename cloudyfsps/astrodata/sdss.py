@@ -6,40 +6,31 @@ from __future__ import (division, print_function, absolute_import,
 __all__ = ["plot_bpt"]
 import numpy as np
 import pkg_resources
+from ..lineRatios import ratioTable
 from .kewley import (NII_OIII_agn_lim, NII_OIII_sf_lim,
                      OI_OIII_agn_lim, SII_OIII_agn_lim)
 import matplotlib.pyplot as plt
 import matplotlib.colors as mpl_colors
 from matplotlib import cm as cmx
 
+# ratios of load_spec, from the strength_* columns (see lineRatios)
+sdss_ratios = ['log_OIII_OII', 'log_NII_OII', 'log_OIII_Hb', 'log_OIIIb_Hb',
+               'log_NII_Ha', 'log_NIIb_Ha', 'log_SII_Ha', 'log_OI_Ha',
+               'log_OIa_Ha', 'log_OII_Ha', 'HaHb', 'R23']
+
 def load_spec():
     linefile = pkg_resources.resource_filename(__name__, "data/sdss_data_ls.npz")
     data = np.load(linefile)
     i, = np.where((data['lineindex_cln'] == 4) | (data['lineindex_cln'] == 5))
     outdata = dict()
-    for key, val in data.iteritems():
-        outdata[key] = val
-    def logify(a,b):
-        if a is None or b is None:
-            to_return = None
-        else:
-            np.seterr(all="ignore")
-            to_return = np.log10(a/b)
-            np.seterr(all=None)
-        return to_return
-    outdata['log_OIII_OII'] = logify(data['strength_OIII'][i], data['strength_OII'][i])
-    outdata['log_NII_OII'] = logify(data['strength_NII'][i], data['strength_OII'][i])
-    outdata['log_OIII_Hb'] = logify(data['strength_OIII'][i], data['strength_Hb'][i])
-    outdata['log_OIIIb_Hb'] = logify(data['strength_OIIIb'][i], data['strength_Hb'][i])
-    outdata['log_NII_Ha'] = logify(data['strength_NII'][i], data['strength_Ha'][i])
-    outdata['log_NIIb_Ha'] = logify(data['strength_NIIb'][i], data['strength_Ha'][i])
-    outdata['log_SII_Ha'] = logify(data['strength_SII'][i], data['strength_Ha'][i])
-    outdata['log_OI_Ha'] = logify(data['strength_OI'][i], data['strength_Ha'][i])
-    outdata['log_OIa_Ha'] = logify(data['strength_OIa'][i], data['strength_Ha'][i])
-    outdata['log_OII_Ha'] = logify(data['strength_OII'][i], data['strength_Ha'][i])
-    outdata['log_OIII_OII'] = logify(data['strength_OIII'][i], data['strength_OII'][i])
-    outdata['HaHb'] = data['strength_Ha'][i]/data['strength_Hb'][i]
-    outdata['R23'] = np.log10((data['strength_OII'][i] + data['strength_OIII'][i])/data['strength_Hb'][i])
+    for key in data.files:
+        outdata[key] = data[key]
+    # strength_NII is [N II] 6548+6584, etc.
+    rt = ratioTable(dict([(key[len('strength_'):], outdata[key][i])
+                          for key in data.files
+                          if key.startswith('strength_')]))
+    for name in sdss_ratios:
+        outdata[name] = rt[name]
     return outdata
 
 def get_line_ratio(data, line_ratio, **kwargs):
@@ -3,11 +3,12 @@
 
 from __future__ import (division, print_function, absolute_import,
                         unicode_literals)
-__all__ = ["plot_bpt", "plot_NO"]
+__all__ = ["plot_bpt", "plot_NO", "get_vz_lines", "vz_ratios"]
 
 import numpy as np
 import matplotlib.pyplot as plt
 import pkg_resources
+from ..lineRatios import ratioTable
 
 def plot_bpt(var_label, ax=None, line_ratio='NII', **kwargs):
     '''
@@ -18,8 +19,10 @@ def plot_bpt(var_label, ax=None, line_ratio='NII', **kwargs):
         lab = kwargs.get('lab', 'Van Zee (1998)')
     else:
         lab = '__nolegend__'
-    linefile = pkg_resources.resource_filename(__name__, "data/vanzee_lines.dat")
-    OII,e_OII,NeIII,e_NeIII,OIII,e_OIII,OI,e_OI,SIII,e_SIII,Ha,e_Ha,NII,e_NII,SII,e_SII,ArIII,e_ArIII,cHb,e_cHb = np.genfromtxt(linefile, delimiter=';', comments='#', unpack=True)
+    data = get_vz_lines()
+    rt = vz_ratios(data)
+    OII, e_OII = data['OII'], data['e_OII']
+    OIII, e_OIII = data['OIII'], data['e_OIII']
     # Van Zee uses [O III] 4959 + 5007 and [N II] 6548 + 6584
     # removing contribution from doublet lines I_b = 2.88*I_a
     if line_ratio[-1] == 'a' or line_ratio[-1] == 'b':
@@ -27,34 +30,36 @@ def plot_bpt(var_label, ax=None, line_ratio='NII', **kwargs):
     else:
         corr=0.0
     # assume standard y axis
-    y = np.log10(OIII) + corr
+    y = rt['log_OIII_Hb'] + corr
     yerr = e_OIII/(OIII*np.log(10))
     def calc_err(x, xerr, y, yerr):
         err = ((xerr/(x*np.log(10)))**2.0 + (yerr/(y*np.log(10)))**2.0)**0.5
         return err
+    def ha_err(line):
+        return calc_err(data[line], data['e_'+line], data['Ha'], data['e_Ha'])
     if line_ratio[0] == 'N':
-        x = np.log10(NII/Ha) + corr
-        xerr = calc_err(NII, e_NII, Ha, e_Ha)
+        x = rt['log_NII_Ha'] + corr
+        xerr = ha_err('NII')
     if line_ratio[0] == 'S':
-        x = np.log10(SII/Ha) + corr
-        xerr = calc_err(SII, e_SII, Ha, e_Ha)
+        x = rt['log_SII_Ha'] + corr
+        xerr = ha_err('SII')
     if line_ratio == 'OI':
-        x = np.log10(OI/Ha) + corr
-        xerr = calc_err(OI, e_OI, Ha, e_Ha)
+        x = rt['log_OI_Ha'] + corr
+        xerr = ha_err('OI')
     if line_ratio == 'OII':
-        y = np.log10(OIII/OII)
+        y = rt['log_OIII_OII']
         yerr = calc_err(OIII, e_OIII, OII, e_OII)
-        x = np.log10(NII/OII)
-        xerr = calc_err(NII, e_NII, OII, e_OII)
+        x = rt['log_NII_OII']
+        xerr = calc_err(data['NII'], data['e_NII'], OII, e_OII)
     if line_ratio == 'R23':
-        y = np.log10(OIII/OII)
+        y = rt['log_OIII_OII']
         yerr = calc_err(OIII, e_OIII, OII, e_OII)
-        x = np.log10(OII + OIII)
+        x = rt['R23']
         xerr = e_OIII/(OIII*np.log(10))
     if line_ratio == 'NeIII':
-        y = np.log10(NeIII/OII)
-        yerr = calc_err(NeIII, e_NeIII, OII, e_OII)
-        x = np.log10(OII + OIII)
+        y = rt['log_NeIIIb_OII']
+        yerr = calc_err(data['NeIII'], data['e_NeIII'], OII, e_OII)
+        x = rt['R23']
         xerr = e_OIII/(OIII*np.log(10))
     if ax is None:
         ax = plt.gca()
@@ -82,10 +87,34 @@ def getLineRatio(name, lines):
              'NII': logify(lnames='F6584', denom='F6563')}
     return ldict[name]
 
+# columns of data/vanzee_lines.dat
+vz_names = ['OII', 'e_OII', 'NeIII', 'e_NeIII', 'OIII', 'e_OIII', 'OI', 'e_OI',
+            'SIII', 'e_SIII', 'Ha', 'e_Ha', 'NII', 'e_NII', 'SII', 'e_SII',
+            'ArIII', 'e_ArIII', 'cHb', 'e_cHb']
+
 def get_vz_lines():
+    '''
+    returns dict of the line strengths (relative to Hb) and their errors
+    e_<line>, with keys vz_names
+    OIII is [O III] 4959+5007, NII is [N II] 6548+6584, NeIII is 3869
+    '''
     linefile = pkg_resources.resource_filename(__name__, "data/vanzee_lines.dat")
-    OII,e_OII,NeIII,e_NeIII,OIII,e_OIII,OI,e_OI,SIII,e_SIII,Ha,e_Ha,NII,e_NII,SII,e_SII,ArIII,e_ArIII,cHb,e_cHb = np.genfromtxt(linefile, delimiter=';', comments='#', unpack=True)
-    return
+    cols = np.genfromtxt(linefile, delimiter=';', comments='#', unpack=True)
+    return dict(zip(vz_names, cols))
+
+def vz_ratios(data=None):
+    '''
+    rt = vz_ratios()
+    rt['log_NII_Ha'], rt['R23'], ... (see lineRatios.ratioTable)
+    '''
+    if data is None:
+        data = get_vz_lines()
+    lines = dict([(name, data[name]) for name in vz_names
+                  if not name.startswith('e_') and name != 'cHb'])
+    lines['NeIIIb'] = lines.pop('NeIII')
+    lines['Hb'] = np.ones_like(data['Ha'])
+    return ratioTable(lines)
+
 def get_bond_lines():
     '''
     returns data, with column names
@@ -6,18 +6,24 @@ from __future__ import division
 from __future__ import absolute_import
 from builtins import zip
 from builtins import range
+from builtins import str as newstr
 import os
+import re
 import numpy as np
 import subprocess
 import pkg_resources
 from .generalTools import calcForLogQ
 from .nebAbundTools import getNebAbunds
+from .dataTools import getCloudyLines, cached
 
 def cloudyInput(dir_, model_name, **kwargs):
     '''
     cloudyInput('./test/', 'ZAU115', logZ=-1.5, age=5.0e6, logU=-4.0)
     writes standard cloudy input to ./test/ZAU115.in
     defaults: 1Myr, logZ=-0.5, logU=-2.0, nH=100, r_inner=3 pc
+    output_profile: 'lines', 'lines+cont', 'radial', 'full' or a list
+    of save_cmds keys. default is 'full' if extra_output else 'lines+cont'.
+    line_list: line list file, or list of labels from cloudyLinesEXT.dat
     '''
     pars = {"age":1.0e6, #age in years
             "logZ": -0.5, #logZ/Zsol (-2.0 to 0.2)
@@ -35,6 +41,8 @@ def cloudyInput(dir_, model_name, **kwargs):
             "efrac":-1.0,
             "extras":"",
             "extra_output":True,
+            "output_profile":None,
+            "line_list":None,
             "to_file":True,
             "verbose":False,
             "par1":"age",
@@ -50,7 +58,7 @@ def cloudyInput(dir_, model_name, **kwargs):
     # -----
     if pars["to_file"]:
         file_name = dir_+model_name+".in"
-        f = file(file_name, "w")
+        f = open(file_name, "w")
     def this_print(s, eol=True):
         if s is None:
             print('"None" parameter not printed')
@@ -103,10 +111,16 @@ def cloudyInput(dir_, model_name, **kwargs):
         r_out = np.log10(pars['r_inner']*pc_to_cm)
     else:
         r_out = pars['r_inner']
-    if pars['use_extended_lines']:
+    if pars['line_list'] is not None:
+        if isinstance(pars['line_list'], (str, newstr)):
+            linefile = pars['line_list']
+        else:
+            linefile = writeLineList(dir_, model_name, pars['line_list'])
+    elif pars['use_extended_lines']:
         linefile = pkg_resources.resource_filename(__name__,'data/cloudyLinesEXT.dat')
     else:
         linefile = pkg_resources.resource_filename(__name__, 'data/cloudyLines.dat')
+    products = getProducts(pars['output_profile'], pars['extra_output'])
     this_print('radius {0:.3f} log'.format(r_out))
     this_print('hden {0:.3f} log'.format(np.log10(pars['dens'])))
     this_print('{}'.format(pars['geometry']))
@@ -114,31 +128,15 @@ def cloudyInput(dir_, model_name, **kwargs):
     this_print('iterate to convergence max=5')
     this_print('stop temperature 100.0')
     this_print('stop efrac {0:.2f}'.format(pars['efrac']))
-    this_print('save last linelist ".lin" "{}" absolute column'.format(linefile))
-    this_print('save last outward continuum ".outwcont" units Angstrom no title')
-    this_print('save last incident continuum ".inicont" units Angstrom no title')
+    for product in products:
+        this_print(save_cmds[product].format(linefile=linefile))
     if len(pars["extras"]) > 0:
         this_print(pars["extras"])
-    if pars["extra_output"]:
-        this_print(extra_str)
     if pars["verbose"]:
         print("Input written in {0}".format(file_name))
         f.close()
 
-extra_str = '''
-save last radius ".rad"
-save last physical conditions ".phys"
-save last element hydrogen ".ele_H"
-save last element helium ".ele_He"
-save last element carbon ".ele_C"
-save last element nitrogen ".ele_N"
-save last element oxygen ".ele_O"
-save last element sulphur ".ele_S"
-save last element silicon ".ele_Si"
-save last element iron ".ele_Fe"
-save last hydrogen Lya ".H_lya"
-save last hydrogen ionization ".H_ion"
-save last lines emissivity ".emis"
+emis_lines = '''
 H  1 6562.85A
 H  1 4861.36A
 H  1 4340.49A
@@ -172,6 +170,136 @@ C  3 1907.00A
 end of lines
 '''
 
+# Cloudy save command for each output product, keyed by file suffix
+save_cmds = {"lin":'save last linelist ".lin" "{linefile}" absolute column',
+             "outwcont":'save last outward continuum ".outwcont" units Angstrom no title',
+             "inicont":'save last incident continuum ".inicont" units Angstrom no title',
+             "rad":'save last radius ".rad"',
+             "phys":'save last physical conditions ".phys"',
+             "ele_H":'save last element hydrogen ".ele_H"',
+             "ele_He":'save last element helium ".ele_He"',
+             "ele_C":'save last element carbon ".ele_C"',
+             "ele_N":'save last element nitrogen ".ele_N"',
+             "ele_O":'save last element oxygen ".ele_O"',
+             "ele_S":'save last element sulphur ".ele_S"',
+             "ele_Si":'save last element silicon ".ele_Si"',
+             "ele_Fe":'save last element iron ".ele_Fe"',
+             "H_lya":'save last hydrogen Lya ".H_lya"',
+             "H_ion":'save last hydrogen ionization ".H_ion"',
+             "emis":'save last lines emissivity ".emis"'+emis_lines,
+             "heat":'save last heating ".heat"',
+             "cool":'save last cooling ".cool"'}
+
+ele_products = ("ele_H", "ele_He", "ele_C", "ele_N",
+                "ele_O", "ele_S", "ele_Si", "ele_Fe")
+# named sets of products; "full" is what extra_output=True used to write
+output_profiles = {"lines":("lin",),
+                   "lines+cont":("lin", "outwcont", "inicont"),
+                   "radial":("lin", "rad", "phys")+ele_products+("emis",),
+                   "full":(("lin", "outwcont", "inicont", "rad", "phys")
+                           +ele_products+("H_lya", "H_ion", "emis"))}
+
+extra_str = "\n".join([save_cmds[key] for key in output_profiles["full"][3:]])
+
+def getProducts(output_profile=None, extra_output=False):
+    '''
+    getProducts('lines+cont') -> ('lin', 'outwcont', 'inicont')
+    getProducts(['lin', 'rad', 'phys'])
+    returns the file suffixes Cloudy will save for a named output
+    profile, or for a sequence of suffixes from save_cmds.
+    '''
+    if output_profile is None:
+        if extra_output:
+            output_profile = "full"
+        else:
+            output_profile = "lines+cont"
+    if isinstance(output_profile, (str, newstr)):
+        if output_profile in output_profiles:
+            return output_profiles[output_profile]
+        products = (output_profile,)
+    else:
+        products = tuple(output_profile)
+    bad = [key for key in products if key not in save_cmds]
+    if len(bad) > 0:
+        raise ValueError("unknown products {}; profile must be one of {} "
+                         "or a sequence from {}".format(bad,
+                                                        list(output_profiles.keys()),
+                                                        list(save_cmds.keys())))
+    return products
+
+def getLineList(line_file=None):
+    '''
+    returns the Cloudy line labels in a line list file
+    (default data/cloudyLinesEXT.dat)
+    '''
+    if line_file is None:
+        return list(getCloudyLines(use_extended_lines=True))
+    f = open(line_file, "r")
+    labels = [line.rstrip("\n") for line in f if len(line.strip()) > 0]
+    f.close()
+    return labels
+
+def lineListIndex(labels):
+    '''
+    lineListIndex(['H  1 6562.85A', 'O  3 5007.00A'])
+    returns the position of each line label in data/cloudyLinesEXT.dat,
+    which is also its position in data/refLinesEXT.dat.
+    '''
+    ext_keys = cached('cloudyLinesEXT_index',
+                      lambda: dict((" ".join(lab.split()), i)
+                                   for i, lab in enumerate(getLineList())))
+    inds = []
+    for lab in labels:
+        key = " ".join(lab.split())
+        if key not in ext_keys:
+            raise ValueError("{} is not in cloudyLinesEXT.dat".format(lab))
+        inds.append(ext_keys[key])
+    return np.array(inds, dtype=int)
+
+def writeLineList(dir_, mod_prefix, labels):
+    '''
+    writeLineList('./output/', 'ZAU', ['H  1 6562.85A', 'O  3 5007.00A'])
+    writes the subset of cloudyLinesEXT.dat to ./output/ZAU.linelist
+    and returns the file name
+    '''
+    inds = lineListIndex(labels)
+    ext_labels = getLineList()
+    outfile = "{}{}.linelist".format(dir_, mod_prefix)
+    f = open(outfile, "w")
+    for i in inds:
+        f.write(ext_labels[i]+"\n")
+    f.close()
+    return outfile
+
+def writeProductFile(dir_, mod_prefix, products):
+    '''
+    records the products saved by each model in PREFIX.products
+    so the output readers know which files to expect.
+    '''
+    outfile = "{}{}.products".format(dir_, mod_prefix)
+    f = open(outfile, "w")
+    f.write(" ".join(products)+"\n")
+    f.close()
+    return outfile
+
+def getGridProducts(dir_, mod_prefix):
+    '''
+    reads PREFIX.products and PREFIX.linelist, if they were written.
+    returns (products, line_file); either is None for grids written
+    before output profiles existed.
+    '''
+    prodfile = "{}{}.products".format(dir_, mod_prefix)
+    linefile = "{}{}.linelist".format(dir_, mod_prefix)
+    if os.path.exists(prodfile):
+        f = open(prodfile, "r")
+        products = tuple(f.read().split())
+        f.close()
+    else:
+        products = None
+    if not os.path.exists(linefile):
+        linefile = None
+    return products, linefile
+
 def writeMake(dir_=None):
     '''
     writes makefile that runs Cloudy on all files in directory with
@@ -208,10 +336,14 @@ def runMake(dir_=None, n_proc=1, model_name=None):
     proc = subprocess.Popen(to_run, shell=True, stdout=stdout, stdin=stdin)
     proc.communicate()
 
+# columns of PREFIX.pars written by printParFile; any further columns
+# are named par8, par9, ... (see outputFormatting.readModPars)
+par_names = ["mod_num", "logZ", "Age", "logU", "logR", "logQ", "nH", "efrac"]
+
 def printParFile(dir_, mod_prefix, pars):
     '''
     prints parameter file for easy parsing later
-    modnum, Z, a, U, R, logQ, n, efrac
+    modnum, Z, a, U, R, logQ, n, efrac (par_names)
     '''
     outfile = "{}{}.pars".format(dir_, mod_prefix)
     f = open(outfile, "w")
@@ -230,6 +362,9 @@ def writeParamFiles(**kwargs):
     for making grids of parameters.
     can pass arrays of ages, logZs, logUs, nHs.
     cloudy_input.param_files(extras='extra line to add to input')
+    output_profile and line_list are passed on to cloudyInput; the
+    products are recorded in PREFIX.products and the line list (labels,
+    or a line list file) is written once to PREFIX.linelist.
     '''
     nom_dict = {"dir_":"./output/",
                 "model_prefix":"ZAU",
@@ -251,7 +386,9 @@ def writeParamFiles(**kwargs):
                 "geometry":"sphere",
                 "write_makefile":False,
                 "extras":"",
-                "extra_output":False}
+                "extra_output":False,
+                "output_profile":None,
+                "line_list":None}
     for key, val in list(kwargs.items()):
         nom_dict[key] = val
     pars = kwargs.get("pars", None)
@@ -259,12 +396,32 @@ def writeParamFiles(**kwargs):
         print("{} ages, {} logZs, {} logUs".format(len(nom_dict["ages"]),
                                                    len(nom_dict["logZs"]),
                                                    len(nom_dict["logUs"])))
-        pars = [(Z, a, U, R, calcForLogQ(logU=U, Rinner=10.0**R, nh=n), n, efrac) for Z in nom_dict["logZs"] for a in nom_dict["ages"] for U in nom_dict["logUs"] for R in nom_dict["r_inners"] for n in nom_dict["nhs"] for efrac in nom_dict["efracs"]]
+        pars = [(Z, a, U, R, n, efrac) for Z in nom_dict["logZs"] for a in nom_dict["ages"] for U in nom_dict["logUs"] for R in nom_dict["r_inners"] for n in nom_dict["nhs"] for efrac in nom_dict["efracs"]]
+        U, R, n = np.array(pars, dtype=float).reshape(-1, 6)[:,2:5].T
+        logQs = calcForLogQ(logU=U, Rinner=10.0**R, nh=n)
+        pars = [par[:4]+(logQ,)+par[4:] for par, logQ in zip(pars, logQs)]
     # Z, a, U, R, Q, n, efrac
     print("{} models".format(len(pars)))
     full_model_names = ["{}{}".format(nom_dict["model_prefix"], n+1)
                         for n in range(len(pars))]
     printParFile(nom_dict["dir_"], nom_dict["model_prefix"], pars)
+    products = getProducts(nom_dict["output_profile"], nom_dict["extra_output"])
+    # files saved through extras, e.g. 'save last cooling ".cool"'
+    extra_products = tuple(key for key in re.findall(r'^\s*save.*"\.(\w+)"',
+                                                      nom_dict["extras"],
+                                                      flags=re.M|re.I)
+                           if key not in products)
+    writeProductFile(nom_dict["dir_"], nom_dict["model_prefix"],
+                     products+extra_products)
+    line_list = nom_dict["line_list"]
+    if line_list is not None:
+        if isinstance(line_list, (str, newstr)):
+            line_list = getLineList(line_list)
+        # one line list for the whole grid, not one per model; the
+        # output readers take the line wavelengths from PREFIX.linelist
+        line_list = os.path.abspath(writeLineList(nom_dict["dir_"],
+                                                  nom_dict["model_prefix"],
+                                                  line_list))
     #--------------------------------------------
     for par, name in zip(pars, full_model_names):
         cloudyInput(nom_dict["dir_"],
@@ -284,7 +441,9 @@ def writeParamFiles(**kwargs):
                     verbose=nom_dict["verbose"],
                     geometry=nom_dict["geometry"],
                     extras=nom_dict["extras"],
-                    extra_output=nom_dict["extra_output"])
+                    extra_output=nom_dict["extra_output"],
+                    output_profile=products,
+                    line_list=line_list)
     #--------------------------------------------
     if nom_dict["write_makefile"]:
         writeMake(dir_=nom_dict["dir_"])
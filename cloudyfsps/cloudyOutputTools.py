@@ -8,11 +8,18 @@ from builtins import str as newstr
 from builtins import range
 #__all__ = ["format_output"]
 
+import os
+import time
 import numpy as np
+import hashlib
 import subprocess
-import pkg_resources
+import multiprocessing
 from .generalTools import air_to_vac
-from scipy.interpolate import interp1d
+from .cloudyInputTools import getGridProducts, getLineList, lineListIndex
+from .dataTools import getRefLines, getRefSort, getFSPSlam, cached
+from .cloudyParsers import readLin, readCont, readTable
+from .gridStore import gridStore, storeExists
+from scipy import sparse
 ###
 # ***.lin: [cloudy_ID, flux]
 # ***.lineflux: [sorted_vac_wl, flux]
@@ -23,10 +30,84 @@ from scipy.interpolate import interp1d
 # ***.contflux: [wl, incid_out, atten_out, diffuse_out]
 # ***.out_cont: [ang, diffuse_out]
 ###
-def formatCloudyOutput(dir_, model_prefix, modnum, modpars, use_extended_lines=False, write_line_lum=False, **kwargs):
+# PREFIX.grid/: line fluxes and diffuse continua of every model
+#               (units of ***.out_lines, ***.out_cont), see gridStore
+###
+def getLineWavs(use_extended_lines=False, line_list=None):
+    '''
+    wl, sinds = getLineWavs()
+    vacuum wavelengths of the lines in a .lin file, and the permutation
+    that sorts them. line_list is a user line list file (a subset of
+    the extended list), read again if the file changed.
+    '''
+    if line_list is None:
+        return (getRefLines(use_extended_lines)['wav'],
+                getRefSort(use_extended_lines))
+    def load():
+        wl = getRefLines(True)['wav'][lineListIndex(getLineList(line_list))]
+        return wl, np.argsort(wl)
+    return cached(('linelist', line_list, os.path.getmtime(line_list)), load)
+
+def getResampleOperator(ang):
+    '''
+    R = getResampleOperator(cont_data[:,0])
+    sparse (n_fsps x n_cloudy) matrix that linearly interpolates a
+    continuum column, in Cloudy's file order (air wavelengths, any
+    order), onto the FSPS wavelength array in vacuum. zero outside
+    the Cloudy mesh, like interp1d(fill_value=0.0, bounds_error=False).
+    duplicate wavelengths are ordered as interp1d orders the reversed
+    columns (Cloudy writes them in descending wavelength), so the result
+    is that of interp1d(ang_v[::-1], flux[::-1]) for any mesh.
+    built once per mesh and cached.
+    '''
+    ang = np.asarray(ang, dtype=float)
+    key = ('resample', hashlib.sha1(ang.tobytes()).hexdigest())
+    def build():
+        fsps_lam = getFSPSlam()
+        ang_v = air_to_vac(ang)
+        nx = ang_v.size
+        # stable sort of the reversed mesh, as interp1d sorts
+        order = nx-1 - np.argsort(ang_v[::-1], kind='mergesort')
+        xs = ang_v[order]
+        rows, = np.nonzero((fsps_lam >= xs[0]) & (fsps_lam <= xs[-1]))
+        x = fsps_lam[rows]
+        hi = np.clip(np.searchsorted(xs, x, side='left'), 1, nx-1)
+        lo = hi - 1
+        dx = xs[hi] - xs[lo]
+        w_hi = np.zeros(x.size)
+        ok = dx > 0.0
+        w_hi[ok] = (x[ok] - xs[lo][ok])/dx[ok]
+        w_lo = 1.0 - w_hi
+        R = sparse.csr_matrix((np.concatenate((w_lo, w_hi)),
+                               (np.concatenate((rows, rows)),
+                                np.concatenate((order[lo], order[hi])))),
+                              shape=(fsps_lam.size, nx))
+        return R
+    return cached(key, build)
+
+def resampleCont(ang, flux):
+    '''
+    resampleCont(cont_data[:,0], cont_data[:,1:3])
+    interpolates one or more continuum columns (n_cloudy,) or
+    (n_cloudy, ncols) onto the FSPS wavelength array. columns from many
+    models on the same mesh can be stacked and resampled at once.
+    '''
+    R = getResampleOperator(ang)
+    return R.dot(np.asarray(flux, dtype=float))
+
+def formatCloudyOutput(dir_, model_prefix, modnum, modpars, use_extended_lines=False, write_line_lum=False, products=None, line_list=None, verbose=True, store=None, write_text=True, **kwargs):
     '''
     for formatting the output of a single cloudy job
+    products and line_list default to PREFIX.products and PREFIX.linelist
+    (see cloudyInputTools.writeParamFiles), if they exist. the continuum
+    is only formatted if the model saved it.
+    store: gridStore opened for writing; the model's rows are filled in.
+    write_text=False skips the per-model text files.
     '''
+    if products is None and line_list is None:
+        products, line_list = getGridProducts(dir_, model_prefix)
+    infiles = _formatFiles(dir_, model_prefix, modnum, products)[0]
+    stamp = max([os.path.getmtime(fl) for fl in infiles])
     # model information
     logZ, age, logU, logR, logQ, nH = modpars[0:6]
     if logZ > 0.2:
@@ -40,36 +121,31 @@ def formatCloudyOutput(dir_, model_prefix, modnum, modpars, use_extended_lines=F
     newfile = "{}{}{}.lineflux".format(dir_, model_prefix, str(modnum))
     print_file = "{}{}{}.out_lines".format(dir_, model_prefix, str(modnum))
     # read cloudy output
-    dat = np.genfromtxt(oldfile, skip_header=2, delimiter="\t",
-                        dtype="S20,f8")
-    #line_names = [d[0] for d in dat]
-    datflu = np.array([d[1] for d in dat])
-    # non-ordered wavelengths
-    if use_extended_lines:
-        wavfile = pkg_resources.resource_filename(__name__,
-                                                  "data/refLinesEXT.dat")
-    else:
-        wavfile = pkg_resources.resource_filename(__name__,
-                                                  "data/refLines.dat")
-    wdat = np.genfromtxt(wavfile, delimiter=',', dtype=None)
-    wl = np.array([dat[0] for dat in wdat])
-    # sort them by wavelength
-    sinds = np.argsort(wl)
-    ### print vac_wl, flux to ***.lineflux
-    output = np.column_stack((wl[sinds], datflu[sinds]))
-    np.savetxt(newfile, output, fmt=str("%4.6e"))
-    # print lines to ***.out_lines
-    # line luminosity in solar lums per Q
+    datflu = readLin(oldfile)
+    # vacuum wavelengths in .lin order, and the sorting permutation
+    wl, sinds = getLineWavs(use_extended_lines, line_list)
     line_wav = wl[sinds]
+    # line luminosity in solar lums per Q
     if write_line_lum:
         conv = 1.0
     else:
         conv = 1./lsun/(10.**logQ)
     line_flu = datflu[sinds]*conv
-    print_output = np.column_stack((line_wav, line_flu))
-    np.savetxt(print_file, print_output, fmt=(str("%.6e"),str("%.6e")))
-    # print to file
-    print("Lines were printed to file {}".format(print_file))
+    if store is not None:
+        store.write(modnum, lines=line_flu)
+    if write_text:
+        ### print vac_wl, flux to ***.lineflux
+        output = np.column_stack((line_wav, datflu[sinds]))
+        np.savetxt(newfile, output, fmt=str("%4.6e"))
+        # print lines to ***.out_lines
+        print_output = np.column_stack((line_wav, line_flu))
+        np.savetxt(print_file, print_output, fmt=(str("%.6e"),str("%.6e")))
+        if verbose:
+            print("Lines were printed to file {}".format(print_file))
+    if products is not None and "outwcont" not in products:
+        if store is not None:
+            store.write(modnum, stamp=stamp)
+        return
     ########
     ### continuum
     ########
@@ -78,55 +154,199 @@ def formatCloudyOutput(dir_, model_prefix, modnum, modpars, use_extended_lines=F
     print_file2 = "{}{}{}.contflux".format(dir_, model_prefix, modnum)
     print_file = "{}{}{}.out_cont".format(dir_, model_prefix, modnum)
     # lam, atten_inc, diff_cont, diff_line, sum
-    cont_data = np.genfromtxt(outcontfl, skip_header=1)
+    cont_data = readCont(outcontfl)
     # cont is nu L_nu / (4 pi R**2): Hz * (erg/s/Hz) * (1/cm**2)
     # [erg / s / cm^2 ] -> [ erg / s / Hz ]
-    atten_0, diffuse_0  = cont_data[:,1], cont_data[:,2]
-    ang_0 = cont_data[:,0]
-    # reverse arrays
-    atten_in, diffuse_in = atten_0[::-1], diffuse_0[::-1]
-    ang = ang_0[::-1]
-    ang_v = air_to_vac(ang)
-    # interpolate
-    lamfile = pkg_resources.resource_filename(__name__, "data/FSPSlam.dat")
-    fsps_lam = np.genfromtxt(lamfile)
+    inidata = readCont(incontfl)
+    # interpolate onto the FSPS grid; same Cloudy mesh for every model
+    fsps_lam = getFSPSlam()
     nu = c/fsps_lam
-    atten_y = interp1d(ang_v, atten_in, fill_value=0.0, bounds_error=False)(fsps_lam)
-    diffuse_y = interp1d(ang_v, diffuse_in, fill_value=0.0, bounds_error=False)(fsps_lam)
+    atten_y, diffuse_y, incid_y = resampleCont(cont_data[:,0],
+                                               np.column_stack((cont_data[:,1],
+                                                                cont_data[:,2],
+                                                                inidata[:,1]))).T
     ##
     # diffuse continuum
     diffuse_out = (diffuse_y) / nu * dist_fact / (10.**logQ) / lsun
-    ##
-    inidata = np.genfromtxt(incontfl, skip_header=1)
-    incid_0 = inidata[:,1]
-    incid_in = incid_0[::-1]
-    incid_y = interp1d(ang_v, incid_in, fill_value=0.0, bounds_error=False)(fsps_lam)
     # F_nu / (nu=c/lambda) per solar lum
-    f = open(print_file2, "w")
-    f.write("# lam (ang) incid (erg/s/cm2) attenuated_incid (erg/s/cm2) diffuse_cont (erg/s/cm2)\n")
-    for i in range(len(fsps_lam)):
-        printstring = "{0:.6e} {1:.6e} {2:.6e} {3:.6e}\n".format(fsps_lam[i], incid_y[i], atten_y[i], diffuse_y[i])
-        f.write(printstring)
-    f.close()
-    print("The full continuum was printed to file {}".format(print_file2))
+    if store is not None:
+        # stamp last, so a model interrupted here is redone
+        store.write(modnum, cont=diffuse_out, stamp=stamp)
+    if not write_text:
+        return
+    np.savetxt(print_file2,
+               np.column_stack((fsps_lam, incid_y, atten_y, diffuse_y)),
+               fmt=str("%.6e"), comments=str(""),
+               header=str("# lam (ang) incid (erg/s/cm2) attenuated_incid (erg/s/cm2) diffuse_cont (erg/s/cm2)"))
+    if verbose:
+        print("The full continuum was printed to file {}".format(print_file2))
     #####
-    f = open(print_file, "w")
-    f.write("# lam (ang) diffuse_cont (lsun/hz/Q)\n")
-    for i in range(len(fsps_lam)):
-        printstring = "{0:.6e} {1:.6e}\n".format(fsps_lam[i], diffuse_out[i])
-        f.write(printstring)
-    f.close()
-    print("The diffuse continuum was printed to file {}".format(print_file))
+    np.savetxt(print_file, np.column_stack((fsps_lam, diffuse_out)),
+               fmt=str("%.6e"), comments=str(""),
+               header=str("# lam (ang) diffuse_cont (lsun/hz/Q)"))
+    if verbose:
+        print("The diffuse continuum was printed to file {}".format(print_file))
     return
 
-def formatAllOutput(dir_, mod_prefix, use_extended_lines=False, write_line_lum=False):
+def _formatFiles(dir_, mod_prefix, modnum, products=None):
+    '''
+    (cloudy output files, formatted files) for one model
+    '''
+    pr = "{}{}{}".format(dir_, mod_prefix, modnum)
+    infiles, outfiles = [pr+".lin"], [pr+".lineflux", pr+".out_lines"]
+    if products is None or "outwcont" in products:
+        infiles += [pr+".outwcont", pr+".inicont"]
+        outfiles += [pr+".contflux", pr+".out_cont"]
+    return infiles, outfiles
+
+def needsFormat(dir_, mod_prefix, modnum, products=None, store=None, write_text=True):
+    '''
+    True if any formatted output of the model (rows in store, text
+    files if write_text) is missing or older than the Cloudy output it
+    is made from.
+    '''
+    infiles, outfiles = _formatFiles(dir_, mod_prefix, modnum, products)
+    try:
+        newest_in = max([os.path.getmtime(fl) for fl in infiles])
+    except OSError:
+        # not run (yet); let formatCloudyOutput report it
+        return True
+    if store is not None and not store.isCurrent(modnum, newest_in):
+        return True
+    if not write_text:
+        return False
+    try:
+        oldest_out = min([os.path.getmtime(fl) for fl in outfiles])
+    except OSError:
+        return True
+    return oldest_out < newest_in
+
+# stores opened for writing by this process (pool workers open their own)
+_stores = {}
+
+def _openStore(dir_, mod_prefix):
+    key = (dir_, mod_prefix)
+    if key not in _stores:
+        _stores[key] = gridStore(dir_, mod_prefix, mode="r+")
+    return _stores[key]
+
+def _formatOne(args):
+    '''
+    pool worker: formats one model, returns (modnum, seconds, error)
+    '''
+    dir_, mod_prefix, modnum, modpars, kwargs = args
+    kwargs = dict(kwargs)
+    if kwargs.pop("use_store", False):
+        kwargs["store"] = _openStore(dir_, mod_prefix)
+    t0 = time.time()
+    try:
+        formatCloudyOutput(dir_, mod_prefix, modnum, modpars, verbose=False,
+                           **kwargs)
+        err = None
+    except Exception as e:
+        err = "{}: {}".format(type(e).__name__, str(e).split("\n")[0])
+    return modnum, time.time()-t0, err
+
+def openGridStore(dir_, mod_prefix, use_extended_lines=False, write_line_lum=False, float32=False, fresh=False):
+    '''
+    store = openGridStore(dir_, 'ZAU')
+    the grid's store opened for writing. a new, empty store is made if
+    there is none, it was made for other models, lines or options, or
+    fresh=True.
+    '''
+    data = np.atleast_2d(readTable(dir_+mod_prefix+".pars"))
+    products, line_list = getGridProducts(dir_, mod_prefix)
+    wl, sinds = getLineWavs(use_extended_lines, line_list)
+    if products is None or "outwcont" in products:
+        cont_lam = getFSPSlam()
+    else:
+        cont_lam = None
+    info = dict(write_line_lum=bool(write_line_lum),
+                use_extended_lines=bool(use_extended_lines))
+    if not fresh and storeExists(dir_, mod_prefix):
+        store = gridStore(dir_, mod_prefix, mode="r+")
+        if (store.info["float32"] == bool(float32) and
+            store.matches(data, wl[sinds], cont_lam, **info)):
+            return store
+        del store
+    return gridStore.create(dir_, mod_prefix, data, wl[sinds], cont_lam,
+                            float32=float32, **info)
+
+def formatAllOutput(dir_, mod_prefix, use_extended_lines=False, write_line_lum=False, n_proc=1, force=False, chunksize=1, verbose=True, use_store=True, write_text=True, float32=False):
     '''
     for formatting output after running a batch of cloudy jobs
+    formatAllOutput(dir_, 'ZAU', n_proc=8)
+    every model is written to the binary grid store PREFIX.grid/
+    (use_store; float32=True halves its size) and, if write_text, to
+    the per-model text files. models whose formatted output is newer
+    than their Cloudy output are skipped, unless force=True. models are
+    formatted by a pool of n_proc processes; progress and a timing
+    summary are printed as they finish.
+    returns a dict of formatting time (s) for each model number. if any
+    model fails, RuntimeError lists them once the others are done.
     '''
-    data = np.genfromtxt(dir_+mod_prefix+".pars")
-    def get_pars(modnum):
-        return data[np.int(modnum)-1, 1:]
-    for modnum in data[:,0]:
-        mnum = np.int(modnum)
-        formatCloudyOutput(dir_, mod_prefix, mnum, get_pars(mnum), use_extended_lines=use_extended_lines, write_line_lum=write_line_lum)
-    return
+    data = np.atleast_2d(readTable(dir_+mod_prefix+".pars"))
+    products, line_list = getGridProducts(dir_, mod_prefix)
+    kwargs = dict(use_extended_lines=use_extended_lines,
+                  write_line_lum=write_line_lum,
+                  products=products, line_list=line_list,
+                  use_store=use_store, write_text=write_text)
+    if use_store:
+        store = openGridStore(dir_, mod_prefix, use_extended_lines,
+                              write_line_lum, float32)
+    else:
+        store = None
+    def needed(store):
+        return [(dir_, mod_prefix, int(par[0]), par[1:], kwargs) for par in data
+                if force or needsFormat(dir_, mod_prefix, int(par[0]), products,
+                                        store, write_text)]
+    todo = needed(store)
+    if len(todo) > 0 and store is not None and store.info.get("cont_pca"):
+        # a store keeping only the PCA of its continua takes no new rows
+        store = openGridStore(dir_, mod_prefix, use_extended_lines,
+                              write_line_lum, float32, fresh=True)
+        todo = needed(store)
+    ntodo = len(todo)
+    if verbose:
+        print("{}: {} of {} models need formatting".format(mod_prefix, ntodo,
+                                                           len(data)))
+    times, errors = {}, {}
+    if ntodo == 0:
+        return times
+    t0 = time.time()
+    if n_proc > 1:
+        pool = multiprocessing.Pool(n_proc)
+        results = pool.imap_unordered(_formatOne, todo, chunksize=chunksize)
+    else:
+        pool = None
+        results = (_formatOne(args) for args in todo)
+    every = max(1, ntodo//10)
+    try:
+        for i, (modnum, dt, err) in enumerate(results):
+            if err is not None:
+                errors[modnum] = err
+            else:
+                times[modnum] = dt
+            if verbose and ((i+1) % every == 0 or i+1 == ntodo):
+                print("  {0}/{1} models formatted ({2:.1f} s)".format(i+1, ntodo,
+                                                                    time.time()-t0))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if (dir_, mod_prefix) in _stores:
+            _stores.pop((dir_, mod_prefix)).flush()
+        if store is not None:
+            store.flush()
+    if verbose and len(times) > 0:
+        dts = np.array(list(times.values()))
+        slowest = max(times, key=times.get)
+        print("formatted {0} models in {1:.1f} s with {2} processes".format(len(times), time.time()-t0, n_proc))
+        print("  per model: mean {0:.3f} s, median {1:.3f} s, max {2:.3f} s ({3}{4})".format(dts.mean(), np.median(dts), dts.max(), mod_prefix, slowest))
+    if len(errors) > 0:
+        # the other models are formatted and stored; raise once they are
+        raise RuntimeError("{0} of {1} models failed to format:\n{2}".format(
+            len(errors), ntodo, "\n".join(["  {}{}: {}".format(mod_prefix, modnum,
+                                                              errors[modnum])
+                                           for modnum in sorted(errors)])))
+    return times
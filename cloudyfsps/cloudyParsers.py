@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+__all__ = ["readLin", "readCont", "readSave", "readTable", "validNames"]
+
+import numpy as np
+
+###
+# Readers for the files Cloudy saves (and the files formatting writes).
+# Each file is read in one go and the numbers are converted by a single
+# split and float conversion of the whole block, instead of going through
+# np.genfromtxt line by line. If a file does not have the layout a
+# reader expects (text where a number should be, ragged rows), it falls
+# back to np.genfromtxt with the arguments the old code used.
+###
+# np.genfromtxt's default name validation (see numpy.lib._iotools)
+_deletechars = set(r"""~!@#$%^&*()-=+~\|]}[{';: /?.>,<""")
+_excludelist = ['return', 'file', 'print']
+
+def _read(fname):
+    f = open(fname, 'r')
+    text = f.read()
+    f.close()
+    return text
+
+def _skip_lines(text, n):
+    '''
+    text after the first n lines
+    '''
+    pos = 0
+    for i in range(n):
+        pos = text.find('\n', pos) + 1
+        if pos == 0:
+            return ''
+    return text[pos:]
+
+def _strip_comments(lines, comments):
+    if comments is None:
+        return [line for line in lines if line.strip()]
+    out = []
+    for line in lines:
+        i = line.find(comments)
+        if i >= 0:
+            line = line[:i]
+        if line.strip():
+            out.append(line)
+    return out
+
+def _fromstring(text):
+    '''
+    1D float array of the whitespace separated numbers in text; None if
+    any of them is not a number
+    '''
+    try:
+        return np.array(text.split(), dtype=float)
+    except ValueError:
+        return None
+
+def _to_floats(body, comments, ncols=None):
+    '''
+    parses whitespace separated numbers into an (nrows, ncols) array;
+    None if the rows do not hold exactly ncols numbers each.
+    '''
+    body = body.strip()
+    if comments is None or comments not in body:
+        # one conversion over the whole block
+        if len(body) == 0:
+            return np.zeros((0, ncols or 0))
+        nrows = body.count('\n') + 1
+        if ncols is None:
+            ncols = len(body[:body.find('\n')].split())
+        arr = _fromstring(body)
+        if arr is None:
+            return None
+        if ncols > 0 and arr.size == nrows*ncols:
+            return arr.reshape(nrows, ncols)
+    # blank or comment lines mixed in
+    lines = _strip_comments(body.splitlines(), comments)
+    if len(lines) == 0:
+        return np.zeros((0, ncols or 0))
+    if ncols is None:
+        ncols = len(lines[0].split())
+    arr = _fromstring(' '.join(lines))
+    if arr is None or ncols == 0 or arr.size != len(lines)*ncols:
+        return None
+    return arr.reshape(len(lines), ncols)
+
+def validNames(names):
+    '''
+    field names as np.genfromtxt(names=True) would make them
+    '''
+    out, seen, nbempty = [], {}, 0
+    for name in names:
+        name = name.strip().replace(' ', '_')
+        name = ''.join([ch for ch in name if ch not in _deletechars])
+        if name == '':
+            # empty names are numbered among themselves: f0, f1, ...
+            name = 'f{}'.format(nbempty)
+            while name in names:
+                nbempty += 1
+                name = 'f{}'.format(nbempty)
+            nbempty += 1
+        elif name in _excludelist:
+            name += '_'
+        cnt = seen.get(name, 0)
+        if cnt > 0:
+            out.append('{}_{}'.format(name, cnt))
+        else:
+            out.append(name)
+        seen[name] = cnt + 1
+    return out
+
+def readTable(fname, skip_header=0, comments='#'):
+    '''
+    readTable('ZAU1.lineflux') -> 2D float array
+    whitespace separated numeric table, like np.genfromtxt(fname)
+    '''
+    arr = _to_floats(_skip_lines(_read(fname), skip_header), comments)
+    if arr is None:
+        return np.genfromtxt(fname, skip_header=skip_header, comments=comments)
+    # same squeezing as genfromtxt: single columns/rows come back 1D
+    return np.squeeze(arr)
+
+def readLin(fname):
+    '''
+    readLin('ZAU1.lin') -> line fluxes, in the order of the line list
+    the .lin file has two title lines, then "label<TAB>flux" rows.
+    '''
+    lines = _strip_comments(_read(fname).splitlines()[2:], None)
+    vals = [line.rstrip().rpartition('\t')[2] for line in lines]
+    try:
+        return np.array(vals, dtype=float)
+    except ValueError:
+        dat = np.genfromtxt(fname, skip_header=2, delimiter="\t",
+                            dtype="S20,f8")
+        return np.array([d[1] for d in dat])
+
+def readCont(fname):
+    '''
+    readCont('ZAU1.outwcont') -> 2D float array, one row per frequency
+    for .outwcont and .inicont (one title line, tab separated numbers).
+    '''
+    arr = _to_floats(_skip_lines(_read(fname), 1), '#')
+    if arr is None:
+        return np.genfromtxt(fname, skip_header=1)
+    return arr
+
+def readSave(fname, comments=';'):
+    '''
+    readSave('ZAU1.rad') -> structured array, one field per column
+    for the tab separated save files with a header line (.rad, .phys,
+    .ele_*, .emis, .cool). field names match
+    np.genfromtxt(fname, delimiter='\\t', comments=comments, names=True).
+    '''
+    text = _read(fname).lstrip('\r\n')
+    if len(text.strip()) == 0:
+        return np.genfromtxt(fname, delimiter='\t', comments=comments,
+                             names=True)
+    header = text[:text.find('\n')] if '\n' in text else text
+    if comments is not None and comments in header:
+        header = ''.join(header.split(comments)[1:])
+    names = validNames(header.strip(' \r\n').split('\t'))
+    arr = _to_floats(_skip_lines(text, 1), comments, len(names))
+    if arr is None:
+        return np.genfromtxt(fname, delimiter='\t', comments=comments,
+                             names=True)
+    dtype = np.dtype([(str(name), float) for name in names])
+    return np.ascontiguousarray(arr).view(dtype).reshape(arr.shape[0])
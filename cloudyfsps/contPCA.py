@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+__all__ = ["contPCA", "pcaRows", "storePCA"]
+
+import os
+import numpy as np
+from .gridStore import gridStore
+
+###
+# Compressed nebular continua: the log10 continua of a grid's models
+# (rows of an [nmod, nlam] array such as gridStore.cont or
+# fspsTable.flux) as a mean plus a truncated PCA basis,
+#    log10(flux[i]) = mean + coeffs[i].dot(basis)
+# with the fewest components that reconstruct every model within tol
+# dex. The basis is the right singular vectors of the centered log
+# continua, found a chunk of models at a time (the SVD of the rows so
+# far, kept as singular values times vectors, stacked with the next
+# chunk), so the continua are never all in memory.
+# storePCA keeps the basis of a grid store in PREFIX.grid/cont_pca.npz;
+# with drop_cont the store keeps only that, and gridStore.cont is a
+# pcaRows reconstructing the rows asked for.
+###
+class contPCA(object):
+    '''
+    pca = contPCA.fit(store.cont, tol=0.01)
+    pca.reconstruct()         [nmod, nlam] continua, within tol dex
+    pca.reconstruct([0, 5])   rows 0 and 5
+    pca.expand(coeffs)        continua of any coefficients [..., ncomp]
+    pca.ratio                 floats of the table / floats stored
+    pca.save(fname), contPCA.load(fname)
+    '''
+    def __init__(self, mean, basis, coeffs, floor, tol, max_err):
+        self.mean = mean
+        self.basis = basis
+        self.coeffs = coeffs
+        self.floor = floor
+        self.tol = tol
+        self.max_err = max_err
+        self.nmods, self.ncomp = coeffs.shape
+        self.nlam = len(mean)
+        return
+    @property
+    def ratio(self):
+        '''
+        compression ratio: nmod*nlam / (mean + basis + coefficients)
+        '''
+        stored = self.nlam + self.basis.size + self.coeffs.size
+        return self.nmods*self.nlam/stored
+    @classmethod
+    def fit(cls, flux, tol=0.01, floor=None, chunk_size=1000):
+        '''
+        contPCA.fit(flux, tol=0.01)
+        basis of the fewest components reconstructing every row of flux
+        [nmod, nlam] within tol dex. fluxes below floor (default: the
+        smallest positive flux) are fit as floor. ValueError if even
+        the full basis is not within tol.
+        '''
+        nmods, nlam = flux.shape
+        chunks = [slice(i, i+chunk_size) for i in range(0, nmods, chunk_size)]
+        if floor is None:
+            floor = np.inf
+            for chunk in chunks:
+                rows = np.asarray(flux[chunk], dtype=float)
+                if (rows > 0.).any():
+                    floor = min(floor, rows[rows > 0.].min())
+            floor = 1. if np.isinf(floor) else floor
+        def log_rows(chunk):
+            return np.log10(np.maximum(np.asarray(flux[chunk], dtype=float),
+                                       floor))
+        mean = np.zeros(nlam)
+        for chunk in chunks:
+            mean += log_rows(chunk).sum(axis=0)
+        mean /= nmods
+        # the rows so far as sv*vt, which has their right singular
+        # vectors and values
+        svt = np.zeros((0, nlam))
+        for chunk in chunks:
+            rows = np.concatenate((svt, log_rows(chunk) - mean))
+            u, sv, vt = np.linalg.svd(rows, full_matrices=False)
+            # directions below the numerical rank are dropped
+            keep = sv > sv[0]*max(rows.shape)*np.finfo(float).eps
+            basis = vt[keep]
+            svt = sv[keep, None]*basis
+        # largest first, at most rank <= min(nmod, nlam) components
+        nmax = len(basis)
+        def max_err(ncomp):
+            err = 0.
+            for chunk in chunks:
+                rows = log_rows(chunk) - mean
+                coeffs = np.dot(rows, basis[:ncomp].T)
+                err = max(err, np.abs(np.dot(coeffs, basis[:ncomp])
+                                      - rows).max())
+            return err
+        # fewest components within tol: doubling, then bisection. every
+        # model is checked, so the tolerance holds for the result
+        errs = {0:max_err(0)}
+        lo = hi = 0
+        while errs[hi] > tol and hi < nmax:
+            lo, hi = hi, min(max(2*hi, 1), nmax)
+            errs[hi] = max_err(hi)
+        while hi - lo > 1:
+            mid = (lo + hi)//2
+            errs[mid] = max_err(mid)
+            if errs[mid] <= tol:
+                hi = mid
+            else:
+                lo = mid
+        if errs[hi] > tol:
+            raise ValueError("the {0} components of the full basis reconstruct "
+                             "every model only within {1:.3g} dex, not {2:.3g}"
+                             .format(nmax, errs[hi], tol))
+        basis = basis[:hi].copy()
+        coeffs = np.zeros((nmods, hi))
+        for chunk in chunks:
+            coeffs[chunk] = np.dot(log_rows(chunk) - mean, basis.T)
+        return cls(mean, basis, coeffs, floor, tol, errs[hi])
+    def expand(self, coeffs, out=None, block=128):
+        '''
+        continua [..., nlam] of coefficients [..., ncomp], into out if
+        given (a C-contiguous float array of that shape)
+        '''
+        if getattr(self, '_ln_basis', None) is None:
+            # natural log, so one exp per flux instead of a power of 10
+            self._ln_basis = self.basis*np.log(10.)
+            self._ln_mean = self.mean*np.log(10.)
+        coeffs = np.asarray(coeffs, dtype=float)
+        if out is None:
+            out = np.empty(coeffs.shape[:-1]+(self.nlam,))
+        rows, flat = coeffs.reshape(-1, self.ncomp), out.reshape(-1, self.nlam)
+        # a block of rows at a time, so each stays in cache for the
+        # product, the mean and the exp
+        for i in range(0, len(rows), block):
+            part = flat[i:i+block]
+            np.dot(rows[i:i+block], self._ln_basis, out=part)
+            part += self._ln_mean
+            np.exp(part, out=part)
+        return out
+    def reconstruct(self, rows=None, chunk_size=1000):
+        '''
+        pca.reconstruct(rows) -> [len(rows), nlam] continua of the models
+        at rows (default all)
+        '''
+        coeffs = self.coeffs if rows is None else self.coeffs[rows]
+        if coeffs.ndim == 1:
+            return self.expand(coeffs)
+        out = np.empty((len(coeffs), self.nlam))
+        for i in range(0, len(coeffs), chunk_size):
+            out[i:i+chunk_size] = self.expand(coeffs[i:i+chunk_size])
+        return out
+    def save(self, fname):
+        np.savez(fname, mean=self.mean, basis=self.basis, coeffs=self.coeffs,
+                 floor=self.floor, tol=self.tol, max_err=self.max_err)
+        return
+    @classmethod
+    def load(cls, fname):
+        with np.load(fname) as dat:
+            return cls(dat['mean'], dat['basis'], dat['coeffs'],
+                       float(dat['floor']), float(dat['tol']),
+                       float(dat['max_err']))
+
+class pcaRows(object):
+    '''
+    rows = pcaRows(pca)
+    rows[5], rows[[0, 5]], rows[:10], rows[:, 100]   continua rebuilt
+    from the PCA, indexed like the [nmod, nlam] array they replace
+    '''
+    def __init__(self, pca):
+        self.pca = pca
+        self.shape = (pca.nmods, pca.nlam)
+        self.ndim = 2
+        self.dtype = np.dtype(float)
+        return
+    def __len__(self):
+        return self.pca.nmods
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            return self[key[0]][(Ellipsis,)+key[1:]]
+        return self.pca.reconstruct(np.arange(self.pca.nmods)[key])
+    def __array__(self, dtype=None):
+        out = self.pca.reconstruct()
+        return out if dtype is None else out.astype(dtype)
+
+def storePCA(dir_, mod_prefix, tol=0.01, rebuild=False, drop_cont=False,
+             verbose=True):
+    '''
+    pca = storePCA(dir_, 'ZAU', tol=0.01)
+    contPCA of the continua in the grid store PREFIX.grid/, read from
+    PREFIX.grid/cont_pca.npz while it is newer than the continua and
+    was fit to tol, fit and saved otherwise.
+    drop_cont=True then removes the full continua from the store, which
+    keeps only the PCA (see gridStore.dropCont); such a store returns its
+    PCA for any tol it meets, and cannot be fit again.
+    '''
+    store = gridStore(dir_, mod_prefix)
+    fname = store.pca_file
+    if store.cont is None:
+        raise ValueError("{} has no continua".format(store.path))
+    if store.info.get("cont_pca"):
+        pca = store.cont.pca
+        if pca.tol > tol:
+            raise ValueError("{0} keeps only the PCA of its continua, within "
+                             "{1:.3g} dex".format(store.path, pca.tol))
+        return pca
+    pca = None
+    if (not rebuild and os.path.exists(fname) and
+        os.path.getmtime(fname) >= os.path.getmtime(store._file("cont"))):
+        pca = contPCA.load(fname)
+        if pca.tol != tol:
+            pca = None
+    if pca is None:
+        pca = contPCA.fit(store.cont, tol=tol)
+        pca.save(fname)
+        if verbose:
+            print("cont: {0} components within {1:.3g} dex, {2:.1f}x smaller".format(
+                pca.ncomp, pca.max_err, pca.ratio))
+    if drop_cont:
+        store.dropCont()
+    return pca
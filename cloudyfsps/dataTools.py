@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+__all__ = ["getRefLines", "getRefSort", "getOrderedLines", "getFSPSlam",
+           "getEmisTable", "getCloudyLines", "cached", "compileRefData",
+           "clearCache"]
+
+import os
+import numpy as np
+import pkg_resources
+
+###
+# Process-wide registry for the tables in cloudyfsps/data.
+# Each table is parsed once into a read-only numpy array and shared by
+# every caller. compileRefData() saves the parsed arrays next to the
+# .dat files as .npy, which are loaded instead while they are newer
+# than the text versions.
+###
+_cache = {}
+
+def _read_ref(fname):
+    # wavelength (vacuum, ang), line ID
+    dat = np.genfromtxt(fname, delimiter=',', dtype=None, encoding='utf-8')
+    out = np.zeros(dat.size, dtype=[(str('wav'), float), (str('name'), 'U40')])
+    out['wav'] = [d[0] for d in dat]
+    out['name'] = [d[1] for d in dat]
+    return out
+
+def _read_col(fname):
+    return np.genfromtxt(fname)
+
+def _read_emis(fname):
+    dat = np.genfromtxt(fname, delimiter='\t', dtype=('U12',float,float),
+                        encoding='utf-8')
+    out = np.zeros(dat.size, dtype=[(str('name'), 'U12'), (str('vac'), float),
+                                    (str('air'), float)])
+    out['name'] = [d[0].replace(' ','') for d in dat]
+    out['vac'] = [d[1] for d in dat]
+    out['air'] = [d[2] for d in dat]
+    return out
+
+def _read_labels(fname):
+    f = open(fname, 'r')
+    labels = [line.rstrip('\n') for line in f if len(line.strip()) > 0]
+    f.close()
+    return np.array(labels, dtype='U20')
+
+# registry key: (file in data/, parser)
+_tables = {'refLines':('refLines.dat', _read_ref),
+           'refLinesEXT':('refLinesEXT.dat', _read_ref),
+           'orderedLines':('orderedLines.dat', _read_col),
+           'orderedLinesEXT':('orderedLinesEXT.dat', _read_col),
+           'FSPSlam':('FSPSlam.dat', _read_col),
+           'emlines':('emlines.dat', _read_emis),
+           'cloudyLines':('cloudyLines.dat', _read_labels),
+           'cloudyLinesEXT':('cloudyLinesEXT.dat', _read_labels)}
+
+def _data_file(fname):
+    return pkg_resources.resource_filename(__name__, 'data/'+fname)
+
+def _npy_file(key):
+    return _data_file(key+'.npy')
+
+def _load_table(key):
+    fname, reader = _tables[key]
+    datfile = _data_file(fname)
+    npyfile = _npy_file(key)
+    if (os.path.exists(npyfile) and
+        os.path.getmtime(npyfile) >= os.path.getmtime(datfile)):
+        return np.load(npyfile)
+    return reader(datfile)
+
+def cached(key, loader):
+    '''
+    cached(('sort', 'refLines'), lambda: np.argsort(wavs))
+    returns the registry entry for key, calling loader() the first time.
+    arrays are made read-only since they are shared by all callers.
+    '''
+    try:
+        return _cache[key]
+    except KeyError:
+        val = loader()
+        if isinstance(val, np.ndarray):
+            val.setflags(write=False)
+        _cache[key] = val
+        return val
+
+def _table(key):
+    return cached(key, lambda: _load_table(key))
+
+def getRefLines(use_extended_lines=False):
+    '''
+    wavelengths (vacuum) and IDs of the lines in refLines(EXT).dat,
+    in the same order Cloudy writes them to the .lin file.
+    table['wav'], table['name']
+    '''
+    if use_extended_lines:
+        return _table('refLinesEXT')
+    return _table('refLines')
+
+def getRefSort(use_extended_lines=False):
+    '''
+    permutation that sorts getRefLines() by wavelength
+    '''
+    key = ('sort', bool(use_extended_lines))
+    return cached(key, lambda: np.argsort(getRefLines(use_extended_lines)['wav']))
+
+def getOrderedLines(use_extended_lines=False):
+    '''
+    wavelength ordered line list, orderedLines(EXT).dat
+    '''
+    if use_extended_lines:
+        return _table('orderedLinesEXT')
+    return _table('orderedLines')
+
+def getFSPSlam():
+    '''
+    FSPS wavelength array (ang) for the nebular continuum
+    '''
+    return _table('FSPSlam')
+
+def getEmisTable():
+    '''
+    named emission lines from emlines.dat
+    table['name'], table['vac'], table['air']
+    '''
+    return _table('emlines')
+
+def getCloudyLines(use_extended_lines=False):
+    '''
+    Cloudy line labels from cloudyLines(EXT).dat
+    '''
+    if use_extended_lines:
+        return _table('cloudyLinesEXT')
+    return _table('cloudyLines')
+
+def compileRefData():
+    '''
+    saves every registry table as data/KEY.npy so later sessions
+    skip the text parsing. requires write access to the package.
+    '''
+    for key in _tables:
+        np.save(_npy_file(key), _load_table(key))
+        print('wrote {}'.format(_npy_file(key)))
+    return
+
+def clearCache():
+    _cache.clear()
+    return
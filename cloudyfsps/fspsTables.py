@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+__all__ = ["fspsTable", "convertTable"]
+
+import os
+import numpy as np
+
+###
+# Reader for the FSPS tables written by outputFormatting (PREFIX.lines,
+# PREFIX.cont):
+#    #ncols cols nmod rows N1 logZ N2 Age N3 logU
+#    lam_1 lam_2 ... lam_ncols
+#    logZ Age logU           (one pair of rows per model)
+#    flux_1 ... flux_ncols
+# The text is converted once into two sidecar files next to it,
+#    PREFIX.cont.npy   flux cube [N1, N2, ..., ncols], NaN where the
+#                      grid has no model
+#    PREFIX.cont.npz   wavelengths, axis labels and coordinates, the
+#                      parameters of each row and its cell in the cube
+# which are used while they are newer than the text. The cube is opened
+# memory-mapped, so a model or wavelength slice only reads those values.
+###
+def _sidecars(fname):
+    return fname+".npy", fname+".npz"
+
+def _header(line):
+    tok = line.lstrip("#").split()
+    ncols, nrows = int(tok[0]), int(float(tok[2]))
+    return ncols, nrows, [str(label) for label in tok[5::2]]
+
+def _data_lines(f):
+    for line in f:
+        if line.strip():
+            yield line
+
+def convertTable(fname):
+    '''
+    convertTable(dir_+'ZAU.cont')
+    writes the sidecar cube (.npy) and coordinates (.npz) for a table
+    '''
+    npyfile, npzfile = _sidecars(fname)
+    # pass 1: parameters of every model
+    f = open(fname, "r")
+    lines = _data_lines(f)
+    ncols, nrows, labels = _header(next(lines))
+    lam = np.array(next(lines).split(), dtype=float)
+    pars = []
+    for i, line in enumerate(lines):
+        if i % 2 == 0:
+            pars.append(line.split())
+    f.close()
+    # tables written with more_info carry the raw row of PREFIX.pars,
+    # which does not say which columns (or transforms) the axes are
+    naxes = len(labels)
+    if any([len(p) != naxes for p in pars]):
+        raise ValueError("{0}: parameter rows are not the {1} axes {2} "
+                         "(written with more_info?)".format(fname, naxes,
+                                                           labels))
+    pars = np.array(pars, dtype=float)
+    coords = [np.unique(col) for col in pars.T]
+    shape = tuple([len(c) for c in coords])
+    cell = np.ravel_multi_index([np.searchsorted(c, col)
+                                 for c, col in zip(coords, pars.T)], shape)
+    cells, counts = np.unique(cell, return_counts=True)
+    if np.any(counts > 1):
+        dup = pars[np.nonzero(cell == cells[counts > 1][0])[0][0]]
+        raise ValueError("{0}: {1} models share parameters, e.g. {2}".format(
+            fname, np.sum(counts[counts > 1]), dict(zip(labels, dup))))
+    # pass 2: fluxes, row by row into the cube
+    tmpfile = npyfile+".tmp"
+    cube = np.lib.format.open_memmap(tmpfile, mode="w+", dtype=float,
+                                     shape=(int(np.prod(shape)), ncols))
+    cube[:] = np.nan
+    f = open(fname, "r")
+    lines = _data_lines(f)
+    next(lines), next(lines)
+    for i, line in enumerate(lines):
+        if i % 2 == 1:
+            cube[cell[i//2]] = np.array(line.split(), dtype=float)
+    f.close()
+    cube.flush()
+    del cube
+    np.savez(npzfile, *coords, lam=lam, pars=pars, cell=cell,
+             labels=np.array(labels))
+    os.rename(tmpfile, npyfile)
+    return
+
+class fspsTable(object):
+    '''
+    tab = fspsTable(dir_+'ZAU.cont')
+    tab.cube[iZ, iA, iU]   spectrum of one model (memory-mapped)
+    tab.cube[..., ilam]    one wavelength across the grid
+    tab.lam, tab.labels, tab.coords['logZ']
+    tab.flux               [nmod, ncols], in the order of the text file
+    tab.pars               [nmod, naxes]
+    '''
+    def __init__(self, fname, rebuild=False):
+        self.fname = fname
+        npyfile, npzfile = _sidecars(fname)
+        if rebuild or not self.isCurrent():
+            convertTable(fname)
+        with np.load(npzfile) as dat:
+            self.lam = dat["lam"]
+            self.pars = dat["pars"]
+            self.cell = dat["cell"]
+            self.labels = [str(label) for label in dat["labels"]]
+            self.coords = dict([(label, dat["arr_{}".format(i)])
+                                for i, label in enumerate(self.labels)])
+        self.shape = tuple([len(self.coords[label]) for label in self.labels])
+        flat = np.load(npyfile, mmap_mode="r")
+        self.cube = flat.reshape(self.shape+(len(self.lam),))
+        return
+    def isCurrent(self):
+        '''
+        True if both sidecar files exist and are newer than the text
+        '''
+        mtime = os.path.getmtime(self.fname)
+        return all([os.path.exists(fl) and os.path.getmtime(fl) >= mtime
+                    for fl in _sidecars(self.fname)])
+    @property
+    def flux(self):
+        return self.cube.reshape(-1, len(self.lam))[self.cell]
+    def index(self, **pars):
+        '''
+        tab.index(logZ=0.0, Age=1.0e6, logU=-2.0) -> (iZ, iA, iU)
+        indices of the nearest grid values; unspecified axes are sliced
+        '''
+        out = []
+        for label in self.labels:
+            if label in pars:
+                out.append(int(np.argmin(np.abs(self.coords[label]-pars[label]))))
+            else:
+                out.append(slice(None))
+        return tuple(out)
+    def get(self, **pars):
+        '''
+        tab.get(logZ=0.0, Age=1.0e6, logU=-2.0) -> flux array
+        '''
+        return self.cube[self.index(**pars)]
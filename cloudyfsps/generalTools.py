@@ -3,19 +3,27 @@
 from __future__ import (division, print_function, absolute_import,
                         unicode_literals)
 
+import hashlib
 import numpy as np
 import itertools
-from scipy.integrate import simps
-import pkg_resources
+try:
+    from scipy.integrate import simps
+except ImportError:
+    # removed in scipy 1.14
+    from scipy.integrate import simpson as simps
+from .dataTools import getEmisTable, cached
 
 def calcQ(lamin0, specin0, mstar=1.0, helium=False, f_nu=False):
     '''
     Claculate the number of lyman ionizing photons for given spectrum
     Input spectrum must be in ergs/s/A!!
     Q = int(Lnu/hnu dnu, nu_0, inf)
+    specin0 [n_spec, n_lam] gives Q of every spectrum, see calcQs
     '''
     lamin = np.asarray(lamin0)
     specin = np.asarray(specin0)
+    if specin.ndim > 1:
+        return calcQs(lamin, specin, mstar=mstar, helium=helium, f_nu=f_nu)
     c = 2.9979e18 #ang/s
     h = 6.626e-27 #erg/s
     if helium:
@@ -38,12 +46,63 @@ def calcQ(lamin0, specin0, mstar=1.0, helium=False, f_nu=False):
         Q = simps(integrand, x=lam)*mstar
     return Q
 
+def _simpsWeights(x, chunk=256):
+    '''
+    w such that w.dot(y) = simps(y, x=x) for any y: simps is linear in
+    y, so w is simps of each unit vector
+    '''
+    n = len(x)
+    w = np.zeros(n)
+    for i in range(0, n, chunk):
+        m = min(chunk, n-i)
+        units = np.zeros((m, n))
+        units[np.arange(m), i+np.arange(m)] = 1.
+        w[i:i+m] = simps(units, x=x, axis=-1)
+    return w
+
+def calcQWeights(lamin, helium=False, f_nu=False):
+    '''
+    w = calcQWeights(lam, f_nu=True)
+    w.dot(spec) = calcQ(lam, spec, f_nu=True) (mstar=1), for every
+    spectrum on the wavelength grid lam. weights of the wavelengths
+    beyond the H (or He) threshold are 0. computed once per grid.
+    '''
+    lamin = np.ascontiguousarray(lamin, dtype=float)
+    key = ('calcQWeights', hashlib.sha1(lamin.tobytes()).hexdigest(),
+           lamin.size, bool(helium), bool(f_nu))
+    def weights():
+        c = 2.9979e18 #ang/s
+        h = 6.626e-27 #erg/s
+        lam_0 = 304.0 if helium else 911.6
+        w = np.zeros(lamin.size)
+        if f_nu:
+            inds, = np.where(c/lamin >= c/lam_0)
+            nu = (c/lamin[inds])[::-1]
+            w[inds[::-1]] = _simpsWeights(nu)/(h*nu)
+        else:
+            inds, = np.nonzero(lamin <= lam_0)
+            lam = lamin[inds]
+            w[inds] = _simpsWeights(lam)*lam/(h*c)
+        return w
+    return cached(key, weights)
+
+def calcQs(lamin, specs, mstar=1.0, helium=False, f_nu=False):
+    '''
+    Qs = calcQs(lam, specs)
+    Q of each spectrum in specs [..., n_lam] on the grid lam, as calcQ,
+    in one product with the grid's calcQWeights
+    '''
+    w = calcQWeights(lamin, helium=helium, f_nu=f_nu)
+    if f_nu: # calcQ does not scale f_nu spectra by mstar
+        return np.dot(specs, w)
+    return np.dot(specs, w)*mstar
+
 def calcU_avg(lamin, specin, Rinner=0.01, nh=100.0, eff=1.0, mass=1.0):
     '''
     Calculate <U>, the average ionization parameter
+    specin [n_spec, n_lam] and array nh, eff, mass give <U> of each
     '''
     Q = calcQ(lamin, specin)*mass
-    Rin = Rinner*3.09e18
     alphab = 2.59e-13
     c = 2.9979e10
     U = ((3.0*Q*nh*eff**2)/(4.0*np.pi))**(1./3)*alphab**(2./3)/c
@@ -56,34 +115,36 @@ def calcU(lamin=None, specin=None, Rinner=0.01, nh=30.0, Q=None):
     if 16 < Rinner < 30: assume logR in cm is given
     otherwise, assume R in cm is given.
     if Q is less than 100, assumes you have given a logQ
+    Rinner, nh and Q may be arrays; the rules apply element-wise
     '''
     if Q is None:
         Q = calcQ(lamin, specin)
     else:
-        if Q < 100.:
-            Q = 10.**Q
-    if Rinner < 16.: # assume pc given, convert to cm
-        Rin = Rinner*3.09e18
-    elif (Rinner >= 16. and Rinner <= 30.): # assume logR in cm given
-        Rin = 10.**Rinner
-    else: # assume R in cm is given
-        Rin = Rinner
+        Q = np.asarray(Q, dtype=float)
+        with np.errstate(over='ignore'):
+            Q = np.where(Q < 100., 10.**Q, Q)
+    Rinner = np.asarray(Rinner, dtype=float)
+    with np.errstate(over='ignore'):
+        Rin = np.where(Rinner < 16., Rinner*3.09e18,
+                       np.where(Rinner <= 30., 10.**Rinner, Rinner))
     c = 2.9979e10
     return Q/(4.0*np.pi*Rin**2.0*nh*c)
 
 def calcForLogQ(logU=None, Rinner=None, nh=None, logQ=None):
+    '''
+    log Q for logU at Rinner (cm if > 500, pc otherwise) and density nh,
+    element-wise for arrays
+    '''
     c = 2.9979e10
-    if Rinner > 500.0:
-        #means it is in cm
-        Rin = Rinner
-    else:
-        Rin = Rinner*3.09e18
-    Q = 10.0**logU*(4.0*np.pi*Rin**2.0*nh*c)
+    Rinner = np.asarray(Rinner, dtype=float)
+    Rin = np.where(Rinner > 500.0, Rinner, Rinner*3.09e18)
+    Q = 10.0**np.asarray(logU)*(4.0*np.pi*Rin**2.0*nh*c)
     return np.log10(Q)
 
 def calcRs(lamin, specin, eff=1.0, nh=100.0):
     '''
     Calculate the schwarzchild radius
+    specin [n_spec, n_lam] and array eff, nh give Rs of each
     '''
     alphab = 2.59e-13
     Q = calcQ(lamin, specin)
@@ -179,15 +240,11 @@ def sym_to_name(val=None):
             print("element not in ", list(elem_keys.keys()))
 
 def getEmis(use_vac=True):
-    lfile = pkg_resources.resource_filename(__name__, "data/emlines.dat")
-    dat = np.genfromtxt(lfile, delimiter='\t', dtype=('U12',float,float))
-    names = np.array([d[0].replace(' ','') for d in dat])
-    vacwavs = np.array([d[1] for d in dat])
-    airwavs = np.array([d[2] for d in dat])
+    dat = getEmisTable()
     if use_vac:
-        return (names, vacwavs)
+        return (dat['name'], dat['vac'])
     else:
-        return (names, airwavs)
+        return (dat['name'], dat['air'])
 
 def air_to_vac(inpt, no_uv_conv=True):
     '''
@@ -200,7 +257,10 @@ def air_to_vac(inpt, no_uv_conv=True):
         wl = np.asarray(inpt)
     to_vac = lambda lam: (6.4328e-5 + (2.94981e-2/(146.0-(1.0e4/lam)**2.0)) + (2.554e-4/(41.0-(1.0e4/lam)**2.0)))*lam + lam
     if no_uv_conv:
-        outpt = np.array([to_vac(lam) if lam > 2000.0 else lam for lam in wl])
+        # the UV wavelengths are kept, so their (possibly singular)
+        # conversion is not needed
+        with np.errstate(all='ignore'):
+            outpt = np.where(wl > 2000.0, to_vac(wl), wl)
     else:
         outpt = to_vac(wl)
     return outpt
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+__all__ = ["gridEmulator"]
+
+import numpy as np
+from scipy import sparse
+from .gridIndex import gridIndex
+from .gridStore import gridStore
+from .contPCA import storePCA
+from .cloudyInputTools import par_names
+
+###
+# Line fluxes and nebular continua between the models of a formatted
+# grid. Fluxes are interpolated in log10, over the axes in log10 where
+# asked (Age by default).
+#    regular grids (one model per cell of the axes, every cell filled,
+#    see gridIndex.regular): multilinear interpolation between the
+#    2^naxes corners of each point's cell
+#    irregular grids: linear interpolation in the simplices of the
+#    Delaunay triangulation of the models (as scipy's
+#    LinearNDInterpolator), with the axes scaled to [0, 1]. A point's
+#    simplex is found among those overlapping its cell of a uniform
+#    grid of buckets, since Delaunay.find_simplex falls back to a
+#    search of every simplex on the degenerate triangulations of
+#    partly regular grids.
+# Either way the log fluxes at a batch of points are one product of a
+# sparse [npts, nmod] matrix of interpolation weights with the
+# [nmod, nflux] log fluxes.
+# Points outside the grid are given fill_value.
+###
+class gridEmulator(object):
+    '''
+    emu = gridEmulator.fromStore(dir_, 'ZAU', 'lines')
+    emu(logZ=[0.0, -0.5], Age=[1.0e6, 3.0e6], logU=-2.5) -> [2, nlines]
+    emu(points)          points [npts, naxes], in the order of emu.axes
+    emu.lam              wavelengths of the emulated fluxes
+    gridEmulator(pars, fluxes, axes=['logZ', 'Age'], lam=lam) for any
+    pars (dict of model parameters) and fluxes [nmod, nflux]
+    gridEmulator(pars, pca=pca) interpolates the coefficients of a
+    contPCA of the continua (linear in log flux, so the same as
+    interpolating its reconstructed continua) and expands only the
+    result
+    '''
+    def __init__(self, pars, fluxes=None, axes=('logZ', 'Age', 'logU'),
+                 lam=None, log_axes=('Age',), floor=None, fill_value=np.nan,
+                 chunk_size=100000, pca=None):
+        self.pca = pca
+        if pca is not None:
+            fluxes = pca.coeffs
+            self.nflux = pca.nlam
+        else:
+            fluxes = np.asarray(fluxes, dtype=float)
+            self.nflux = fluxes.shape[1]
+        self.lam = lam
+        self.fill_value = fill_value
+        self.chunk_size = chunk_size
+        self.log_axes = [name for name in axes if name in log_axes]
+        coords = dict([(name, self._coord(name, pars[name])) for name in axes])
+        index = gridIndex(coords, axes)
+        # axes with one value are not interpolated over
+        self.axes = [name for name in axes if len(index.values[name]) > 1]
+        self.fixed = dict([(name, index.values[name][0]) for name in axes
+                           if name not in self.axes])
+        if pca is not None:
+            self.floor = pca.floor
+            logf = fluxes
+        else:
+            if floor is None:
+                positive = fluxes[fluxes > 0.]
+                floor = positive.min() if positive.size > 0 else 1.
+            self.floor = floor
+            logf = np.log10(np.maximum(fluxes, floor))
+        self.regular = index.regular and index.axes == self.axes
+        if self.regular:
+            self.coords = [index.values[name] for name in self.axes]
+            self.shape = index.shape
+            self.logf = logf[index.grid.ravel()]
+            self._strides = np.cumprod((1,)+self.shape[:0:-1])[::-1]
+        else:
+            from scipy.spatial import Delaunay
+            points = np.column_stack([coords[name] for name in self.axes])
+            # one model per set of parameters, the first as in a scan
+            points, first = np.unique(points, axis=0, return_index=True)
+            self._lo = points.min(axis=0)
+            self._span = points.max(axis=0) - self._lo
+            self.logf = logf[first]
+            self._tri = Delaunay(self._scale(points))
+            self._buckets()
+        return
+    def _coord(self, name, vals):
+        vals = np.asarray(vals, dtype=float)
+        if name in self.log_axes:
+            return np.log10(vals)
+        return vals
+    def _scale(self, points):
+        return (points - self._lo)/self._span
+    @classmethod
+    def fromStore(cls, dir_, mod_prefix, kind='lines',
+                  axes=('logZ', 'Age', 'logU'), names=None, tol=None,
+                  **kwargs):
+        '''
+        gridEmulator.fromStore(dir_, 'ZAU', 'cont', axes=['logZ', 'Age',
+                               'logU', 'nH'])
+        emulator of the .out_lines (kind='lines') or .out_cont ('cont')
+        fluxes in the grid store PREFIX.grid/. axes are columns of
+        PREFIX.pars, named by names (default cloudyInputTools.par_names)
+        continua are emulated from the full continua by default; with
+        tol (e.g. 0.01) they go through their contPCA within tol dex
+        instead (fit and saved in the store if need be, see storePCA),
+        which is faster but approximate
+        '''
+        store = gridStore(dir_, mod_prefix)
+        if names is None:
+            names = par_names
+        pars = {}
+        for i, col in enumerate(store.pars.T):
+            pars[names[i] if i < len(names) else "par{}".format(i)] = col
+        if kind == 'lines':
+            lam, fluxes = store.line_lam, store.lines
+        elif kind == 'cont' and store.cont is not None:
+            lam, fluxes = store.cont_lam, store.cont
+            if tol is not None:
+                kwargs['pca'] = storePCA(dir_, mod_prefix, tol=tol)
+                fluxes = None
+        else:
+            raise ValueError("{} has no {} fluxes".format(store.path, kind))
+        return cls(pars, fluxes, axes=axes, lam=np.array(lam), **kwargs)
+    def _points(self, args, pars):
+        if len(args) > 0:
+            points = np.atleast_2d(np.asarray(args[0], dtype=float))
+            if points.shape[1] != len(self.axes):
+                raise ValueError("points need {} columns, {}".format(
+                    len(self.axes), self.axes))
+            return points.copy()
+        missing = [name for name in self.axes if name not in pars]
+        if len(missing) > 0:
+            raise ValueError("no values for {}".format(missing))
+        cols = np.broadcast_arrays(*[np.asarray(pars[name], dtype=float)
+                                     for name in self.axes])
+        return np.column_stack([np.ravel(col) for col in cols])
+    def __call__(self, *args, **pars):
+        '''
+        emu(points) or emu(logZ=..., Age=..., logU=...) -> [npts, nflux]
+        '''
+        points = self._points(args, pars)
+        for j, name in enumerate(self.axes):
+            points[:,j] = self._coord(name, points[:,j])
+        out = np.empty((len(points), self.nflux))
+        for i0 in range(0, len(points), self.chunk_size):
+            chunk = slice(i0, i0+self.chunk_size)
+            if self.regular:
+                cols, weights, outside = self._multilinear(points[chunk])
+            else:
+                cols, weights, outside = self._simplex(points[chunk])
+            npts, nw = weights.shape
+            W = sparse.csr_matrix((weights.ravel(), cols.ravel(),
+                                   np.arange(0, npts*nw+1, nw)),
+                                  shape=(npts, len(self.logf)))
+            if self.pca is not None:
+                self.pca.expand(W.dot(self.logf), out=out[chunk])
+            else:
+                logf = W.dot(self.logf)
+                logf *= np.log(10.)
+                np.exp(logf, out=out[chunk])
+            out[chunk][outside] = self.fill_value
+        return out
+    def _multilinear(self, points):
+        '''
+        cells of the 2^naxes corners of each point's cell, their weights,
+        and the points outside the grid
+        '''
+        npts, naxes = points.shape
+        cells = np.zeros((naxes, npts), dtype=int)
+        fracs = np.zeros((naxes, npts))
+        outside = np.zeros(npts, dtype=bool)
+        for j, coord in enumerate(self.coords):
+            x = points[:,j]
+            outside |= (x < coord[0]) | (x > coord[-1]) | np.isnan(x)
+            i = np.clip(np.searchsorted(coord, x, side='right')-1, 0,
+                        len(coord)-2)
+            cells[j] = i
+            with np.errstate(all='ignore'):
+                fracs[j] = (x - coord[i])/(coord[i+1] - coord[i])
+        fracs[:,outside] = 0.
+        base = np.dot(self._strides, cells)
+        ncorners = 2**naxes
+        cols = np.zeros((npts, ncorners), dtype=int)
+        weights = np.ones((npts, ncorners))
+        for corner in range(ncorners):
+            bits = [(corner >> (naxes-1-j)) & 1 for j in range(naxes)]
+            cols[:,corner] = base + np.dot(self._strides, bits)
+            for j, bit in enumerate(bits):
+                weights[:,corner] *= fracs[j] if bit else 1. - fracs[j]
+        return cols, weights, outside
+    def _buckets(self):
+        '''
+        simplices overlapping each cell of an m^naxes grid of buckets
+        over the scaled axes (by their bounding boxes): those of bucket
+        i are self._bucket_simplex[self._bounds[i]:self._bounds[i+1]]
+        '''
+        tri = self._tri
+        self._nbucket = m = max(1, int(np.ceil(tri.npoints**(1./tri.ndim))))
+        corners = tri.points[tri.simplices]
+        lo = np.clip((corners.min(axis=1)*m).astype(int), 0, m-1)
+        hi = np.clip((corners.max(axis=1)*m).astype(int), 0, m-1)
+        buckets, simplices = [], []
+        for i in range(tri.nsimplex):
+            ranges = [np.arange(l, h+1) for l, h in zip(lo[i], hi[i])]
+            cells = np.ravel_multi_index(np.meshgrid(*ranges, indexing='ij'),
+                                         (m,)*tri.ndim).ravel()
+            buckets.append(cells)
+            simplices.append(np.full(cells.size, i))
+        buckets = np.concatenate(buckets)
+        order = np.argsort(buckets, kind='mergesort')
+        self._bucket_simplex = np.concatenate(simplices)[order]
+        self._bounds = np.searchsorted(buckets[order], np.arange(m**tri.ndim+1))
+        return
+    def _barycentric(self, simplex, x):
+        # see scipy.spatial.Delaunay.transform
+        T = self._tri.transform[simplex]
+        bary = np.einsum('pij,pj->pi', T[:,:-1], x - T[:,-1])
+        return np.column_stack((bary, 1. - bary.sum(axis=1)))
+    def _simplex(self, points, eps=1.0e-10):
+        '''
+        models at the vertices of each point's simplex, their barycentric
+        weights, and the points outside the triangulation
+        '''
+        x = self._scale(points)
+        npts, ndim = x.shape
+        m = self._nbucket
+        with np.errstate(invalid='ignore'):
+            ind = np.clip(np.nan_to_num(x*m).astype(int), 0, m-1)
+        bucket = np.ravel_multi_index(ind.T, (m,)*ndim)
+        first = self._bounds[bucket]
+        count = self._bounds[bucket+1] - first
+        simplex = np.full(npts, -1, dtype=int)
+        # the k-th candidate of every point still without a simplex
+        todo = np.nonzero(count > 0)[0]
+        k = 0
+        while todo.size > 0:
+            cand = self._bucket_simplex[first[todo]+k]
+            inside = (self._barycentric(cand, x[todo]) >= -eps).all(axis=1)
+            simplex[todo[inside]] = cand[inside]
+            k += 1
+            todo = todo[~inside & (count[todo] > k)]
+        outside = simplex < 0
+        simplex[outside] = 0
+        weights = self._barycentric(simplex, x)
+        weights[outside] = 0.
+        return self._tri.simplices[simplex], weights, outside
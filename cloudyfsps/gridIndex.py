@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+__all__ = ["gridIndex"]
+
+import numpy as np
+
+###
+# Index of a model grid by its parameters. Each parameter's values are
+# coded by their position in its sorted unique values; the models of a
+# value are a slice of one argsort. The parameters that split the grid
+# (axes) index an N-D array of model positions, so a set of parameter
+# values finds its model without scanning the grid. Parameters that do
+# not split it further (logQ given logZ, age, logU, ...) are functions of
+# the axes and are matched on the selected models only.
+###
+class gridIndex(object):
+    '''
+    ind = gridIndex({'logZ':mods.logZ, 'age':mods.age, 'logU':mods.logU})
+    ind.axes                    parameters spanning ind.grid
+    ind.grid[iZ, iA, iU]        position of the model, -1 if none
+    ind.positions('logZ', 0.0)  positions of the models with logZ = 0.0
+    ind.select(age=1.0e6, logU=-2.0) -> positions over the other axes
+    ind.table('logZ', 'age', logU=-2.0) -> [n_age, n_logZ] positions
+    values are matched exactly, as in mod.logZ == 0.0
+    '''
+    def __init__(self, pars, names=None):
+        self.names = list(pars) if names is None else list(names)
+        self.nmods = len(pars[self.names[0]])
+        self.values, self.codes = {}, {}
+        self._lookup, self._order, self._bounds = {}, {}, {}
+        for name in self.names:
+            vals, codes = np.unique(np.asarray(pars[name], dtype=float),
+                                    return_inverse=True)
+            codes = codes.ravel()
+            self.values[name] = vals
+            self.codes[name] = codes
+            self._lookup[name] = dict([(float(val), i)
+                                       for i, val in enumerate(vals)])
+            # stable, so each value's positions are in model order
+            order = np.argsort(codes, kind='mergesort')
+            self._order[name] = order
+            self._bounds[name] = np.searchsorted(codes[order],
+                                                 np.arange(len(vals)+1))
+        self.axes = []
+        cell = np.zeros(self.nmods, dtype=int)
+        ncells = 1
+        for name in self.names:
+            n = len(self.values[name])
+            if n == 1:
+                continue
+            uniq, new = np.unique(cell*n + self.codes[name],
+                                  return_inverse=True)
+            if len(uniq) > ncells:
+                self.axes.append(name)
+                cell, ncells = new.ravel(), len(uniq)
+        self.shape = tuple([len(self.values[name]) for name in self.axes])
+        # first model of each cell, as a scan over the models would find
+        grid = np.full(int(np.prod(self.shape)), self.nmods, dtype=int)
+        if len(self.axes) > 0:
+            flat = np.ravel_multi_index([self.codes[name]
+                                         for name in self.axes], self.shape)
+        else:
+            flat = np.zeros(self.nmods, dtype=int)
+        np.minimum.at(grid, flat, np.arange(self.nmods))
+        grid[grid == self.nmods] = -1
+        self.grid = grid.reshape(self.shape)
+        self.unique = ncells == self.nmods
+        self.regular = self.unique and ncells == grid.size
+        return
+    def code(self, name, val):
+        '''
+        position of val in self.values[name], None if no model has it
+        '''
+        if name not in self._lookup:
+            raise KeyError('{} is not an indexed parameter'.format(name))
+        return self._lookup[name].get(float(val))
+    def positions(self, name, val):
+        '''
+        positions of the models with name == val, in model order
+        '''
+        i = self.code(name, val)
+        if i is None:
+            return np.zeros(0, dtype=int)
+        bounds = self._bounds[name]
+        return self._order[name][bounds[i]:bounds[i+1]]
+    def select(self, **constraints):
+        '''
+        ind.select(logZ=0.0, age=1.0e6) -> positions of the matching
+        models over the unconstrained axes, -1 where there is none.
+        with constraints on axes only, this is a view of self.grid.
+        '''
+        codes = dict([(name, self.code(name, val))
+                      for name, val in constraints.items()])
+        ind = [slice(None)]*len(self.axes)
+        for name, i in codes.items():
+            if name in self.axes:
+                ind[self.axes.index(name)] = 0 if i is None else i
+        sel = self.grid[tuple(ind)]
+        if None in codes.values():
+            return np.full(sel.shape, -1, dtype=int)
+        other = [(name, i) for name, i in codes.items()
+                 if name not in self.axes]
+        if len(other) == 0:
+            return sel
+        keep = sel >= 0
+        for name, i in other:
+            keep &= self.codes[name][sel] == i
+        return np.where(keep, sel, -1)
+    def table(self, x_name, y_name, x_vals=None, y_vals=None, **constraints):
+        '''
+        ind.table('logZ', 'age', logU=-2.0) -> [len(y_vals), len(x_vals)]
+        position of the first model matching the constraints in each
+        cell of x_vals (default: every value of x_name) by y_vals, -1
+        where there is none
+        '''
+        if x_vals is None:
+            x_vals = self.values[x_name]
+        if y_vals is None:
+            y_vals = self.values[y_name]
+        pos = self.select(**constraints)
+        pos = pos[pos >= 0]
+        cells = []
+        for name, vals in [(y_name, y_vals), (x_name, x_vals)]:
+            lookup = dict([(float(val), i) for i, val in enumerate(vals)])
+            # cell of each of the parameter's values, -1 if not in vals
+            cell = np.array([lookup.get(float(val), -1)
+                             for val in self.values[name]], dtype=int)
+            cells.append(cell[self.codes[name][pos]])
+        keep = (cells[0] >= 0) & (cells[1] >= 0)
+        out = np.full((len(y_vals), len(x_vals)), self.nmods, dtype=int)
+        np.minimum.at(out, (cells[0][keep], cells[1][keep]), pos[keep])
+        out[out == self.nmods] = -1
+        return out
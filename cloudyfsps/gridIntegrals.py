@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+__all__ = ["gridIntegrals"]
+
+import numpy as np
+from .radialStore import segmentSum
+
+###
+# Volume integrals of every model of a grid at once, over the zones of a
+# radialStore. The integrand of all zones of all models is one flat
+# array; the integral of each model is a segment sum of integrand*dV,
+# with dV = 4 pi r^2 dr * filling factor as modObj.dvff. Each result is
+# computed once and kept, so asking for T0 or a line's volume emissivity
+# of the whole grid again costs nothing.
+###
+class gridIntegrals(object):
+    '''
+    gi = mods.integrals()            or gridIntegrals(mods.radial())
+    gi.T0, gi.Tpiem                  [nmods], as mod.T0 and mod.Tpiem
+    gi.vol_integ(rs['nH'])           integral over the volume of each model
+    gi.vol_mean(rs['Te'], rs['nH'])  nH-weighted mean Te of each model
+    gi.emis_vol()                    [nmods, n_emis], as mod.get_emis_vol
+    gi.emis_vol('H__1_656285A')      [nmods]
+    gi.ion_temp('O', 2)              Te weighted by ne*n(O++)
+    gi.cooling()['frac_cool_O']      as mod.frac_cool_O
+    '''
+    def __init__(self, rs, cool_agents=None):
+        self.rs = rs
+        self.offsets = rs.offsets
+        self.nmods = rs.nmods
+        # attribute: .cool column, as modObj cool_agents
+        if cool_agents is None:
+            cool_agents = dict([(label, label) for label in rs.cool_labels])
+        self.cool_agents = cool_agents
+        self._cache = {}
+        return
+    def _cached(self, key, func):
+        if key not in self._cache:
+            self._cache[key] = func()
+        return self._cache[key]
+    @property
+    def zone_model(self):
+        return self._cached('zone_model', lambda: self.rs.zone_model)
+    @property
+    def dvff(self):
+        '''
+        filled volume of every zone
+        '''
+        def dvff():
+            rs = self.rs
+            dv = 4.*np.pi*np.asarray(rs['radius'])**2*rs['dr']
+            return dv*rs['fillfac']
+        return self._cached('dvff', dvff)
+    def per_zone(self, values):
+        '''
+        gi.per_zone(gi.T0) -> the value of each zone's model, for every zone
+        '''
+        return np.asarray(values)[self.zone_model]
+    def vol_integ(self, a):
+        '''
+        gi.vol_integ(flat) -> [nmods, ...] integral of a zone quantity
+        (flat along its first axis) over the volume of each model
+        '''
+        a = np.asarray(a)
+        dvff = self.dvff.reshape((-1,)+(1,)*(a.ndim-1))
+        return segmentSum(a*dvff, self.offsets)
+    def vol_mean(self, a, b=1.):
+        '''
+        gi.vol_mean(a, b) -> [nmods] mean of a weighted by b over the
+        volume of each model (NaN where the weight integrates to 0)
+        '''
+        b = np.broadcast_to(b, np.shape(a))
+        with np.errstate(all='ignore'):
+            return self.vol_integ(a*b)/self.vol_integ(b)
+    @property
+    def nenH(self):
+        return self._cached('nenH', lambda: np.asarray(self.rs['ne'])*
+                            self.rs['nH'])
+    @property
+    def T0(self):
+        return self._cached('T0', lambda: self.vol_mean(self.rs['Te'],
+                                                        self.nenH))
+    @property
+    def Tpiem(self):
+        def Tpiem():
+            T0 = self.per_zone(self.T0)
+            return self.vol_mean((self.rs['Te']-T0)**2./self.nenH, T0**2)
+        return self._cached('Tpiem', Tpiem)
+    def ion_temp(self, ele, ion):
+        '''
+        gi.ion_temp('O', 2) -> [nmods] Te weighted by ne*n(O++)
+        '''
+        return self._cached(('ion_temp', ele, ion), lambda: self.vol_mean(
+            self.rs['Te'], self.nenH*self.rs.ion(ele, ion)))
+    def emis_vol(self, label=None):
+        '''
+        gi.emis_vol() -> [nmods, n_emis] volume emissivity of every line
+        gi.emis_vol(label) -> [nmods]
+        '''
+        emis = self._cached('emis_vol', lambda: self.vol_integ(self.rs['emis']))
+        if label is None:
+            return emis
+        return emis[:, self.rs.emis_labels.index(label)]
+    def cooling(self):
+        '''
+        gi.cooling() -> dict of [nmods] arrays, as modObj._init_cool:
+        Ctot, cool_CE, frac_cool_CE and frac_<agent> for each cool_agents
+        '''
+        def cooling():
+            labels = self.rs.cool_labels
+            integ = self.vol_integ(self.rs['cool'])
+            Ctot = integ[:, labels.index('Ctotergcm3s')]
+            with np.errstate(all='ignore'):
+                fracs = integ/Ctot[:, None]
+            # collisional excitation coolants, after depth and the first
+            # four columns of the .cool file
+            CE = slice(4, 32)
+            out = dict(Ctot=Ctot, cool_CE=integ[:, CE].sum(axis=1),
+                       frac_cool_CE=fracs[:, CE].sum(axis=1))
+            for att, label in self.cool_agents.items():
+                out['frac_'+att] = fracs[:, labels.index(label)]
+            return out
+        return self._cached('cooling', cooling)
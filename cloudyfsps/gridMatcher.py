@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+__all__ = ["gridMatcher"]
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+###
+# Nearest models of a grid to observed line ratios. The models are
+# points in the space of a few ratios (log_NII_Ha, log_OIII_Hb, ... of
+# lineRatios, each divided by its scale), indexed by a cKDTree; a whole
+# catalog is matched in one query. Objects missing a ratio (nan or inf,
+# e.g. a line not detected) are matched on the ratios they have, with a
+# tree over those dimensions only; models are left out of a tree if one
+# of its ratios is not finite.
+###
+class gridMatcher(object):
+    '''
+    gm = gridMatcher.fromGrid(mods, ['log_NII_Ha', 'log_OIII_Hb'])
+    dist, inds = gm.match(sdss.load_spec(), k=5)
+        inds [nobj, k]: models nearest each object (positions in
+        mods.mods), closest first; -1 (dist inf) where there are fewer
+        than k models, or no ratio of the object is finite
+        dist [nobj, k]: their distances in (scaled) ratio space
+    gm.ndim [nobj]: how many ratios each object was matched on
+    gridMatcher(ratios, names) for any {name: [nmod]} (or ratioTable)
+    '''
+    def __init__(self, ratios, names, scale=None, leafsize=16):
+        self.names = list(names)
+        if scale is None:
+            scale = np.ones(len(self.names))
+        self.scale = np.asarray(scale, dtype=float)*np.ones(len(self.names))
+        self.points = self._points(ratios)
+        self.nmods = len(self.points)
+        self.leafsize = leafsize
+        self._trees = {}
+        self.ndim = None
+        return
+    @classmethod
+    def fromGrid(cls, mods, names=('log_NII_Ha', 'log_OIII_Hb'), **kwargs):
+        '''
+        gridMatcher.fromGrid(mods, names) over the ratios of an allmods
+        grid (mods.ratios)
+        '''
+        return cls(mods.ratios, names, **kwargs)
+    def _points(self, ratios):
+        return np.column_stack([np.asarray(ratios[name], dtype=float).ravel()
+                                for name in self.names])/self.scale
+    def _tree(self, dims):
+        '''
+        (cKDTree, models) over the ratios dims, of the models with all
+        of them finite
+        '''
+        if dims not in self._trees:
+            cols = list(dims)
+            good = np.nonzero(np.isfinite(self.points[:,cols]).all(axis=1))[0]
+            tree = cKDTree(self.points[good][:,cols], leafsize=self.leafsize)
+            self._trees[dims] = (tree, good)
+        return self._trees[dims]
+    def match(self, obs, k=1):
+        '''
+        dist, inds = gm.match(obs, k=5) for obs {name: [nobj]} with the
+        matcher's ratio names (sdss.load_spec(), vanzee.vz_ratios(), ...)
+        '''
+        x = np.atleast_2d(self._points(obs))
+        nobj = len(x)
+        dist = np.full((nobj, k), np.inf)
+        inds = np.full((nobj, k), -1, dtype=int)
+        finite = np.isfinite(x)
+        self.ndim = finite.sum(axis=1)
+        # one query per pattern of finite ratios
+        patterns, which = np.unique(finite, axis=0, return_inverse=True)
+        for j, pattern in enumerate(patterns):
+            if not pattern.any():
+                continue
+            dims = tuple(np.nonzero(pattern)[0])
+            tree, good = self._tree(dims)
+            if tree.n == 0:
+                continue
+            rows = np.nonzero(np.ravel(which) == j)[0]
+            d, i = tree.query(x[rows][:,list(dims)], k=k)
+            d, i = d.reshape(len(rows), k), i.reshape(len(rows), k)
+            found = i < tree.n
+            dist[rows] = np.where(found, d, np.inf)
+            inds[rows] = np.where(found, good[np.minimum(i, tree.n-1)], -1)
+        return dist, inds
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+__all__ = ["gridStore", "storeDir", "storeExists"]
+
+import os
+import json
+import numpy as np
+
+###
+# Binary store for a formatted grid, in PREFIX.grid/ next to the models:
+#    pars.npy      [nmod, npar] copy of PREFIX.pars
+#    line_lam.npy  [nline] sorted vacuum wavelengths (ang)
+#    lines.npy     [nmod, nline] line fluxes, units of ***.out_lines
+#    cont_lam.npy  [nlam] FSPS wavelengths (ang)
+#    cont.npy      [nmod, nlam] diffuse continuum, units of ***.out_cont
+#    stamp.npy     [nmod] mtime of the Cloudy output each row was made
+#                  from; 0 until the model has been formatted
+#    info.json     units and options
+#    cont_pca.npz  PCA of the continua, see contPCA.storePCA
+# Every array is a .npy file and is opened memory-mapped, so each model
+# writes only its own rows and readers only touch the rows they use.
+# A store may keep only the PCA of its continua (storePCA(drop_cont=True),
+# info cont_pca): cont.npy is removed and store.cont reconstructs rows
+# from cont_pca.npz. Rows can no longer be written to it.
+###
+def storeDir(dir_, mod_prefix):
+    return "{}{}.grid".format(dir_, mod_prefix)
+
+def storeExists(dir_, mod_prefix):
+    return os.path.exists(os.path.join(storeDir(dir_, mod_prefix), "info.json"))
+
+class gridStore(object):
+    '''
+    store = gridStore(dir_, 'ZAU')           # read only
+    store = gridStore(dir_, 'ZAU', mode='r+') # to write rows
+    store.lines[modnum-1], store.cont[modnum-1]
+    '''
+    def __init__(self, dir_, mod_prefix, mode='r'):
+        self.path = storeDir(dir_, mod_prefix)
+        self.mode = mode
+        f = open(os.path.join(self.path, "info.json"), "r")
+        self.info = json.load(f)
+        f.close()
+        self.pars = self._open("pars")
+        self.line_lam = self._open("line_lam")
+        self.lines = self._open("lines")
+        self.stamp = self._open("stamp")
+        self.pca_file = os.path.join(self.path, "cont_pca.npz")
+        if self.info["has_cont"]:
+            self.cont_lam = self._open("cont_lam")
+            if self.info.get("cont_pca"):
+                from .contPCA import contPCA, pcaRows
+                self.cont = pcaRows(contPCA.load(self.pca_file))
+            else:
+                self.cont = self._open("cont")
+        else:
+            self.cont_lam, self.cont = None, None
+        self.nmods = self.pars.shape[0]
+        return
+    def _file(self, key):
+        return os.path.join(self.path, key+".npy")
+    def _open(self, key):
+        return np.load(self._file(key), mmap_mode=self.mode)
+    @classmethod
+    def create(cls, dir_, mod_prefix, pars, line_lam, cont_lam=None,
+               float32=False, **info):
+        '''
+        gridStore.create(dir_, 'ZAU', pars, line_lam, fsps_lam)
+        makes an empty store and returns it opened for writing.
+        extra keywords are saved in info.json.
+        '''
+        path = storeDir(dir_, mod_prefix)
+        if not os.path.exists(path):
+            os.makedirs(path)
+        pars = np.atleast_2d(pars)
+        nmod = pars.shape[0]
+        dtype = np.float32 if float32 else np.float64
+        # new files rather than truncating old ones, which may still be
+        # mapped by a reader
+        for fname in os.listdir(path):
+            os.remove(os.path.join(path, fname))
+        def save(key, arr):
+            np.save(os.path.join(path, key+".npy"), arr)
+        def empty(key, shape):
+            arr = np.lib.format.open_memmap(os.path.join(path, key+".npy"),
+                                            mode="w+", dtype=dtype,
+                                            shape=shape)
+            del arr
+        save("pars", np.asarray(pars, dtype=float))
+        save("line_lam", np.asarray(line_lam, dtype=float))
+        save("stamp", np.zeros(nmod))
+        empty("lines", (nmod, len(line_lam)))
+        if cont_lam is not None:
+            save("cont_lam", np.asarray(cont_lam, dtype=float))
+            empty("cont", (nmod, len(cont_lam)))
+        info["has_cont"] = cont_lam is not None
+        info["float32"] = bool(float32)
+        f = open(os.path.join(path, "info.json"), "w")
+        json.dump(info, f)
+        f.close()
+        return cls(dir_, mod_prefix, mode="r+")
+    def matches(self, pars, line_lam, cont_lam=None, **info):
+        '''
+        True if the store was made for this grid and these options
+        '''
+        pars = np.atleast_2d(pars)
+        if self.pars.shape != pars.shape or not np.allclose(self.pars, pars):
+            return False
+        if not np.array_equal(self.line_lam, line_lam):
+            return False
+        if (cont_lam is None) != (self.cont_lam is None):
+            return False
+        if cont_lam is not None and not np.array_equal(self.cont_lam, cont_lam):
+            return False
+        return all(self.info.get(key) == val for key, val in info.items())
+    def write(self, modnum, lines=None, cont=None, stamp=None):
+        '''
+        store.write(modnum, lines=line_flu, cont=diffuse_out, stamp=mtime)
+        '''
+        i = int(modnum) - 1
+        if lines is not None:
+            self.lines[i] = lines
+        if cont is not None:
+            if self.info.get("cont_pca"):
+                raise ValueError("{} keeps only the PCA of its continua; "
+                                 "make a new store to write them".format(self.path))
+            self.cont[i] = cont
+        if stamp is not None:
+            self.stamp[i] = stamp
+        return
+    def dropCont(self):
+        '''
+        store.dropCont()
+        removes cont.npy, keeping only the PCA in cont_pca.npz (which
+        must exist, see contPCA.storePCA); store.cont then reconstructs
+        '''
+        if self.info.get("cont_pca") or self.cont is None:
+            return
+        if not os.path.exists(self.pca_file):
+            raise ValueError("{} has no PCA of its continua".format(self.path))
+        self.info["cont_pca"] = True
+        f = open(os.path.join(self.path, "info.json"), "w")
+        json.dump(self.info, f)
+        f.close()
+        from .contPCA import contPCA, pcaRows
+        self.cont = pcaRows(contPCA.load(self.pca_file))
+        os.remove(self._file("cont"))
+        return
+    def flush(self):
+        for arr in [self.lines, self.cont, self.stamp]:
+            if isinstance(arr, np.memmap):
+                arr.flush()
+        return
+    def isCurrent(self, modnum, mtime):
+        '''
+        True if the model's rows were made from output no older than mtime
+        '''
+        return self.stamp[int(modnum)-1] >= mtime
+    @property
+    def complete(self):
+        return bool(np.all(self.stamp[:] > 0.0))
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+__all__ = ["named_lines", "line_groups", "ratio_defs", "registerRatio",
+           "getLineIndex", "lineColumns", "ratioTable"]
+
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from .dataTools import cached
+
+# vacuum wavelengths (ang) of the lines modObj and allmods name
+named_lines = {'Lya':1215.67,
+               'Ha':6564.60,
+               'HeI':5877.243,
+               'HeII':4687.015,
+               'HeIIu':1640.42,
+               'Hb':4862.71,
+               'Hg':4341.692,
+               'Hd':4102.892,
+               'OIIIa':4960.295,
+               'OIIIb':5008.240,
+               'NIIa':6549.86,
+               'NIIb':6585.27,
+               'OIIa':3727.10,
+               'OIIb':3729.86,
+               'SIIa':6718.294,
+               'SIIb':6732.673,
+               'OI':6302.046,
+               'NeIIIb':3869.86,
+               'NeIIIa':3968.59,
+               'SIII':6313.81,
+               'ArIII':7137.77}
+
+###
+# Registry of line ratios. A ratio is the sum of its numerator lines
+# over the sum of its denominator lines, in log10 unless linear. A name
+# in line_groups stands for the sum of its lines, unless the fluxes have
+# a column of that name (catalogs that only give [N II] 6548+6584 as
+# 'NII'). Sums are taken left to right over the lines, so a ratio has
+# the same value as the expression written out by hand.
+###
+line_groups = {'NII':('NIIa', 'NIIb'),
+               'SII':('SIIa', 'SIIb'),
+               'OII':('OIIa', 'OIIb'),
+               'OIII':('OIIIa', 'OIIIb')}
+
+# name: (numerator lines, denominator lines, log10)
+ratio_defs = OrderedDict()
+
+def registerRatio(name, num, den=(), log=True):
+    '''
+    registerRatio('log_HeII_Hb', ['HeII'], ['Hb'])
+    adds (or replaces) a ratio of the registry
+    '''
+    ratio_defs[name] = (tuple(num), tuple(den), log)
+    return
+
+for _name, _num, _den in [('log_NII_Ha', ['NII'], ['Ha']),
+                          ('log_SII_Ha', ['SII'], ['Ha']),
+                          ('log_OIII_Hb', ['OIII'], ['Hb']),
+                          ('log_NIIa_Ha', ['NIIa'], ['Ha']),
+                          ('log_NIIb_Ha', ['NIIb'], ['Ha']),
+                          ('log_SIIa_Ha', ['SIIa'], ['Ha']),
+                          ('log_SIIb_Ha', ['SIIb'], ['Ha']),
+                          ('log_OIIIa_Hb', ['OIIIa'], ['Hb']),
+                          ('log_OIIIb_Hb', ['OIIIb'], ['Hb']),
+                          ('log_OIII_OII', ['OIII'], ['OII']),
+                          ('log_OIIIa_OII', ['OIIIa'], ['OII']),
+                          ('log_OIIIb_OII', ['OIIIb'], ['OII']),
+                          ('log_OI_Ha', ['OI'], ['Ha']),
+                          ('log_OIa_Ha', ['OIa'], ['Ha']),
+                          ('log_OII_Ha', ['OII'], ['Ha']),
+                          ('log_NII_OII', ['NII'], ['OII']),
+                          ('log_NeIIIb_OII', ['NeIIIb'], ['OII']),
+                          ('R23', ['OII', 'OIII'], ['Hb'])]:
+    registerRatio(_name, _num, _den)
+registerRatio('HaHb', ['Ha'], ['Hb'], log=False)
+
+def getLineIndex(lam, lines):
+    '''
+    inds = getLineIndex(line_lam, {'O3':1666.0})
+    dict of the index of the line nearest each wavelength in the sorted
+    wavelength array lam (same choice as np.argmin(np.abs(lam-wav))).
+    every model of a grid shares lam, so the map is computed once.
+    '''
+    lam = np.asarray(lam, dtype=float)
+    names = sorted(lines)
+    wavs = np.array([lines[name] for name in names], dtype=float)
+    key = ('lineindex', hashlib.sha1(lam.tobytes()).hexdigest(),
+           tuple(names), wavs.tobytes())
+    def build():
+        if np.any(lam[1:] < lam[:-1]):
+            return dict([(name, np.argmin(np.abs(lam-wav)))
+                         for name, wav in zip(names, wavs)])
+        hi = np.clip(np.searchsorted(lam, wavs), 1, lam.size-1)
+        lo = hi - 1
+        near = np.where(np.abs(lam[lo]-wavs) <= np.abs(lam[hi]-wavs), lo, hi)
+        # first of any repeated wavelengths, as argmin would pick
+        near = np.searchsorted(lam, lam[near])
+        return dict(zip(names, near))
+    return cached(key, build)
+
+def lineColumns(flux, lam, lines=None):
+    '''
+    lineColumns(mods.line_flux, mods.line_lam) -> {'Ha':[nmod], ...}
+    the column of the flux matrix [nmod, nlam] nearest each named line
+    (default named_lines)
+    '''
+    if lines is None:
+        lines = named_lines
+    flux = np.asarray(flux)
+    return dict([(name, flux[..., ind]) for name, ind in
+                 getLineIndex(lam, lines).items()])
+
+class ratioTable(object):
+    '''
+    rt = ratioTable({'Ha':Ha, 'Hb':Hb, 'NIIa':NIIa, ...})
+    rt['log_NII_Ha']   every model (or object) at once, computed on
+                       first access and kept
+    rt.names           the registered ratios these fluxes allow
+    rt.all()           dict of all of them
+    fluxes are arrays (or numbers) of matching shape, keyed by line
+    or line_groups name
+    '''
+    def __init__(self, lines):
+        self.lines = lines
+        self._cache = {}
+        return
+    def _flat(self, name):
+        '''
+        the lines of name present in the fluxes
+        '''
+        if name in self.lines:
+            return [name]
+        if name in line_groups:
+            return [line for member in line_groups[name]
+                    for line in self._flat(member)]
+        raise KeyError("no flux for line {}".format(name))
+    def _sum(self, names):
+        lines = [line for name in names for line in self._flat(name)]
+        total = self.lines[lines[0]]
+        for line in lines[1:]:
+            total = total + self.lines[line]
+        return total
+    def has(self, name):
+        num, den, log = ratio_defs[name]
+        try:
+            [self._flat(line) for line in num+den]
+        except KeyError:
+            return False
+        return True
+    @property
+    def names(self):
+        return [name for name in ratio_defs if self.has(name)]
+    def __contains__(self, name):
+        return name in ratio_defs and self.has(name)
+    def __getitem__(self, name):
+        if name not in self._cache:
+            if name not in ratio_defs:
+                raise KeyError("{} is not a registered ratio".format(name))
+            num, den, log = ratio_defs[name]
+            val = self._sum(num)
+            with np.errstate(all='ignore'):
+                if len(den) > 0:
+                    val = val/self._sum(den)
+                if log:
+                    val = np.log10(val)
+            self._cache[name] = val
+        return self._cache[name]
+    def all(self):
+        return OrderedDict([(name, self[name]) for name in self.names])
@@ -10,13 +10,29 @@ from builtins import next
 from builtins import str
 from builtins import range
 from builtins import object
-__all__ = ["getColors", "nColors", "allmods"]
+__all__ = ["getColors", "nColors", "allmods", "stellarPopulation",
+           "get_fsps_specs"]
+import os
+import re
+import hashlib
+import warnings
+from collections import OrderedDict
+import multiprocessing
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.colors as mpl_colors
 from matplotlib import cm as cmx
 import fsps
-from .generalTools import calcQ, air_to_vac, getEmis
+from .generalTools import calcQs, air_to_vac, getEmis
+from .cloudyInputTools import getGridProducts
+from .cloudyParsers import readTable, readSave
+from .dataTools import cached
+from .gridIndex import gridIndex
+from .radialStore import radialStore, buildRadial
+from .gridIntegrals import gridIntegrals
+from .gridMatcher import gridMatcher
+from .lineRatios import (named_lines, ratio_defs, getLineIndex, lineColumns,
+                         ratioTable)
 from .astrodata import dopita, sdss, vanzee, kewley
 import pkg_resources
 
@@ -94,17 +110,400 @@ def sextract(text, par1=None, par2=None):
                 res.append(res1)
         return res
 
+###
+# Cloudy .out summaries. _scan_out keeps the lines modObj uses, under the
+# key of the first test in _out_tests they pass, as the forward loop of
+# the old _read_out did: the last line of each key wins, and the 7 lines
+# after a Hi-Con line are SED1..SED7 and not tested. parseOut then reads
+# the numbers with the precompiled patterns of _out_fields.
+#
+# Why not a forward pass that stops once every field is found: Cloudy
+# prints these blocks again every iteration, and the values wanted are
+# those of the last one. A forward pass only knows it has seen the last
+# line of a key at the end of the file, so it cannot stop early without
+# keeping values of an earlier iteration. Instead, each key is searched
+# for backwards from the end of the text (str.rfind, in C) and its search
+# stops at the first line that passes, i.e. the last in file order; most
+# keys stop within the final summary, and only lines around candidate
+# matches are looked at in Python. _is_sed and _prev_line redo, for one
+# candidate line, the check the forward loop made with its state (is
+# this one of the 7 lines after a Hi-Con?).
+###
+# key, test, text: a line passes if it starts with text ('prefix'), is
+# text ('line') or contains it ('in')
+_out_tests = [('###First', 'prefix', ' ####  1'),
+              ('###Last', 'line', ' ###'),
+              ('SED', 'in', 'Hi-Con'),
+              ('INZ', 'prefix', ' IONIZE PARMET:'),
+              ('gascomp', 'in', 'H :'),
+              ('dust', 'in', 'Dust to gas ratio'),
+              ('energy', 'in', 'ENERGY BUDGET'),
+              ('cool', 'in', 'Cooling:'),
+              ('heat', 'in', 'Heating:'),
+              ('HFBc', 'prefix', ' HFBc'),
+              ('geometry', 'in', 'The geometry is')]
+
+def _out_key(line):
+    for key, test, text in _out_tests:
+        if ((test == 'prefix' and line.startswith(text)) or
+            (test == 'line' and line == text) or
+            (test == 'in' and text in line)):
+            return key
+    return None
+
+def _prev_line(text, start):
+    '''
+    start of the line before the one starting at start (None if first)
+    '''
+    if start == 0:
+        return None
+    return text.rfind('\n', 0, start-1) + 1
+
+def _is_sed(text, start):
+    '''
+    True if the line starting at start is one of the 7 read after a
+    Hi-Con line
+    '''
+    prev = start
+    for i in range(7):
+        prev = _prev_line(text, prev)
+        if prev is None:
+            return False
+        line = text[prev:text.find('\n', prev)]
+        if _out_key(line) == 'SED' and not _is_sed(text, prev):
+            return True
+    return False
+
+def _last_line(text, key, test, pat):
+    '''
+    start of the last line kept under key, None if there is none.
+    candidates are found with rfind from the end; a candidate is kept if
+    its first passing test is key's (a line containing 'Cooling:' and
+    'H :' belongs to gascomp, as in the forward loop) and it is not an
+    SED line, otherwise the search goes on before it
+    '''
+    needle = {'in':pat, 'prefix':'\n'+pat, 'line':'\n'+pat+'\n'}[test]
+    end = len(text)
+    if test == 'line' and text.endswith('\n'+pat):
+        # last line, without a newline
+        end += 1
+        text += '\n'
+    while end > 0:
+        pos = text.rfind(needle, 0, end)
+        if pos < 0:
+            if (test == 'in' or not text.startswith(pat) or
+                (test == 'line' and text != pat and
+                 not text.startswith(pat+'\n'))):
+                return None
+            start = 0
+        else:
+            start = text.rfind('\n', 0, pos+1 if test != 'in' else pos) + 1
+        stop = text.find('\n', start)
+        line = text[start:] if stop < 0 else text[start:stop]
+        if _out_key(line) == key and not _is_sed(text, start):
+            return start
+        end = start
+    return None
+
+def _scan_out(filename):
+    '''
+    the lines of a Cloudy .out file that modObj._read_out uses
+    '''
+    file_ = open(filename, 'r')
+    text = file_.read()
+    file_.close()
+    found = []
+    for key, test, pat in _out_tests:
+        start = _last_line(text, key, test, pat)
+        if start is None:
+            continue
+        if key == 'SED':
+            # the next 7 lines, with their newlines
+            pos = text.find('\n', start) + 1
+            for i in range(7):
+                if pos == 0 or pos >= len(text):
+                    break
+                stop = text.find('\n', pos) + 1
+                line = text[pos:] if stop == 0 else text[pos:stop]
+                found.append((pos, 'SED' + str(i+1), line))
+                pos = stop
+        else:
+            stop = text.find('\n', start)
+            line = text[start:] if stop < 0 else text[start:stop]
+            found.append((start, key, line))
+    return dict([(key, line) for pos, key, line in sorted(found)])
+
+def _read_heat(fname):
+    '''
+    Htots, hf = _read_heat('ZAU1.heat')
+    total heating of each zone, and the fraction of each heating agent
+    (0 in zones where it is not listed), agents in order of appearance.
+    a zone's line is depth, Te, Htot, Ctot, then agent, fraction pairs;
+    the file is split into one flat array of fields, and the fractions
+    are scattered into an [agent, zone] array.
+    '''
+    file_ = open(fname, 'r')
+    lines = [line for line in file_.read().split('\n')
+             if line and line[0] != '#']
+    file_.close()
+    nzones = len(lines)
+    nfields = np.array([line.count('\t')+1 for line in lines], dtype=int)
+    fields = '\t'.join(lines).split('\t')
+    start = np.cumsum(nfields) - nfields
+    zone = np.repeat(np.arange(nzones), nfields)
+    col = np.arange(len(fields)) - start[zone]
+    Htots = np.array([float(fields[i]) for i in (start+2).tolist()])
+    # agents with a fraction after them, numbered in order of appearance
+    labs = np.where((col >= 4) & (col % 2 == 0) & (col+1 < nfields[zone]))[0]
+    labels = [fields[i] for i in labs.tolist()]
+    names = dict([(name, i) for i, name in
+                  enumerate(OrderedDict.fromkeys(labels))])
+    agent = np.array(list(map(names.__getitem__, labels)), dtype=int)
+    vals = np.array(list(map(float, [fields[i] for i in (labs+1).tolist()])))
+    # an agent listed twice in a zone keeps its last fraction
+    cell = agent*nzones + zone[labs]
+    last = len(cell) - 1 - np.unique(cell[::-1], return_index=True)[1]
+    fracs = np.zeros((len(names), nzones))
+    fracs.ravel()[cell[last]] = vals[last]
+    hf = dict([(name, fracs[i]) for name, i in
+               sorted(names.items(), key=lambda item: item[1])])
+    return Htots, hf
+
+# cooling agents in the .cool file, set as cool_* and frac_cool_*
+cool_agents = dict(cool_RecMet='hvFB', # heavy elem recomb cooling
+                   cool_ColMet='Hvin', # heavy elem collis ionization
+                   cool_FFC='FFcm', #F-F cooling (non e-)
+                   cool_H='H',
+                   cool_He='He',
+                   cool_N='N',
+                   cool_O='O',
+                   cool_S='S',
+                   cool_Ne='Ne',
+                   cool_C='C',
+                   cool_Ar='Ar',
+                   cool_Fe='Fe',
+                   cool_Al='Al',
+                   cool_Si='Si',
+                   cool_HminFB='Hfb')
+# line cooling fractions in the .out file: label, attribute (Cool_*)
+line_cool = [('HFBc', 'HFBc'), ('HFFc', 'HFFc'), ('Clin 912.000A:', 'Ly'),
+             ('N  2 6584.00A:', 'NII'), (' S II 6731.00A:', 'SIIb'),
+             ('S II 6716.00A:', 'SIIa'), ('TOTL 3727.00A:', 'O_3727'),
+             ('S  3 9532.00A:', 'SIII'), ('O  3 5007.00A:', 'O_5007'),
+             ('O  3 4959.00A:', 'O_4959')]
+
+def _field(par1=None, par2=None):
+    '''
+    compiled pattern for sextract(line, par1, par2): the text after the
+    last par1 (or after its first par1 characters), up to the first par2
+    after it (or its first par2 characters, or all of it)
+    '''
+    if par1 is None:
+        pat = r'\A'
+    elif isinstance(par1, int):
+        pat = r'\A.{%d}' % par1
+    else:
+        pat = re.escape(par1) + '(?!.*' + re.escape(par1) + ')'
+    if par2 is None:
+        pat += '(.*)'
+    elif isinstance(par2, int):
+        pat += '(.{0,%d})' % par2
+    else:
+        pat += '(.*?)' + re.escape(par2)
+    return re.compile(pat, re.S)
+
+def _match(pat, line):
+    '''
+    the group of pat in line, '' if it does not match (as sextract)
+    '''
+    if line is None:
+        return ''
+    m = pat.search(line)
+    return '' if m is None else m.group(1)
+
+# attribute: (.out key, patterns); fields read with float() from the
+# pattern's text, in turn through each pattern. optional ones are 0.0
+# if that fails, the others raise.
+_out_fields = {
+    'strom_logU':('INZ', [_field('U(sp):', 'Q(ion):')]),
+    'Heat':('energy', [_field('Heat:', 'Coolg:')]),
+    'Cool':('energy', [_field('Coolg:', 'Error:')]),
+    'RecLin':('energy', [_field('Rec Lin:', 8)]),
+    'gasC':('gascomp', [_field('C :', 8)]),
+    'gasN':('gascomp', [_field('N :', 8)]),
+    'gasO':('gascomp', [_field('O :', 8)]),
+    'DGR':('dust', [_field('(by mass):', ',')]),
+    'Av_ex':('dust', [_field('AV(ext):', '(pnt)')]),
+    'Av_pt':('dust', [_field(' (pnt):')])}
+_out_optional = {
+    'H_Rec_Lum':('HFBc', [_field('HFBc', 18), _field(9, 8)]),
+    'Heat_BF':('heat', [_field('BFH1', 14), _field(':', 5)])}
+for _key, _att in line_cool:
+    if _key[0] == 'H':
+        _out_optional['Cool_'+_att] = ('cool', [_field(_key, 14),
+                                                _field(':', 5)])
+    else:
+        _out_optional['Cool_'+_att] = ('cool', [_field(_key, 5)])
+_out_bands = ['1.0-1.8', '1.8-4.0', '4.0-20', '20--']
+_out_Q = [_field('Q({}):'.format(band), 'Q({}):'.format(nxt))
+          for band, nxt in zip(_out_bands[:-1], _out_bands[1:])]
+_out_Q.append(_field('Q(20--):', 'Ion pht'))
+_out_phi = [_field('phi({}):'.format(band), 'phi({}):'.format(nxt))
+            for band, nxt in zip(_out_bands[:-1], _out_bands[1:])]
+_out_phi.append(_field('phi(20--):', 'Ion pht'))
+
+class outRecord(object):
+    '''
+    rec = parseOut(_scan_out('ZAU1.out'))
+    the numbers of a Cloudy .out summary:
+        strom_logU, Heat, Cool, RecLin, gasC, gasN, gasO: float
+        DGR, Av_ex, Av_pt: float, None without a dust line
+        H_Rec_Lum, Heat_BF, Cool_*: float, 0.0 if not found
+        Qarr, Phiarr: float array [4], 10**values if all four were
+        read, else the log values before the first that was not (rest 0)
+        input_lum: True if Qarr was read, False if Phiarr was, else None
+    '''
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+def _read_field(out, key, pats):
+    text = out.get(key)
+    for pat in pats:
+        text = _match(pat, text)
+    return float(text)
+
+def _read_bands(line, pats):
+    '''
+    (array, True) for a complete set of band values, (partial, False)
+    '''
+    arr = np.zeros(len(pats))
+    for i, pat in enumerate(pats):
+        try:
+            arr[i] = float(_match(pat, line))
+        except ValueError:
+            return arr, False
+    return pow(10., arr), True
+
+def parseOut(out):
+    '''
+    rec = parseOut(mod.out) -> outRecord of the numbers in the lines
+    kept by _scan_out
+    '''
+    fields = {}
+    for att, (key, pats) in _out_fields.items():
+        if key == 'dust' and key not in out:
+            fields[att] = None
+        else:
+            fields[att] = _read_field(out, key, pats)
+    for att, (key, pats) in _out_optional.items():
+        try:
+            fields[att] = _read_field(out, key, pats)
+        except ValueError:
+            fields[att] = 0.0
+    fields['input_lum'] = None
+    fields['Qarr'], ok = _read_bands(out.get('SED2'), _out_Q)
+    if ok:
+        fields['input_lum'] = True
+    fields['Phiarr'], ok = _read_bands(out.get('SED2'), _out_phi)
+    if ok:
+        fields['input_lum'] = False
+    return outRecord(**fields)
+
+###
+# FSPS spectra of the models' stellar populations. Building a
+# StellarPopulation is expensive, so one instance is kept per process for
+# each set of construction parameters. Changing logzsol makes FSPS
+# compute the SSPs again, so models are grouped by metallicity and each
+# (logZ, age) spectrum is computed once.
+###
+def stellarPopulation(**params):
+    '''
+    sp = stellarPopulation(zcontinuous=1)
+    the shared fsps.StellarPopulation built with params (hashable
+    values). sp.params changed by one caller are seen by the others, so
+    set those needed (logzsol, ...) before every use.
+    '''
+    key = ('StellarPopulation',)+tuple(sorted(params.items()))
+    return cached(key, lambda: fsps.StellarPopulation(**params))
+
+def get_fsps_specs(models, **kwargs):
+    '''
+    get_fsps_specs(mods.mods, zcontinuous=1)
+    sets fsps_lam, fsps_spec and fsps_Q of every model from the FSPS
+    spectrum at its logZ and age. kwargs are StellarPopulation
+    parameters (zcontinuous=1 unless given).
+    '''
+    params = dict(zcontinuous=1)
+    params.update(kwargs)
+    sp = stellarPopulation(**params)
+    groups = OrderedDict()
+    for mod in models:
+        groups.setdefault(float(mod.logZ), []).append(mod)
+    for logZ, group in groups.items():
+        sp.params['logzsol'] = logZ
+        specs = {}
+        for mod in group:
+            age = float(mod.age)
+            if age not in specs:
+                lam, spec = sp.get_spectrum(tage=age*1.0e-9)
+                specs[age] = (lam, spec, calcQs(lam, spec*lsun, f_nu=True))
+            lam, spec, Q = specs[age]
+            mod.__setattr__('fsps_lam', lam)
+            mod.__setattr__('fsps_spec', spec)
+            mod.__setattr__('fsps_Q', Q)
+    return
+
 class modObj(object):
     '''
+    mod = modObj(dir_, 'ZAU', parline)
+    mod.Te, mod.heatfracs, mod.Qh, ...
+    line fluxes are read when the model is made; every other product is
+    read the first time one of its attributes is used (see _initializers)
+    and kept. read_out, read_rad, ... load those products up front.
     '''
+    # initializer: (product it reads, attributes it sets)
+    _initializers = {
+        '_read_out':(None, ('out', 'dist_fact', 'H_Rec_Lum', 'strom_logU',
+                            'Qarr', 'Phiarr', 'input_lum', 'Qh', 'Phi0',
+                            'Qhe', 'QhQhe', 'Heat_BF', 'Heat', 'Cool',
+                            'RecLin', 'gasC', 'gasN', 'gasO', 'DGR', 'Av_ex',
+                            'Av_pt', 'cool_frac', 'Cool_Otot', 'Cool_Stot')
+                     +tuple(['Cool_'+att for key, att in line_cool])),
+        '_load_cont':('outwcont', ('lam', 'nebflu', 'incflu', 'attflu',
+                                   'spec_Q')),
+        '_init_rad':('rad', ('n_zones', 'zones', 'depth', 'thickness',
+                             'radius_all', 'rad_pc', 'dr_all', 'dv_all',
+                             'r_in', 'r_out')),
+        '_init_ions':('rad', ('ion_names', 'n_ions', 'ion_arr')),
+        '_init_phys':('phys', ('ne_all', 'nH_all', 'nenH', 'Te', 'ff_all')),
+        '_init_emis':('emis', ('frac_depth', 'emis_labels', 'n_emis',
+                               'emis_full', 'indHe', 'indH')),
+        '_init_heat':('heat', ('heatfracs',)),
+        '_init_cool':('cool', ('cool', 'Ctot', 'cool_CE', 'frac_cool_CE',
+                               'frac_cool_FF_FB')
+                      +tuple(cool_agents)
+                      +tuple(['frac_'+att for att in cool_agents]))}
+    _lazy = dict((att, init) for init, (prod, atts) in _initializers.items()
+                 for att in atts)
     def __init__(self, dir_, prefix, parline, read_out=False, read_rad=False,
                  read_cont=False, use_doublet=False, read_emis=False,
-                 read_heat=False, read_cool=False, **kwargs):
+                 read_heat=False, read_cool=False, products=None,
+                 products_data=None, keep_raw=False, **kwargs):
         '''
         this needs to be called from other class or given
         a line from a ".pars" file
         [0]modnum; [1]logZ; [2]age; [3]logU; [4]logR; [5]logQ
+        products: file suffixes saved by Cloudy (see
+        cloudyInputTools.getGridProducts); products that were not
+        saved are skipped. None means try to read everything.
+        products_data: the parsed files of this model (self._raw of a
+        modObj made with keep_raw=True), used instead of reading them.
         '''
+        self.products = products
+        self._raw = {} if products_data is None else products_data
+        self._keep_raw = keep_raw
+        self._loaded = set()
+        self._dat = dict()
         self.modnum = int(parline[0])
         self.logZ = parline[1]
         self.age = parline[2]
@@ -125,123 +524,137 @@ class modObj(object):
         self.fl = '{}{}{}'.format(dir_, prefix, self.modnum)
         self.load_lines(use_doublet=use_doublet)
         if read_out:
-            self._read_out()
+            self._init('_read_out')
         if read_cont:
-            self._load_cont()
-        if read_rad:
-            self._dat = dict()
-            self._init_rad()
-            eles = ['H', 'He', 'C', 'N', 'O', 'S', 'Si', 'Fe']
-            self.ion_names, self.n_ions, self.ion_arr = dict(), dict(), dict()
-            for ele in eles:
-                self._init_ele(ele)
-            self._init_phys()
-        if read_emis:
-            self._init_emis()
-        if read_heat:
-            self._init_heat()
-        if read_cool:
-            self._init_cool()
+            self._init('_load_cont')
+        if read_rad and self._has_product('rad'):
+            self._init('_init_rad')
+            self._init('_init_ions')
+            self._init('_init_phys')
+        if read_emis and self._has_product('emis'):
+            self._init('_init_emis')
+        if read_heat and self._has_product('heat'):
+            self._init('_init_heat')
+        if read_cool and self._has_product('cool'):
+            self._init('_init_cool')
+        if not keep_raw:
+            self._raw = {}
+        return
+    def _init(self, init):
+        '''
+        runs an initializer once. if it fails, the attributes it had set
+        are removed and it is run again when next needed
+        '''
+        if init not in self._loaded:
+            # marked first, so attributes it reads before setting them
+            # raise AttributeError instead of running it again
+            self._loaded.add(init)
+            try:
+                getattr(self, init)()
+            except Exception:
+                self._loaded.discard(init)
+                for att in modObj._initializers[init][1]:
+                    self.__dict__.pop(att, None)
+                raise
         return
+    def __getattr__(self, name):
+        # only called for attributes that are not set (yet)
+        if name in ratio_defs and name in self.ratios:
+            return self.ratios[name]
+        init = modObj._lazy.get(name)
+        if name.startswith('_') or init is None or init in self._loaded:
+            raise AttributeError("'modObj' has no attribute '{}'".format(name))
+        product = modObj._initializers[init][0]
+        if product is not None and not self._has_product(product):
+            raise AttributeError("'modObj' has no attribute '{}'".format(name))
+        try:
+            self._init(init)
+        except (IOError, OSError) as e:
+            raise AttributeError("'{}' not loaded: {}".format(name, e))
+        return object.__getattribute__(self, name)
+    @property
+    def ratios(self):
+        '''
+        ratioTable of the named lines: mod.ratios['log_NII_Ha'], also
+        mod.log_NII_Ha; computed when first used
+        '''
+        if self.__dict__.get('_ratios') is None:
+            self._ratios = ratioTable(lineColumns(self.line_flu, self.line_lam))
+        return self._ratios
+    def _load(self, key, loader):
+        '''
+        parsed contents of one output file: from products_data if
+        given, otherwise loader() (kept in self._raw if keep_raw)
+        '''
+        if key in self._raw:
+            return self._raw[key]
+        val = loader()
+        if self._keep_raw:
+            self._raw[key] = val
+        return val
+    def _has_product(self, key):
+        '''
+        False if the grid's PREFIX.products says key was not saved
+        '''
+        return self.products is None or key in self.products
     def add_lines(self, lines):
-        line_info = np.genfromtxt(self.fl+'.lineflux')
-        lam, flu = line_info[:,0], line_info[:,1]
-        for name, wav in list(lines.items()):
-            matchind = np.argmin(np.abs(lam-wav))
-            self.__setattr__(name, flu[matchind])
+        '''
+        self.add_lines({'O3':1666.0})
+        sets the flux of the line nearest each wavelength
+        '''
+        for name, ind in list(getLineIndex(self.line_lam, lines).items()):
+            self.__setattr__(name, self.line_flu[ind])
         return
     def load_lines(self, use_doublet=False, **kwargs):
         names, vacwavs = getEmis()
         self.lines = dict(names=names, wavs=vacwavs)
-        lines = {'Lya':1215.67,
-                 'Ha':6564.60,
-                 'HeI':5877.243,
-                 'HeII':4687.015,
-                 'HeIIu':1640.42,
-                 'Hb':4862.71,
-                 'Hg':4341.692,
-                 'Hd':4102.892,
-                 'OIIIa':4960.295,
-                 'OIIIb':5008.240,
-                 'NIIa':6549.86,
-                 'NIIb':6585.27,
-                 'OIIa':3727.10,
-                 'OIIb':3729.86,
-                 'SIIa':6718.294,
-                 'SIIb':6732.673,
-                 'OI':6302.046,
-                 'NeIIIb':3869.86,
-                 'NeIIIa':3968.59,
-                 'SIII':6313.81,
-                 'ArIII':7137.77}
-        line_info = np.genfromtxt(self.fl+'.lineflux')
-        lam, flu = line_info[:,0], line_info[:,1]
-        for name, wav in list(lines.items()):
-            matchind = np.argmin(np.abs(lam-wav))
-            self.__setattr__(name, flu[matchind])
-        self.HaHb = self.Ha/self.Hb
-        def logify(a,b):
-            return np.log10(a/b)
-        def logHa(x):
-            return np.log10(x/self.Ha)
-        def logHb(x):
-            return np.log10(x/self.Hb)
-        self.log_NII_Ha = logHa(self.NIIa+self.NIIb)
-        self.log_SII_Ha = logHa(self.SIIa+self.SIIb)
-        self.log_OIII_Hb = logHb(self.OIIIa+self.OIIIb)
-        #
-        self.log_NIIa_Ha = logHa(self.NIIa)
-        self.log_NIIb_Ha = logHa(self.NIIb)
-        self.log_SIIa_Ha = logHa(self.SIIa)
-        self.log_SIIb_Ha = logHa(self.SIIb)
-        #
-        self.log_OIIIa_Hb = logHb(self.OIIIa)
-        self.log_OIIIb_Hb = logHb(self.OIIIb)
-        #
-        self.log_OIII_OII = logify(self.OIIIa+self.OIIIb, self.OIIa+self.OIIb)
-        self.log_OIIIa_OII = logify(self.OIIIa, self.OIIa+self.OIIb)
-        self.log_OIIIb_OII = logify(self.OIIIb, self.OIIa+self.OIIb)
-        #
-        self.log_OI_Ha = logHa(self.OI)
-        self.log_NII_OII = logify(self.NIIa+self.NIIb, self.OIIa+self.OIIb)
-        self.R23 = logHb(self.OIIa+self.OIIb+self.OIIIa+self.OIIIb)
+        line_info = self._load('.lineflux',
+                               lambda: readTable(self.fl+'.lineflux'))
+        # sorted vacuum wavelengths, fluxes
+        self.line_lam, self.line_flu = line_info[:,0], line_info[:,1]
+        self.add_lines(named_lines)
+        self._ratios = None
         return
     def _load_cont(self, dist_corr=False, output_units=False, **kwargs):
-        cont_info = np.genfromtxt(self.fl+'.contflux', skip_header=1)
+        cont_info = self._load('.contflux',
+                               lambda: readTable(self.fl+'.contflux',
+                                                 skip_header=1))
         # erg / s / cm2
         self.lam, self.nebflu = cont_info[:,0], cont_info[:,3]
         self.incflu, self.attflu = cont_info[:,1], cont_info[:,2]
-        self.spec_Q = calcQ(self.lam, self.incflu, f_nu=True)
+        self.spec_Q = calcQs(self.lam, self.incflu, f_nu=True)
         if dist_corr: # erg/s
-            self.nebflu *= self.dist_fact
-            self.attflu *= self.dist_fact
-            self.incflu *= self.dist_fact
-            self.spec_Q = calcQ(self.lam, self.incflu*c/self.lam, f_nu=True)
+            self.nebflu = self.nebflu*self.dist_fact
+            self.attflu = self.attflu*self.dist_fact
+            self.incflu = self.incflu*self.dist_fact
+            self.spec_Q = calcQs(self.lam, self.incflu*c/self.lam, f_nu=True)
         elif output_units: # Lsun/Hz
-            self.nebflu *= self.dist_fact/lsun * self.lam / c
-            self.attflu *= self.dist_fact/lsun * self.lam / c
-            self.incflu *= self.dist_fact/lsun * self.lam / c
-            self.spec_Q = calcQ(self.lam, self.incflu*lsun, f_nu=True)
+            self.nebflu = self.nebflu*self.dist_fact/lsun * self.lam / c
+            self.attflu = self.attflu*self.dist_fact/lsun * self.lam / c
+            self.incflu = self.incflu*self.dist_fact/lsun * self.lam / c
+            self.spec_Q = calcQs(self.lam, self.incflu*lsun, f_nu=True)
         return
     def get_fsps_spec(self, **kwargs):
-        sp = fsps.StellarPopulation(zcontinuous=1)
-        sp.params['logzsol'] = self.logZ
-        lam, spec = sp.get_spectrum(tage=self.age*1.0e-9)
-        self.__setattr__('fsps_lam', lam)
-        self.__setattr__('fsps_spec', spec)
-        self.__setattr__('fsps_Q', calcQ(lam, spec*lsun, f_nu=True))
+        '''
+        sets fsps_lam, fsps_spec, fsps_Q; see get_fsps_specs
+        '''
+        get_fsps_specs([self], **kwargs)
         return
     def _read_f(self, key, delimiter='\t', comments=';', names=True, **kwargs):
         '''
         self._read_f('.rad')
         '''
         file_ = self.fl+key
-        try:
-            return np.genfromtxt(file_,delimiter=delimiter,
-                                 comments=comments,
-                                 names=names, **kwargs)
-        except IOError:
-            return None
+        def load():
+            try:
+                if delimiter == '\t' and names is True and len(kwargs) == 0:
+                    return readSave(file_, comments=comments)
+                return np.genfromtxt(file_,delimiter=delimiter,
+                                     comments=comments,
+                                     names=names, **kwargs)
+            except IOError:
+                return None
+        return self._load(key, load)
 
     def _init_rad(self):
         '''
@@ -270,7 +683,7 @@ class modObj(object):
             self.dv_all = 4.*np.pi*self.radius_all**2*self.dr_all
             self.r_in = self.radius_all[0] - self.dr_all[0]/2.
             self.r_out = self.radius_all[-1] + self.dr_all[0]/2.
-            if self.Phi0 == 0.0:
+            if getattr(self, 'Phi0', None) == 0.0:
                 self.Phiarr = self.Qarr/(4.*np.pi*self.r_in**2.)
                 self.Phi0 = self.Phiarr.sum()
         return
@@ -317,65 +730,38 @@ class modObj(object):
             print("ERROR")
             print(self.fl)
         if self._dat[key] is not None:
-            attkeys = dict(cool_RecMet='hvFB', # heavy elem recomb cooling
-                           cool_ColMet='Hvin', # heavy elem collis ionization
-                           cool_FFC='FFcm', #F-F cooling (non e-)
-                           cool_H='H',
-                           cool_He='He',
-                           cool_N='N',
-                           cool_O='O',
-                           cool_S='S',
-                           cool_Ne='Ne',
-                           cool_C='C',
-                           cool_Ar='Ar',
-                           cool_Fe='Fe',
-                           cool_Al='Al',
-                           cool_Si='Si',
-                           cool_HminFB='Hfb')
+            attkeys = cool_agents
             self.cool = self._dat[key]['Ctotergcm3s']
             self.Ctot = self._vol_integ(self.cool)
             for att,keyname in list(attkeys.items()):
                 vals = self._dat[key][keyname]
                 self.__setattr__(att, vals)
                 self.__setattr__('frac_'+att, self._vol_integ(vals)/self.Ctot)
+            # collisional excitation coolants, integrated in one product
             CE_names = self._dat[key].dtype.names[5:33]
-            self.cool_CE = np.sum([self._vol_integ(self._dat[key][elname]) for elname in CE_names])
-            self.frac_cool_CE = np.sum([self._vol_integ(self._dat[key][elname])/self.Ctot for elname in CE_names])
+            CE_integ = (np.array([self._dat[key][elname] for elname in
+                                  CE_names])*self.dvff).sum(axis=1)
+            self.cool_CE = np.sum(CE_integ)
+            self.frac_cool_CE = np.sum(CE_integ/self.Ctot)
             self.frac_cool_FF_FB = self.Cool_HFFc+self.Cool_HFBc
         return
     def _init_heat(self):
-        htots, outfs = [], []
-        heat_labs = []
-        fname = self.fl+'.heat'
-        file_ = open(fname, 'r')
-        for line in file_:
-            if line[0] == '#':
-                continue
-            line = line.split('\n')[0]
-            lps = line.split('\t')
-            htots.append(lps[2])
-            x = lps[4::]
-            labs = x[0::2]
-            fracs = x[1::2]
-            od = {}
-            [od.__setitem__(key, float(val)) for key, val in zip(labs,fracs)]
-            outfs.append(od)
-            for lab in labs:
-                if lab not in heat_labs:
-                    heat_labs.append(lab)
-        hf = {}
-        [hf.__setitem__(lab,
-                        np.array([outf[lab]
-                                  if lab in list(outf.keys())
-                                  else 0.0 for outf in outfs]))
-         for lab in heat_labs]
-        Htots = np.array([float(htot) for htot in htots])
+        Htots, hf = self._load('.heat', lambda: _read_heat(self.fl+'.heat'))
         Htot = self._vol_integ(Htots)
         hr = {}
         for key, arr in list(hf.items()):
             hr.__setitem__(key, np.sum(self._vol_integ(arr*Htots))/Htot)
         self.__setattr__('heatfracs', hr)
         return
+    def _init_ions(self):
+        '''
+        ionization fractions of every element, see _init_ele
+        '''
+        self.ion_names, self.n_ions, self.ion_arr = dict(), dict(), dict()
+        for ele in ['H', 'He', 'C', 'N', 'O', 'S', 'Si', 'Fe']:
+            if self._has_product('ele_'+ele):
+                self._init_ele(ele)
+        return
     def _init_ele(self, key):
         '''
         keys = [H, He, C, N, O, S, Si, Fe]
@@ -398,10 +784,15 @@ class modObj(object):
 
     @property
     def dvff(self):
-        try:
-            return self.dv_all*self.ff_all
-        except:
-            return None
+        '''
+        dv_all*ff_all, computed once
+        '''
+        if self.__dict__.get('_dvff') is None:
+            try:
+                self._dvff = self.dv_all*self.ff_all
+            except:
+                return None
+        return self._dvff
 
     def _quiet_div(self, a, b):
         if a is None or b is None:
@@ -496,110 +887,38 @@ class modObj(object):
             Av_ex: extinction from extended source
             Av_pt: extinction from pt source
         '''
-        filename = self.fl+'.out'
-        self.out = {}
-        file_ = open(filename, 'r')
-        for line in file_:
-            line = line.split('\n')[0]
-            if line[0:8] == ' ####  1':
-                self.out['###First'] = line
-            elif line[0:5] == ' ###':
-                self.out['###Last'] = line
-            elif 'Hi-Con' in line:
-                for i in range(7):
-                    self.out['SED' + str(i+1)] = next(file_)
-            elif line[0:15] == ' IONIZE PARMET:':
-                self.out['INZ'] = line
-            elif 'H :' in line:
-                self.out['gascomp'] = line
-            elif 'Dust to gas ratio' in line:
-                self.out['dust'] = line
-            elif 'ENERGY BUDGET' in line:
-                self.out['energy'] = line
-            elif 'Cooling:' in line:
-                self.out['cool'] = line
-            elif 'Heating:' in line:
-                self.out['heat'] = line
-            elif line[0:5] == ' HFBc':
-                self.out['HFBc'] = line
-            elif 'The geometry is' in line:
-                self.out['geometry'] = line
-        file_.close()
+        self.out = self._load('.out', lambda: _scan_out(self.fl+'.out'))
+        rec = parseOut(self.out)
         self.dist_fact = 4.0*np.pi*(10.0**self.logR)**2.0
-        try:
-            self.H_Rec_Lum = float(sextract(sextract(self.out['HFBc'], 'HFBc', 18), 9, 8))
-        except:
-            self.H_Rec_Lum = 0.0
-            #print(sextract(sextract(self.out['HFBc'], 'HFBc', 18), 9, 8))
-        #self.Phi0 = float(sextract(self.out['SED2'], 'Ion pht flx:'))
+        self.H_Rec_Lum = rec.H_Rec_Lum
         # Ion pht flx: phi(H) = Q/4piR2
-        #self.clogQ = np.log10(self.Phi0*self.dist_fact)
-        self.strom_logU = float(sextract(self.out['INZ'], 'U(sp):', 'Q(ion):'))
+        self.strom_logU = rec.strom_logU
         # Q(ion) is exiting
-        self.Qarr = np.zeros(4)
-        self.Phiarr = np.zeros(4)
-        try:
-            self.Qarr[0] = float(sextract(self.out['SED2'], 'Q(1.0-1.8):', 'Q(1.8-4.0):'))
-            self.Qarr[1] = float(sextract(self.out['SED2'], 'Q(1.8-4.0):', 'Q(4.0-20):'))
-            self.Qarr[2] = float(sextract(self.out['SED2'], 'Q(4.0-20):', 'Q(20--):'))
-            self.Qarr[3] = float(sextract(self.out['SED2'], 'Q(20--):', 'Ion pht'))
-            self.Qarr = pow(10., self.Qarr)
-            self.input_lum = True
-        except:
-            pass
+        self.Qarr = rec.Qarr
+        self.Phiarr = rec.Phiarr
+        if rec.input_lum is not None:
+            self.input_lum = rec.input_lum
         self.Qh = self.Qarr.sum()
-        try:
-            self.Phiarr[0] = float(sextract(self.out['SED2'], 'phi(1.0-1.8):', 'phi(1.8-4.0):'))
-            self.Phiarr[1] = float(sextract(self.out['SED2'], 'phi(1.8-4.0):', 'phi(4.0-20):'))
-            self.Phiarr[2] = float(sextract(self.out['SED2'], 'phi(4.0-20):', 'phi(20--):'))
-            self.Phiarr[3] = float(sextract(self.out['SED2'], 'phi(20--):', 'Ion pht'))
-            self.Phiarr = pow(10., self.Phiarr)
-            self.input_lum = False
-        except:
-            pass
         self.Phi0 = self.Phiarr.sum()
         if self.Qh == 0.0:
             self.Qarr = self.Phiarr*self.dist_fact
             self.Qh = self.Qarr.sum()
         self.Qhe = self.Qarr[1::].sum()
         self.QhQhe = np.log10(self.Qh) - np.log10(self.Qhe)
-        self._set_lineCool()
-        try:
-            self.Heat_BF = float(sextract(sextract(self.out['heat'], 'BFH1', 14), ':', 5))
-        except:
-            self.Heat_BF = 0.0
-        self.Heat = float(sextract(self.out['energy'], 'Heat:', 'Coolg:'))
-        self.Cool = float(sextract(self.out['energy'], 'Coolg:', 'Error:'))
-        self.RecLin = float(sextract(self.out['energy'], 'Rec Lin:', 8))
-        self.gasC = float(sextract(self.out['gascomp'], 'C :', 8))
-        self.gasN = float(sextract(self.out['gascomp'], 'N :', 8))
-        self.gasO = float(sextract(self.out['gascomp'], 'O :', 8))
-        if 'dust' in self.out:
-            self.DGR = float(sextract(self.out['dust'], '(by mass):',',' ))
-            self.Av_ex = float(sextract(self.out['dust'], 'AV(ext):', '(pnt)'))
-            self.Av_pt = float(sextract(self.out['dust'], ' (pnt):'))
+        self._set_lineCool(rec)
+        for att in ['Heat_BF', 'Heat', 'Cool', 'RecLin', 'gasC', 'gasN',
+                    'gasO']:
+            self.__setattr__(att, rec.__getattribute__(att))
+        if rec.DGR is not None:
+            self.DGR = rec.DGR
+            self.Av_ex = rec.Av_ex
+            self.Av_pt = rec.Av_pt
         return
-    def _set_lineCool(self):
-        keys = ['HFBc', 'HFFc', 'Clin 912.000A:', 'N  2 6584.00A:',
-                ' S II 6731.00A:','S II 6716.00A:', 'TOTL 3727.00A:',
-                'S  3 9532.00A:', 'O  3 5007.00A:', 'O  3 4959.00A:']
-        keyattrs = ['HFBc', 'HFFc', 'Ly', 'NII', 'SIIb', 'SIIa',
-                    'O_3727', 'SIII', 'O_5007', 'O_4959']
+    def _set_lineCool(self, rec):
         self.cool_frac = {}
-        for key, keyattr in zip(keys, keyattrs):
-            if key[0] == 'H':
-                try:
-                    val = float(sextract(sextract(self.out['cool'],
-                                                  key, 14),
-                                         ':', 5))
-                except:
-                    val = 0.0
-            else:
-                try:
-                    val = float(sextract(self.out['cool'], key, 5))
-                except:
-                    val = 0.0
-            self.__setattr__('Cool_'+keyattr, val)
+        for key, keyattr in line_cool:
+            self.__setattr__('Cool_'+keyattr,
+                             rec.__getattribute__('Cool_'+keyattr))
         self.Cool_Otot = np.sum([self.Cool_O_3727,
                                  self.Cool_O_5007,
                                  self.Cool_O_4959])
@@ -608,32 +927,510 @@ class modObj(object):
                                  self.Cool_SIII])
         return
 
+###
+# allmods snapshot, PREFIX.allmods.npz: the state of every model as
+# columns over models. a numeric attribute is one array [nmods]
+# (attr@none marks models where it is None); arrays of the same shape
+# in every model are stacked [nmods, ...]; ragged arrays (radial
+# structure) are stored flat with each model's shape (attr@flat,
+# attr@shape). dict entries are named attr/key, and attr/key@absent
+# marks models whose dict lacks key. the snapshot is valid while the
+# files it was read from keep their sizes and mtimes.
+###
+# files read by each initializer
+_init_files = {'_read_out':('.out',), '_load_cont':('.contflux',),
+               '_init_rad':('.rad',), '_init_phys':('.phys',),
+               '_init_ions':tuple(['.ele_'+ele for ele in
+                                   ['H', 'He', 'C', 'N', 'O', 'S', 'Si', 'Fe']]),
+               '_init_emis':('.emis',), '_init_heat':('.heat',),
+               '_init_cool':('.cool',)}
+# layout of PREFIX.allmods.npz; older snapshots are parsed again
+# (3: line ratios are no longer stored, see lineRatios)
+_snapshot_version = 3
+# not stored: raw file contents, the shared line table, line fluxes
+# (kept as one matrix)
+_skip_state = ('out', 'lines', 'line_lam', 'line_flu', 'products', 'fl')
+
+# initializers reading the zone files of PREFIX.radial/
+_radial_inits = ('_init_rad', '_init_phys', '_init_ions', '_init_emis',
+                 '_init_cool')
+
+def _snapshotFile(dir_, prefix):
+    return '{}{}.allmods.npz'.format(dir_, prefix)
+
+def gridKey(dir_, prefix, modnums, loaded=()):
+    '''
+    hash of the names, sizes and mtimes of PREFIX.pars and of the files
+    of every model read by the initializers in loaded
+    '''
+    suffixes = ['.lineflux']
+    for init in sorted(loaded):
+        suffixes.extend(_init_files.get(init, ()))
+    fnames = ['{}{}.pars'.format(dir_, prefix)]
+    fnames += ['{}{}{}{}'.format(dir_, prefix, int(n), suf)
+               for n in modnums for suf in suffixes]
+    sha = hashlib.sha1()
+    for fname in fnames:
+        try:
+            st = os.stat(fname)
+            sha.update('{} {} {}\n'.format(fname, st.st_size,
+                                            st.st_mtime).encode('utf-8'))
+        except OSError:
+            sha.update('{} missing\n'.format(fname).encode('utf-8'))
+    return sha.hexdigest()
+
+def _flatState(state, pre=''):
+    '''
+    {name: value} of the storable entries of a model's __dict__
+    '''
+    out = {}
+    for key, val in state.items():
+        if key.startswith('_'):
+            continue
+        if pre == '' and key in _skip_state:
+            continue
+        name = pre+key
+        if isinstance(val, dict):
+            out[name+'@dict'] = True
+            out.update(_flatState(val, name+'/'))
+        elif isinstance(val, (tuple, list)):
+            out[name] = np.asarray(val)
+        else:
+            out[name] = val
+    return out
+
+def _isScalar(val):
+    return (val is None or isinstance(val, (bool, int, float, np.number))
+            and not isinstance(val, np.ndarray))
+
+def _toColumns(states):
+    '''
+    cols, unstored = _toColumns([_flatState(mod.__dict__) for mod in mods])
+    columns over models from the models' flattened states, and the
+    attributes that could not be stored as columns
+    '''
+    names, common = set(states[0]), set(states[0])
+    for st in states[1:]:
+        names |= set(st)
+        common &= set(st)
+    cols, unstored = {}, set()
+    for name in names:
+        if name not in common:
+            # entries some models do not have
+            absent = np.array([name not in st for st in states])
+            present = [st[name] for st in states if name in st]
+            if isinstance(present[0], np.ndarray):
+                empty = np.zeros((0,)*present[0].ndim, dtype=present[0].dtype)
+            else:
+                empty = None
+            cols[name+'@absent'] = absent
+            vals = [st.get(name, empty) for st in states]
+        else:
+            vals = [st[name] for st in states]
+        if name.endswith('@dict'):
+            cols[name] = np.zeros(0)
+        elif all([_isScalar(v) for v in vals]):
+            none = np.array([v is None for v in vals])
+            cols[name] = np.array([np.nan if v is None else v for v in vals])
+            if none.any():
+                cols[name+'@none'] = none
+        elif all([isinstance(v, str) for v in vals]):
+            cols[name] = np.array(vals)
+        elif all([isinstance(v, np.ndarray) and v.dtype.kind in 'biufU'
+                  for v in vals]):
+            shapes = [v.shape for v in vals]
+            if len(set(shapes)) == 1:
+                cols[name] = np.array(vals)
+            elif len(set([len(sh) for sh in shapes])) == 1:
+                cols[name+'@flat'] = np.concatenate([v.ravel() for v in vals])
+                cols[name+'@shape'] = np.array(shapes, dtype=int)
+            else:
+                unstored.add(name.split('/')[0])
+        else:
+            unstored.add(name.split('/')[0])
+    # unstored attributes are not read from the columns at all
+    for name in list(cols):
+        if name.split('@')[0].split('/')[0] in unstored:
+            del cols[name]
+    return cols, unstored
+
+# returned by column readers for models that lack an attribute
+_absent = object()
+
+def _entryReader(cols, name):
+    '''
+    function i -> value of one flattened entry for model i
+    '''
+    if name+'@flat' in cols:
+        flat, shapes = cols[name+'@flat'], cols[name+'@shape']
+        offs = np.concatenate(([0], np.cumsum(np.prod(shapes, axis=1))))
+        read = lambda i: flat[offs[i]:offs[i+1]].reshape(shapes[i])
+    else:
+        col = cols[name]
+        none = cols.get(name+'@none')
+        if col.dtype.kind == 'U':
+            read = lambda i: str(col[i]) if col.ndim == 1 else col[i]
+        elif none is not None:
+            read = lambda i: None if none[i] else col[i]
+        else:
+            read = col.__getitem__
+    absent = cols.get(name+'@absent')
+    if absent is None:
+        return read
+    return lambda i: _absent if absent[i] else read(i)
+
+def _columnReaders(cols):
+    '''
+    {attribute: function i -> value for model i (or _absent)}
+    dict attributes are rebuilt from their attr/key entries
+    '''
+    entries = {}
+    for name in cols:
+        if name.endswith('@flat'):
+            name = name[:-5]
+        elif '@' in name:
+            continue
+        entries[name] = _entryReader(cols, name)
+    dicts = [name[:-5] for name in cols if name.endswith('@dict')]
+    readers = {}
+    for name, read in entries.items():
+        if name.split('/')[0] not in dicts:
+            readers[name] = read
+    def dictReader(top):
+        subs = sorted([name for name in entries
+                       if name.startswith(top+'/')])
+        subdicts = sorted([name for name in dicts if name.startswith(top+'/')])
+        absent = cols.get(top+'@dict@absent')
+        def read(i):
+            if absent is not None and absent[i]:
+                return _absent
+            out = {}
+            for name in subdicts+subs:
+                keys = name.split('/')[1:]
+                d = out
+                for key in keys[:-1]:
+                    d = d.setdefault(key, {})
+                if name in dicts:
+                    d.setdefault(keys[-1], {})
+                else:
+                    val = entries[name](i)
+                    if val is not _absent:
+                        d[keys[-1]] = val
+            return out
+        return read
+    for top in dicts:
+        if '/' not in top:
+            readers[top] = dictReader(top)
+    return readers
+
+class modView(object):
+    '''
+    mod = mods.mods[i]
+    one model of an allmods grid. attributes are read from the grid's
+    columns; anything else (methods, products that were not loaded) goes
+    to a modObj rebuilt from the columns the first time it is needed.
+    '''
+    def __init__(self, grid, ind):
+        object.__setattr__(self, '_grid', grid)
+        object.__setattr__(self, '_ind', ind)
+        object.__setattr__(self, '_obj', None)
+    def __getattribute__(self, name):
+        try:
+            return object.__getattribute__(self, name)
+        except AttributeError:
+            pass
+        grid = object.__getattribute__(self, '_grid')
+        ind = object.__getattribute__(self, '_ind')
+        read = grid._readers.get(name)
+        if read is not None:
+            val = read(ind)
+            if val is not _absent:
+                return val
+        obj = object.__getattribute__(self, '_obj')
+        if obj is None:
+            obj = grid._restore(ind)
+            object.__setattr__(self, '_obj', obj)
+        return getattr(obj, name)
+
+class modList(object):
+    '''
+    the models of an allmods grid as a sequence of modViews
+    '''
+    def __init__(self, grid):
+        self._grid = grid
+        self._views = {}
+    def __len__(self):
+        return self._grid.nmods
+    def __getitem__(self, ind):
+        if isinstance(ind, slice):
+            return [self[i] for i in range(*ind.indices(len(self)))]
+        ind = int(ind)
+        if ind < 0:
+            ind += len(self)
+        if not 0 <= ind < len(self):
+            raise IndexError('model index out of range')
+        if ind not in self._views:
+            self._views[ind] = modView(self._grid, ind)
+        return self._views[ind]
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+def _modState(mod):
+    '''
+    (flat state, line fluxes, line wavelengths, initializers run) of a
+    model, what allmods keeps of it
+    '''
+    return (_flatState(mod.__dict__), mod.line_flu, mod.line_lam,
+            set(mod._loaded))
+
+def _parseMod(args):
+    '''
+    pool worker: builds one model, returns its _modState
+    '''
+    dir_, prefix, par, kwargs = args
+    return _modState(modObj(dir_, prefix, par, **kwargs))
+
 class allmods(object):
     '''
     mods = outobj.allmods(dir, prefix, read_out=True, read_rad=False)
+    mods = outobj.allmods(dir, prefix, read_out=True, n_proc=8)
+    every parsed quantity is kept as one array over models in mods.cols
+    (see _toColumns); mods.mods[i] is a modView of model i.
     '''
-    def __init__(self, dir_, prefix, **kwargs):
-        self.modpars = np.genfromtxt('{}{}.pars'.format(dir_, prefix))
-        self.load_mods(dir_, prefix, **kwargs)
+    # model parameters, as attributes of each model (see modObj)
+    par_names = ['logZ', 'age', 'logU', 'logR', 'logQ', 'nH', 'efrac', 'fbhb']
+    def __init__(self, dir_, prefix, n_proc=1, chunksize=None, snapshot=True,
+                 **kwargs):
+        '''
+        snapshot: reuse PREFIX.allmods.npz if it is still valid and has
+        the products asked for, otherwise parse the grid and write it
+        '''
+        self.dir_, self.prefix = dir_, prefix
+        self.modpars = readTable('{}{}.pars'.format(dir_, prefix))
+        self.products, self.line_list = getGridProducts(dir_, prefix)
+        kwargs.setdefault('products', self.products)
+        self.mod_products = kwargs['products']
+        if not (snapshot and self.load_snapshot(dir_, prefix, **kwargs)):
+            self.load_mods(dir_, prefix, n_proc=n_proc, chunksize=chunksize,
+                           **kwargs)
+            if snapshot:
+                self.save_snapshot(dir_, prefix)
         self.set_pars()
         self.set_arrs()
+        self.index = gridIndex(dict([(name, self.__getattribute__(name))
+                                     for name in self.par_names]),
+                               self.par_names)
         read_out = kwargs.get('read_out', False)
         read_rad = kwargs.get('read_rad', False)
         if read_out:
             self.add_arrs('gasC', 'gasN', 'gasO')
             if hasattr(self.mods[0], 'DGR'):
                 self.add_arrs('DGR', 'Av_ex', 'Av_pt')
-            if read_rad:
+            if read_rad and (self.mod_products is None or
+                             'rad' in self.mod_products):
                 self.add_arrs('Te')
 
-    def load_mods(self, dir_, prefix, **kwargs):
-        mods = []
-        for par in self.modpars:
-            mod = modObj(dir_, prefix, par, **kwargs)
-            mods.append(mod)
-        self.__setattr__('mods', mods)
-        self.__setattr__('nmods', len(mods))
+    def load_mods(self, dir_, prefix, n_proc=1, chunksize=None, **kwargs):
+        '''
+        parses every model into the columns; line_lam and line_flux
+        [nmods, nlines] hold the line fluxes of all models.
+        with n_proc > 1 the models are built by a pool of n_proc
+        processes, chunksize models at a time, which send back only their
+        flattened states.
+        '''
+        jobs = [(dir_, prefix, par, kwargs) for par in self.modpars]
+        if n_proc > 1:
+            if chunksize is None:
+                chunksize = max(1, len(self.modpars)//(4*n_proc))
+            pool = multiprocessing.Pool(n_proc)
+            results = pool.imap(_parseMod, jobs, chunksize=chunksize)
+        else:
+            pool = None
+            results = (_parseMod(job) for job in jobs)
+        states, line_flux, loaded = [], [], None
+        try:
+            # one model at a time into flat states
+            for state, line_flu, line_lam, mod_loaded in results:
+                states.append(state)
+                line_flux.append(line_flu)
+                loaded = mod_loaded if loaded is None else loaded & mod_loaded
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        cols, unstored = _toColumns(states)
+        self._set_columns(cols, loaded, unstored, line_lam,
+                          np.array(line_flux))
+        return
+    def _set_columns(self, cols, loaded, unstored, line_lam, line_flux):
+        self.cols = cols
+        self.loaded = set(loaded)
+        self.unstored = set(unstored)
+        self.line_lam = line_lam
+        self.line_flux = line_flux
+        self._readers = _columnReaders(cols)
+        self._readers['line_lam'] = lambda i: self.line_lam
+        self._readers['line_flu'] = lambda i: self.line_flux[i]
+        # line ratios of every model at once, computed when first used
+        self.ratios = ratioTable(lineColumns(line_flux, line_lam))
+        for name in self.ratios.names:
+            if name not in self._readers:
+                self._readers[name] = lambda i, name=name: self.ratios[name][i]
+        # products whose unstored attributes (the .out lines) are read
+        # again from the files if used
+        skip = set(_skip_state) | self.unstored
+        self._restored = set([init for init in loaded if not
+                              set(modObj._initializers[init][1]) & skip])
+        self.__setattr__('nmods', len(line_flux))
+        self.__setattr__('mods', modList(self))
+        return
+    def _restore(self, ind):
+        '''
+        modObj of model ind, rebuilt from the columns
+        '''
+        mod = modObj.__new__(modObj)
+        for name, read in self._readers.items():
+            # ratios are left to the model's own ratioTable, computed
+            # only if used (modObj.__getattr__)
+            if name in ratio_defs and name not in self.cols:
+                continue
+            val = read(ind)
+            if val is not _absent:
+                mod.__dict__[name] = val
+        names, vacwavs = getEmis()
+        mod.__dict__.update(products=self.mod_products, _raw={},
+                            _keep_raw=False, _loaded=set(self._restored),
+                            _dat={}, lines=dict(names=names, wavs=vacwavs),
+                            fl='{}{}{}'.format(self.dir_, self.prefix,
+                                               mod.modnum))
+        return mod
+    def get_fsps_specs(self, **kwargs):
+        '''
+        mods.get_fsps_specs() -> sets fsps_lam, fsps_spec, fsps_Q of
+        every model, one FSPS metallicity at a time
+        '''
+        get_fsps_specs(self.mods, **kwargs)
         return
+    def radial(self, rebuild=False):
+        '''
+        rs = mods.radial()
+        rs['Te'][rs.front('H')] -> Te at the H+ front of every model
+        radialStore of the zones of every model, in PREFIX.radial/; it is
+        built from the zone files if missing or older than they are
+        '''
+        key = gridKey(self.dir_, self.prefix, self.modpars[:,0],
+                      _radial_inits)
+        if (not rebuild and getattr(self, '_radial', None) is not None and
+            self._radial.info.get('key') == key):
+            return self._radial
+        if not rebuild and radialStore.exists(self.dir_, self.prefix):
+            rs = radialStore(self.dir_, self.prefix)
+            if rs.info.get('key') == key:
+                self._radial = rs
+                return rs
+        self._radial = buildRadial(self.dir_, self.prefix,
+                                   self.modpars[:,0], products=self.products,
+                                   key=key)
+        return self._radial
+    def integrals(self):
+        '''
+        gi = mods.integrals()
+        gi.T0, gi.emis_vol('H__1_656285A'), gi.ion_temp('O', 2)
+        gridIntegrals over the zones of mods.radial(), kept until the
+        store is rebuilt
+        '''
+        rs = self.radial()
+        gi = getattr(self, '_integrals', None)
+        if gi is None or gi.rs is not rs:
+            gi = self._integrals = gridIntegrals(rs, cool_agents=cool_agents)
+        return gi
+    def column(self, name):
+        '''
+        mods.column('Te') -> values of an attribute for every model
+        one array if the attribute is a number (or fixed-shape array),
+        otherwise an object array of per-model values (None for models
+        without it). only stored columns and line ratios; anything else
+        is read from the models themselves, mods.mods[i].name
+        '''
+        if (name in self.cols and self.cols[name].dtype.kind != 'U' and
+            name+'@none' not in self.cols and name+'@absent' not in self.cols):
+            return self.cols[name]
+        if name in self.ratios:
+            return self.ratios[name]
+        read = self._readers.get(name)
+        if read is None:
+            raise AttributeError("'{}' is not a stored column".format(name))
+        vals = [read(i) for i in range(self.nmods)]
+        vals = [None if val is _absent else val for val in vals]
+        try:
+            return np.array(vals)
+        except ValueError:
+            out = np.empty(len(vals), dtype=object)
+            out[:] = vals
+            return out
+    def match(self, obs, names=('log_NII_Ha', 'log_OIII_Hb'), k=1,
+              **kwargs):
+        '''
+        dist, inds = mods.match(sdss.load_spec(), k=5)
+        the k models nearest each observed object in the space of the
+        ratios names, see gridMatcher
+        '''
+        return gridMatcher.fromGrid(self, names, **kwargs).match(obs, k=k)
+    def save_snapshot(self, dir_, prefix):
+        '''
+        writes PREFIX.allmods.npz, see load_snapshot
+        '''
+        cols = dict(self.cols)
+        cols['@version'] = np.array(_snapshot_version)
+        cols['@key'] = np.array(gridKey(dir_, prefix, self.modpars[:,0],
+                                        self.loaded))
+        cols['@loaded'] = np.array(sorted(self.loaded), dtype='U20')
+        cols['@unstored'] = np.array(sorted(self.unstored), dtype='U40')
+        cols['@line_lam'] = self.line_lam
+        cols['@line_flux'] = self.line_flux
+        fname = _snapshotFile(dir_, prefix)
+        try:
+            f = open(fname+'.tmp', 'wb')
+            np.savez(f, **cols)
+            f.close()
+            os.rename(fname+'.tmp', fname)
+        except (IOError, OSError) as e:
+            warnings.warn('could not write {}: {}'.format(fname, e))
+        return
+    def load_snapshot(self, dir_, prefix, read_out=False, read_rad=False,
+                      read_cont=False, read_emis=False, read_heat=False,
+                      read_cool=False, products=None, **kwargs):
+        '''
+        reads the columns from PREFIX.allmods.npz without parsing any
+        model. False if there is no snapshot, the files changed since it
+        was written, or it lacks a product asked for by read_*.
+        '''
+        fname = _snapshotFile(dir_, prefix)
+        if not os.path.exists(fname):
+            return False
+        dat = np.load(fname)
+        if ('@version' not in dat.files or
+            int(dat['@version']) != _snapshot_version):
+            return False
+        loaded = set([str(init) for init in dat['@loaded']])
+        wanted = dict(_read_out=read_out, _load_cont=read_cont,
+                      _init_rad=read_rad, _init_ions=read_rad,
+                      _init_phys=read_rad, _init_emis=read_emis,
+                      _init_heat=read_heat, _init_cool=read_cool)
+        for init, flag in wanted.items():
+            product = modObj._initializers[init][0]
+            if (flag and init not in loaded and
+                (products is None or product in products)):
+                return False
+        if str(dat['@key']) != gridKey(dir_, prefix, self.modpars[:,0], loaded):
+            return False
+        cols = dict([(name, dat[name]) for name in dat.files
+                     if not name.startswith('@')])
+        self._set_columns(cols, loaded,
+                          [str(name) for name in dat['@unstored']],
+                          dat['@line_lam'], dat['@line_flux'])
+        return True
     def set_pars(self):
         self.logZ_vals = np.unique(self.modpars[:,1])
         self.age_vals = np.unique(self.modpars[:,2])
@@ -649,6 +1446,13 @@ class allmods(object):
             self.fbhb_vals = np.unique(self.modpars[:,8])
         except IndexError:
             self.fbhb_vals = np.array([0.0])
+    def select(self, **constraints):
+        '''
+        mods.select(age=0.5e6, logR=19.0, nH=100.0) -> model positions
+        over the remaining grid axes (mods.index.axes), -1 where the grid
+        has no model; see gridIndex.select
+        '''
+        return self.index.select(**constraints)
     def set_arrs(self):
         iterstrings = ['logZ', 'age', 'logU', 'logR', 'logQ', 'nH',
                        'efrac','fbhb',
@@ -657,21 +1461,25 @@ class allmods(object):
                        'log_SII_Ha','log_SIIa_Ha','log_SIIb_Ha',
                        'HaHb', 'R23','log_NII_OII', 'log_OIII_OII']
         for i in iterstrings:
-            vals = np.array([mod.__getattribute__(i) for mod in self.mods])
-            self.__setattr__(i, vals)
+            self.__setattr__(i, self.column(i))
     def add_arrs(self, *args):
         for item in args:
             try:
-                vals = np.array([mod.__getattribute__(item) for mod in self.mods])
-                self.__setattr__(item, vals)
+                self.__setattr__(item, self.column(item))
             except AttributeError:
                 continue
         return
     def add_lines(self, linedict={}):
         '''
         self.add_lines(linedict={'O3':1666.0})
+        sets self.O3 (one flux per model), readable as mod.O3 of every
+        model
         '''
-        [mod.add_lines(linedict) for mod in self.mods]
+        for name, ind in list(getLineIndex(self.line_lam, linedict).items()):
+            vals = self.line_flux[:,ind]
+            self.__setattr__(name, vals)
+            self.cols[name] = vals
+            self._readers[name] = vals.__getitem__
         return
     def makeBPT(self, ax=None, plot_data=True, line_ratio='NIIb',
                 gridnames=None, bpt_inds=None, axlabs=None, varsize=22,
@@ -748,27 +1556,17 @@ class allmods(object):
             if y_name == 'logZ':
                 grid_y = grid_y[(grid_y >= logZmin) & (grid_y <= logZmax)]
 
-        use_mods = [mod for mod in self.mods
-                    if (mod.__getattribute__(pd['const1']) == pd['val1'])
-                    & (mod.__getattribute__(pd['const2']) == pd['val2'])
-                    & (mod.__getattribute__(pd['const3']) == pd['val3'])]
-        if pd['const4'] is not None:
-            use_mods = [mod for mod in self.mods
-                        if (mod.__getattribute__(pd['const1']) == pd['val1'])
-                        & (mod.__getattribute__(pd['const2']) == pd['val2'])
-                        & (mod.__getattribute__(pd['const3']) == pd['val3'])
-                        & (mod.__getattribute__(pd['const4']) == pd['val4'])]
-
+        constraints = dict([(pd['const{}'.format(i)], pd['val{}'.format(i)])
+                            for i in range(1, 5)
+                            if pd['const{}'.format(i)] is not None])
         gshape = (len(grid_y), len(grid_x))
         X, Y = np.meshgrid(grid_x, grid_y, indexing='xy')
-        Zx = np.zeros(gshape)
-        Zy = np.zeros(gshape)
         nrows = gshape[0]
         ncols = gshape[1]
-        for ind, val in np.ndenumerate(X):
-            arr = [mod for mod in use_mods if (mod.__getattribute__(x_name) == val) & (mod.__getattribute__(y_name) == Y[ind])]
-            Zx[ind] = arr[0].__getattribute__(bpt_inds[0])
-            Zy[ind] = arr[0].__getattribute__(bpt_inds[1])
+        # first model in each cell; NaN where the grid has none
+        inds = self.index.table(x_name, y_name, grid_x, grid_y, **constraints)
+        Zx = np.where(inds >= 0, self.column(bpt_inds[0])[inds], np.nan)
+        Zy = np.where(inds >= 0, self.column(bpt_inds[1])[inds], np.nan)
         if plot_data:
             vanzee.plot_bpt(plot_data, line_ratio=line_ratio, ax=ax)
             sdss.plot_bpt(plot_data, line_ratio=line_ratio, ax=ax, **plt_pars)
@@ -832,15 +1630,11 @@ class allmods(object):
             grid_y = grid_y[(grid_y >= ylims[0]) & (grid_y <= ylims[1])]
         X, Y = np.meshgrid(grid_x, grid_y)
         Z = np.zeros_like(X)
-        for index, x in np.ndenumerate(Z):
-            mind = [i for i in range(self.nmods)
-                    if (self.mods[i].__getattribute__(xval) == X[index]
-                        and self.mods[i].__getattribute__(yval) == Y[index]
-                        and self.mods[i].__getattribute__(const) == cval)]
-            try:
-                Z[index] = self.mods[mind[0]].__getattribute__(zval)
-            except AttributeError:
-                print('not a valid attribute.')
+        inds = self.index.table(xval, yval, grid_x, grid_y, **{const:cval})
+        try:
+            Z[:] = np.where(inds >= 0, self.column(zval)[inds], np.nan)
+        except AttributeError:
+            print('not a valid attribute.')
         if xval == 'age':
             X*=1.0e-6
         if yval == 'age':
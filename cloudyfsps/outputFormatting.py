@@ -8,10 +8,13 @@ from __future__ import absolute_import
 from builtins import object
 
 import numpy as np
-import pkg_resources
 import fsps
 import os
-import linecache
+from .cloudyInputTools import getGridProducts, par_names
+from .cloudyOutputTools import getLineWavs
+from .dataTools import getOrderedLines, getFSPSlam
+from .cloudyParsers import readTable
+from .gridStore import gridStore, storeExists
 #grid: 2 files: line, cont
 #columns: wavelengths
 #rows: models
@@ -23,17 +26,64 @@ import linecache
 #flux3
 
 ###
-# reads from ZAU***.out_lines, ZAU***.out_cont
+# reads from the grid store ZAU.grid/ (see cloudyOutputTools.formatAllOutput)
+# or, without one, from ZAU***.out_lines, ZAU***.out_cont
 # produces ZAU_**.lines, ZAU_**.cont
 ###
-class writeFormattedOutput(object):
-    #sp = fsps.StellarPopulation()
-    #fsps_lam = sp.wavelengths
-    def __init__(self, dir_, mod_prefix, mod_suffix,
-                 use_extended_lines=False, more_info=False,**kwargs):
-        '''
-        writeFormattedOutput(mod_dir, 'ZAU', 'BPASS')
-        '''
+def _completeStore(dir_, mod_prefix, use_extended_lines=False):
+    '''
+    the grid's store, if every model has been formatted into it with
+    the line list asked for and line fluxes in Lsun/Q (not luminosities,
+    see formatAllOutput(write_line_lum=True))
+    '''
+    if not storeExists(dir_, mod_prefix):
+        return None
+    store = gridStore(dir_, mod_prefix)
+    if (not store.complete or
+        store.info.get("use_extended_lines") != bool(use_extended_lines) or
+        store.info.get("write_line_lum")):
+        return None
+    return store
+
+def readModPars(file_pr, names=None):
+    '''
+    pars = readModPars(dir_+'ZAU')
+    dict of the columns of ZAU.pars, keyed by names (default par_names)
+    '''
+    if names is None:
+        names = par_names
+    data = np.atleast_2d(readTable(file_pr+".pars")).T
+    pars = {}
+    for i, col in enumerate(data):
+        if i < len(names):
+            pars[names[i]] = col
+        else:
+            pars["par{}".format(i)] = col
+    return pars
+
+class gridWriter(object):
+    '''
+    gridWriter(mod_dir, 'ZAU', '_FBHB', axes=['logZ', 'Age', 'fbhb'],
+               par_names=par_names+['fbhb'])
+    writes the FSPS tables PREFIX+SUFFIX.lines and PREFIX+SUFFIX.cont,
+    one parameter row and one flux row per model, with a header naming
+    the size of each axis:
+    #nlines cols nmod rows NZ logZ NA Age NU logU
+    axes are any columns of PREFIX.pars (see readModPars). transforms
+    maps an axis to a function applied to its column, e.g.
+    {'zmet':zmet_to_nuZ}; labels are the axis names in the header.
+    models are read (from the grid store if complete, otherwise from
+    the per-model text files) and written chunk_size at a time.
+    '''
+    # str.format specs of the original per-value writes; "{0:1.4}"
+    # writes 0.0, 25.0, 1.234e-20
+    line_fmt = "{:1.4e}"
+    cont_fmt = "{:1.4}"
+    par_fmt = "{:2.4e}"
+    def __init__(self, dir_, mod_prefix, mod_suffix=None,
+                 axes=("logZ", "Age", "logU"), labels=None, transforms=None,
+                 par_names=None, use_extended_lines=False, more_info=False,
+                 chunk_size=1000, **kwargs):
         self.dir_, self.mod_prefix = dir_, mod_prefix
         self.file_pr = dir_ + mod_prefix
         if mod_suffix is None:
@@ -43,131 +93,125 @@ class writeFormattedOutput(object):
         # each model's final info will be in prefix00.lines, prefix00.cont
         self.line_out = self.out_pr + ".lines"
         self.cont_out = self.out_pr + ".cont"
+        self.axes = list(axes)
+        self.labels = list(axes) if labels is None else list(labels)
+        self.chunk_size = chunk_size
+        self.products, self.line_list = getGridProducts(dir_, mod_prefix)
+        self.store = _completeStore(dir_, mod_prefix, use_extended_lines)
         # load each model's parameters from prefix.pars
-        self.loadModInfo()
+        self.loadModInfo(par_names=par_names, transforms=transforms)
         # print ordered emission line wavelengths + fluxes
         self.doLineOut(use_extended_lines=use_extended_lines,
                        more_info=more_info)
         # interp and print neb cont onto FSPS wavelenth arr
-        self.doContOut()
+        if self.products is None or "outwcont" in self.products:
+            self.doContOut()
         return
-    def loadModInfo(self, **kwargs):
+    def loadModInfo(self, par_names=None, transforms=None, **kwargs):
         '''
         reads model parameters from "ZAU.pars"
         '''
-        name_keys = ["mod_num", "logZ", "Age", "logU", "logR", "logQ", "nH", "efrac"]
-        data = np.genfromtxt(self.file_pr+".pars", unpack=True)
-        ddata = {}
-        for i,key in enumerate(name_keys):
-            ddata[key] = data[i]
-            self.__setattr__(key, data[i])
+        ddata = readModPars(self.file_pr, par_names)
+        for key, func in (transforms or {}).items():
+            ddata[key] = func(ddata[key])
+        for key, val in ddata.items():
+            self.__setattr__(key, val)
         self.__setattr__("modpars", ddata)
-        self.NZ = len(np.unique(self.logZ))
-        self.NA = len(np.unique(self.Age))
-        self.NU = len(np.unique(self.logU))
+        self.mod_num = ddata["mod_num"].astype(int)
+        self.axis_vals = np.column_stack([ddata[key] for key in self.axes])
+        self.shape = tuple([len(np.unique(ddata[key])) for key in self.axes])
+        return
+    def header(self, ncols):
+        dims = " ".join(["{0} {1}".format(n, label)
+                         for n, label in zip(self.shape, self.labels)])
+        return "#{0} cols {1} rows {2}\n".format(ncols, np.max(self.mod_num),
+                                                 dims)
+    def _lam_line(self, lam):
+        return " ".join(["%1.6e"]*len(lam)) % tuple(lam) + "\n"
+    def _stream(self, f, get_flux, flux_fmt, par_lines=None):
+        '''
+        writes parameter and flux rows for every model, a chunk at a time.
+        each chunk is formatted by one str.format call.
+        '''
+        npar = self.axis_vals.shape[1]
+        par_row = " ".join([self.par_fmt]*npar) + "\n"
+        for i0 in range(0, len(self.mod_num), self.chunk_size):
+            nums = self.mod_num[i0:i0+self.chunk_size]
+            flux = get_flux(nums)
+            flux_row = " ".join([flux_fmt]*flux.shape[1]) + "\n"
+            if par_lines is None:
+                block = np.column_stack((self.axis_vals[i0:i0+len(nums)], flux))
+                f.write(((par_row+flux_row)*len(nums)).format(*block.ravel()))
+            else:
+                rows = (flux_row*len(nums)).format(*flux.ravel()).splitlines(True)
+                f.write("".join([par_lines[n-1]+row for n, row in zip(nums, rows)]))
         return
-    def doLineOut(self, more_info=False, **kwargs):
+    def getLineFlu(self, nums):
+        '''
+        emission line intensities (Lsun/Q) of models nums, [nmod, nlines]
+        '''
+        if self.store is not None:
+            return np.asarray(self.store.lines[nums-1], dtype=float)
+        return np.array([readTable("{0}{1}.out_lines".format(self.file_pr, n))[:,1]
+                         for n in nums])
+    def getContFlu(self, nums):
+        '''
+        diffuse continua (Lsun/Hz/Q) of models nums, [nmod, nlam]
+        '''
+        if self.store is not None:
+            return np.asarray(self.store.cont[nums-1], dtype=float)
+        return np.array([readTable("{0}{1}.out_cont".format(self.file_pr, n))[:,1]
+                         for n in nums])
+    def doLineOut(self, use_extended_lines=False, more_info=False, **kwargs):
         '''
         prints line fluxes to prefix00.lines file
+        with more_info, the full row of prefix.pars precedes each model
+        (such tables are not read by fspsTables, which needs the axes)
         '''
+        # wavelength info, already in vacuum
+        if self.line_list is not None:
+            wl, sinds = getLineWavs(line_list=self.line_list)
+            data_vac = wl[sinds]
+        else:
+            data_vac = getOrderedLines(use_extended_lines)
+        par_lines = None
+        if more_info:
+            f = open(self.file_pr+".pars", "r")
+            par_lines = [line.rstrip("\n")+"\n" for line in f]
+            f.close()
         f = open(self.line_out, "w")
-        self.printLineLam(f, **kwargs)
-        for n in self.mod_num:
-            self.printLineFlu(f, n.astype(int), more_info=more_info)
+        f.write(self.header(len(data_vac)))
+        f.write(self._lam_line(data_vac))
+        self._stream(f, self.getLineFlu, self.line_fmt, par_lines)
         f.close()
         print("lines: {0:.0f} models to file {1}".format(self.mod_num[-1], self.line_out))
         return
-    def printLineLam(self, f, use_extended_lines=False):
+    def doContOut(self, **kwargs):
         '''
-        prints the wavelength array for the emission lines as the second
-        line in the output file. converts all wavelengths to vacuum.
+        prints the diffuse continua, on the FSPS wavelength array,
+        to prefix00.cont file
         '''
-        #read in file containing wavelength info
-        if use_extended_lines:
-            linefile = pkg_resources.resource_filename(__name__, "data/orderedLinesEXT.dat")
-        else:
-            linefile = pkg_resources.resource_filename(__name__, "data/orderedLines.dat")
-        data_vac = np.genfromtxt(linefile)
-        #data_vac = air_to_vac(data) # new file is already in vac
-        nlines = len(data_vac)
-        nmods = np.max(self.mod_num)
-        #print header to file
-        head_str = "#{0} cols {1:.0f} rows {2} logZ {3} Age {4} logU".format(nlines, nmods, self.NZ, self.NA, self.NU)
-        f.write(head_str+"\n")
-        #print lambda array
-        p_str = " ".join(["{0:1.6e}".format(dat) for dat in data_vac])
-        f.write(p_str+"\n")
-        return
-    def printLineFlu(self, f, n, more_info=False):
-        #write model parameters
-        if more_info:
-            tstr = linecache.getline(self.file_pr+'.pars', n)
-        else:
-            tstr = "{0:2.4e} {1:2.4e} {2:2.4e}\n".format(self.logZ[n-1], self.Age[n-1], self.logU[n-1])
-        f.write(tstr)
-        #read in and print emission line intensities (Lsun/Q)
-        nst = "{0}".format(n)
-        filename = self.file_pr+nst+".out_lines"
-        lam, flu = np.genfromtxt(filename, unpack=True)
-        I_str = ["{0:1.4e}".format(s) for s in flu]
-        tstr = " ".join(I_str)
-        f.write(tstr+"\n")
-        return
-    def doContOut(self, **kwargs):
+        fsps_lam = getFSPSlam()
+        self.__setattr__("fsps_lam", fsps_lam)
         f = open(self.cont_out, "w")
-        self.printContLam(f)
-        for num in self.modpars['mod_num']:
-            iind = num.astype(int)
-            pars = dict(logZ=self.logZ[iind-1],
-                        Age=self.Age[iind-1],
-                        nH=self.nH[iind-1],
-                        logQ=self.logQ[iind-1],
-                        logU=self.logU[iind-1],
-                        logR=self.logR[iind-1],
-                        mod_num=iind,
-                        efrac=self.efrac[iind-1])
-            self.printContFlu(f, pars)
+        f.write(self.header(len(fsps_lam)))
+        f.write(self._lam_line(fsps_lam))
+        self._stream(f, self.getContFlu, self.cont_fmt)
         f.close()
-        print("cont: {0:.0f} models to file {1}".format(self.modpars['mod_num'][-1], self.cont_out))
-        return
-    def printContFlu(self, f, pars):
-        #write model parameters
-        tstr = "{0:2.4e} {1:2.4e} {2:2.4e}".format(pars["logZ"],
-                                                   pars["Age"],
-                                                   pars["logU"])
-        f.write(tstr+"\n")
-        #read in and print emission line intensities
-        nst = "{0}".format(pars["mod_num"])
-        filename = self.file_pr+nst+".out_cont"
-        # read lambda, diffuse cont
-        mdata = np.genfromtxt(filename)
-        lam = mdata[:,0]
-        flu = mdata[:,1]
-        y_str = " ".join(["{0:1.4}".format(y) for y in flu])
-        f.write(y_str+"\n")
+        print("cont: {0:.0f} models to file {1}".format(self.mod_num[-1], self.cont_out))
         return
-    def printContLam(self, f):
+
+class writeFormattedOutput(gridWriter):
+    def __init__(self, dir_, mod_prefix, mod_suffix,
+                 use_extended_lines=False, more_info=False, **kwargs):
         '''
-        prints header in first line of file, and the FSPS wavelength array
-        (for the nebular continuum) as the second line in the output file.
-        # nlam cols nmod rows logZ Age logU
-        # fsps_lam_1 fsps_lam_2 .... fsps_lam_n
+        writeFormattedOutput(mod_dir, 'ZAU', 'BPASS')
+        logZ, Age, logU grid
         '''
-        #grab fsps wavelength info
-        lamfile = pkg_resources.resource_filename(__name__, "data/FSPSlam.dat")
-        fsps_lam = np.genfromtxt(lamfile)
-        self.__setattr__("fsps_lam", fsps_lam)
-        nlam = len(fsps_lam)
-        nmods = np.max(self.mod_num).astype(int)
-        #print header to file
-        head_str = "#{0} cols {1} rows {2} logZ {3} Age {4} logU".format(nlam, nmods, self.NZ, self.NA, self.NU)
-        f.write(head_str+"\n")
-        #print lambda array
-        p_str = " ".join(["{0:1.6e}".format(lam) for lam in fsps_lam])
-        f.write(p_str+"\n")
-        return
-
-
+        gridWriter.__init__(self, dir_, mod_prefix, mod_suffix,
+                            axes=("logZ", "Age", "logU"),
+                            use_extended_lines=use_extended_lines,
+                            more_info=more_info, **kwargs)
 
 #------------------------------------------------
 def zmet_to_nuZ(zmet):
@@ -178,157 +222,23 @@ def zmet_to_nuZ(zmet):
     '''
     zmets = np.array([1,2,3,4,5,6,7,8])
     zs = np.array([-1.00, -1.02, -1.04, -1.06, 0.00, 0.02, 0.04, 0.06])
-    if type(zmet) is float:
-        ii, = np.where(zmets == zmet)[0]
-        out_val = zs[ii]
-    else:
-        out_val = np.zeros_like(zmet, dtype='float')
-        for i in range(len(zmet)):
-            ii, = np.where(zmets == zmet[i])[0]
-            out_val[i] = zs[ii]
-    return out_val
+    inds = np.clip(np.searchsorted(zmets, zmet), 0, len(zmets)-1)
+    if not np.all(zmets[inds] == zmet):
+        raise ValueError("zmet must be one of {}".format(zmets))
+    return zs[inds]
 
-class writeAltFormattedOutput(object):
-    #sp = fsps.StellarPopulation()
-    #fsps_lam = sp.wavelengths
+class writeAltFormattedOutput(gridWriter):
     def __init__(self, dir_, mod_prefix, mod_suffix,
-                 use_extended_lines=False, more_info=False,**kwargs):
-        '''
-        writeFormattedOutput(mod_dir, 'ZAU', 'BPASS')
-        '''
-        self.dir_, self.mod_prefix = dir_, mod_prefix
-        self.file_pr = dir_ + mod_prefix
-        if mod_suffix is None:
-            self.out_pr = dir_ + mod_prefix
-        else:
-            self.out_pr = dir_ + mod_prefix + mod_suffix
-        # each model's final info will be in prefix00.lines, prefix00.cont
-        self.line_out = self.out_pr + ".lines"
-        self.cont_out = self.out_pr + ".cont"
-        self.loadModInfo() # load each model's parameters from prefix.pars
-        # print ordered emission line wavelengths + fluxes
-        self.doLineOut(use_extended_lines=use_extended_lines,
-                       more_info=more_info)
-        self.doContOut() # interp and print neb cont onto FSPS wavelenth arr
-        return
-    def loadModInfo(self, **kwargs):
-        '''
-        reads model parameters from "ZAU.pars"
-        '''
-        name_keys = ["mod_num", "logZ", "Age", "logU", "logR", "logQ", "nH", "efrac", "zmet"]
-        data = np.genfromtxt(self.file_pr+".pars", unpack=True)
-        ddata = {}
-        for i,key in enumerate(name_keys):
-            if key == 'zmet':
-                temp_arr = zmet_to_nuZ(data[i])
-                ddata[key] = temp_arr
-                self.__setattr__(key, temp_arr)
-            else:
-                ddata[key] = data[i]
-                self.__setattr__(key, data[i])
-        self.__setattr__("modpars", ddata)
-        self.NZ = len(np.unique(self.zmet))
-        self.NA = len(np.unique(self.Age))
-        self.NU = len(np.unique(self.logU))
-        return
-    def doLineOut(self, more_info=False, **kwargs):
-        '''
-        prints line fluxes to prefix00.lines file
-        '''
-        f = open(self.line_out, "w")
-        self.printLineLam(f, **kwargs)
-        for n in self.mod_num:
-            self.printLineFlu(f, n.astype(int), more_info=more_info)
-        f.close()
-        print("lines: {0:.0f} models to file {1}".format(self.mod_num[-1], self.line_out))
-        return
-    def printLineLam(self, f, use_extended_lines=False):
-        '''
-        prints the wavelength array for the emission lines as the second
-        line in the output file. converts all wavelengths to vacuum.
-        '''
-        #read in file containing wavelength info
-        if use_extended_lines:
-            linefile = pkg_resources.resource_filename(__name__, "data/orderedLinesEXT.dat")
-        else:
-            linefile = pkg_resources.resource_filename(__name__, "data/orderedLines.dat")
-        data_vac = np.genfromtxt(linefile)
-        #data_vac = air_to_vac(data) # new file is already in vac
-        nlines = len(data_vac)
-        nmods = np.max(self.mod_num)
-        #print header to file
-        head_str = "#{0} cols {1:.0f} rows {2} logZ {3} Age {4} logU".format(nlines, nmods, self.NZ, self.NA, self.NU)
-        f.write(head_str+"\n")
-        #print lambda array
-        p_str = " ".join(["{0:1.6e}".format(dat) for dat in data_vac])
-        f.write(p_str+"\n")
-        return
-    def printLineFlu(self, f, n, more_info=False):
-        #write model parameters
-        if more_info:
-            tstr = linecache.getline(self.file_pr+'.pars', n)
-            f.write(tstr)
-        else:
-            tstr = "{0:2.4e} {1:2.4e} {2:2.4e}".format(self.zmet[n-1], self.Age[n-1], self.logU[n-1])
-            f.write(tstr+"\n")
-        #read in and print emission line intensities (Lsun/Q)
-        nst = "{0}".format(n)
-        filename = self.file_pr+nst+".out_lines"
-        lam, flu = np.genfromtxt(filename, unpack=True)
-        I_str = ["{0:1.4e}".format(s) for s in flu]
-        tstr = " ".join(I_str)
-        f.write(tstr+"\n")
-        return
-    def doContOut(self, **kwargs):
-        f = open(self.cont_out, "w")
-        self.printContLam(f)
-        for num in self.modpars['mod_num']:
-            iind = num.astype(int)
-            pars = dict(logZ=self.logZ[iind-1],
-                        Age=self.Age[iind-1],
-                        nH=self.nH[iind-1],
-                        logQ=self.logQ[iind-1],
-                        logU=self.logU[iind-1],
-                        logR=self.logR[iind-1],
-                        mod_num=iind,
-                        zmet=self.zmet[iind-1])
-            self.printContFlu(f, pars)
-        f.close()
-        print("cont: {0:.0f} models to file {1}".format(self.modpars['mod_num'][-1], self.cont_out))
-        return
-    def printContFlu(self, f, pars):
-        #write model parameters
-        tstr = "{0:2.4e} {1:2.4e} {2:2.4e}".format(pars["zmet"],
-                                                   pars["Age"],
-                                                   pars["logU"])
-        f.write(tstr+"\n")
-        #read in and print emission line intensities
-        nst = "{0}".format(pars["mod_num"])
-        filename = self.file_pr+nst+".out_cont"
-        # read lambda, diffuse cont
-        mdata = np.genfromtxt(filename)
-        lam = mdata[:,0]
-        flu = mdata[:,1]
-        y_str = " ".join(["{0:1.4}".format(y) for y in flu])
-        f.write(y_str+"\n")
-        return
-    def printContLam(self, f):
-        '''
-        prints header in first line of file, and the FSPS wavelength array
-        (for the nebular continuum) as the second line in the output file.
-        # nlam cols nmod rows logZ Age logU
-        # fsps_lam_1 fsps_lam_2 .... fsps_lam_n
-        '''
-        #grab fsps wavelength info
-        lamfile = pkg_resources.resource_filename(__name__, "data/FSPSlam.dat")
-        fsps_lam = np.genfromtxt(lamfile)
-        self.__setattr__("fsps_lam", fsps_lam)
-        nlam = len(fsps_lam)
-        nmods = np.max(self.mod_num).astype(int)
-        #print header to file
-        head_str = "#{0} cols {1} rows {2} logZ {3} Age {4} logU".format(nlam, nmods, self.NZ, self.NA, self.NU)
-        f.write(head_str+"\n")
-        #print lambda array
-        p_str = " ".join(["{0:1.6e}".format(lam) for lam in fsps_lam])
-        f.write(p_str+"\n")
-        return
+                 use_extended_lines=False, more_info=False, **kwargs):
+        '''
+        writeAltFormattedOutput(mod_dir, 'ZAU', 'BPASS')
+        zmet, Age, logU grid; zmet is the 9th column of prefix.pars and
+        is converted with zmet_to_nuZ (labelled logZ in the header)
+        '''
+        gridWriter.__init__(self, dir_, mod_prefix, mod_suffix,
+                            axes=("zmet", "Age", "logU"),
+                            labels=("logZ", "Age", "logU"),
+                            transforms={"zmet":zmet_to_nuZ},
+                            par_names=par_names+["zmet"],
+                            use_extended_lines=use_extended_lines,
+                            more_info=more_info, **kwargs)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+__all__ = ["radialStore", "buildRadial", "radialDir", "segmentIds",
+           "segmentSum", "segmentArgmin"]
+
+import os
+import json
+import numpy as np
+from .cloudyParsers import readSave
+
+###
+# Zone-level data of every model of a grid, in PREFIX.radial/ next to
+# the models. The zones of all models are concatenated; the zones of the
+# model at position i are offsets[i]:offsets[i+1].
+#    offsets.npy   [nmods+1]
+#    depth.npy, radius.npy, dr.npy (cm)                from ***.rad
+#    Te.npy (K), ne.npy, nH.npy (cm^-3), fillfac.npy   from ***.phys
+#    ion_H.npy ... ion_Fe.npy  [nzones, n_ions]        from ***.ele_*
+#    emis.npy      [nzones, n_emis] (erg/s/cm^3)       from ***.emis
+#    cool.npy      [nzones, n_cool] (erg/s/cm^3)       from ***.cool
+#    info.json     model numbers, columns, ion names, emission and
+#                  cooling labels
+# Every array is a .npy file opened memory-mapped, so a query over all
+# models only reads the columns it uses.
+###
+_rad_cols = [('depth', 'depth'), ('radius', 'radius'), ('dr', 'dr')]
+_phys_cols = [('Te', 'Te'), ('ne', 'ne'), ('nH', 'nH'),
+              ('fillfac', 'fillfac')]
+_elements = ['H', 'He', 'C', 'N', 'O', 'S', 'Si', 'Fe']
+
+def radialDir(dir_, prefix):
+    return "{}{}.radial".format(dir_, prefix)
+
+def segmentIds(offsets):
+    '''
+    segmentIds(offsets) -> segment of each element of the flat array
+    '''
+    offsets = np.asarray(offsets)
+    return np.repeat(np.arange(len(offsets)-1), np.diff(offsets))
+
+def segmentSum(values, offsets):
+    '''
+    segmentSum(flat, offsets) -> [nseg, ...] sums over each segment of
+    flat (along its first axis), 0 for empty segments
+    '''
+    values = np.asarray(values)
+    offsets = np.asarray(offsets)
+    counts = np.diff(offsets)
+    out = np.zeros((len(counts),)+values.shape[1:],
+                   dtype=np.result_type(values.dtype, float))
+    full = counts > 0
+    if full.any():
+        out[full] = np.add.reduceat(values[:offsets[-1]],
+                                    offsets[:-1][full], axis=0)
+    return out
+
+def segmentArgmin(values, offsets):
+    '''
+    segmentArgmin(flat, offsets) -> [nseg] flat index of the minimum of
+    each segment (the first one on ties, or the first NaN, as np.argmin),
+    -1 for empty segments
+    '''
+    values = np.asarray(values)
+    offsets = np.asarray(offsets)
+    seg = segmentIds(offsets)
+    vals = values[:offsets[-1]]
+    # by segment, NaNs first, then value; stable, so ties keep order
+    order = np.lexsort((vals, ~np.isnan(vals), seg))
+    counts = np.diff(offsets)
+    out = np.full(len(counts), -1, dtype=int)
+    full = counts > 0
+    out[full] = order[offsets[:-1][full]]
+    return out
+
+def _products(file_pr, modnum, products):
+    '''
+    the zone files saved by the grid's models
+    '''
+    def saved(key):
+        if products is not None:
+            return key in products
+        return os.path.exists("{}{}.{}".format(file_pr, modnum, key))
+    return (saved('phys'), [ele for ele in _elements if saved('ele_'+ele)],
+            saved('emis'), saved('cool'))
+
+def buildRadial(dir_, prefix, modnums, products=None, **info):
+    '''
+    buildRadial(dir_, 'ZAU', mods.modpars[:,0], products=mods.products)
+    reads the zone files of every model into PREFIX.radial/, in two
+    passes (zone counts, then the columns written straight into the
+    memory-mapped arrays). extra keywords are saved in info.json.
+    '''
+    file_pr = dir_ + prefix
+    modnums = [int(n) for n in modnums]
+    path = radialDir(dir_, prefix)
+    if not os.path.exists(path):
+        os.makedirs(path)
+    for fname in os.listdir(path):
+        os.remove(os.path.join(path, fname))
+    has_phys, elements, has_emis, has_cool = _products(file_pr, modnums[0],
+                                                       products)
+    # pass 1: zones of each model, names of the ion and emis columns
+    nzones = [readSave("{}{}.rad".format(file_pr, n)).size for n in modnums]
+    offsets = np.concatenate(([0], np.cumsum(nzones))).astype(int)
+    fl = "{}{}".format(file_pr, modnums[0])
+    ion_names = dict([(ele, list(readSave(fl+".ele_"+ele).dtype.names[1:]))
+                      for ele in elements])
+    emis_labels = list(readSave(fl+".emis").dtype.names[1:]) if has_emis else []
+    cool_labels = (list(readSave(fl+".cool", comments='#').dtype.names[1:])
+                   if has_cool else [])
+    shapes = dict([(col, ()) for col, name in _rad_cols])
+    if has_phys:
+        shapes.update([(col, ()) for col, name in _phys_cols])
+    for ele in elements:
+        shapes['ion_'+ele] = (len(ion_names[ele]),)
+    if has_emis:
+        shapes['emis'] = (len(emis_labels),)
+    if has_cool:
+        shapes['cool'] = (len(cool_labels),)
+    cols = dict([(col, np.lib.format.open_memmap(
+        os.path.join(path, col+".npy"), mode="w+", dtype=float,
+        shape=(offsets[-1],)+shape)) for col, shape in shapes.items()])
+    # pass 2: the columns
+    def read(fname, names, i, comments=';'):
+        dat = readSave(fname, comments=comments)
+        if dat.size != nzones[i]:
+            raise ValueError("{} has {} zones, the .rad file {}".format(
+                fname, dat.size, nzones[i]))
+        if names is not None and list(dat.dtype.names[1:]) != names:
+            raise ValueError("{} columns differ from model {}".format(
+                fname, modnums[0]))
+        return dat
+    for i, n in enumerate(modnums):
+        fl = "{}{}".format(file_pr, n)
+        zones = slice(offsets[i], offsets[i+1])
+        dat = read(fl+".rad", None, i)
+        for col, name in _rad_cols:
+            cols[col][zones] = dat[name]
+        if has_phys:
+            dat = read(fl+".phys", None, i)
+            for col, name in _phys_cols:
+                cols[col][zones] = dat[name]
+        for ele in elements:
+            dat = read(fl+".ele_"+ele, ion_names[ele], i)
+            for j, ion in enumerate(ion_names[ele]):
+                cols['ion_'+ele][zones, j] = dat[ion]
+        if has_emis:
+            dat = read(fl+".emis", emis_labels, i)
+            for j, label in enumerate(emis_labels):
+                cols['emis'][zones, j] = pow(10., dat[label])
+        if has_cool:
+            dat = read(fl+".cool", cool_labels, i, comments='#')
+            for j, label in enumerate(cool_labels):
+                cols['cool'][zones, j] = dat[label]
+    for arr in cols.values():
+        arr.flush()
+    del cols
+    np.save(os.path.join(path, "offsets.npy"), offsets)
+    info.update(modnums=modnums, columns=sorted(shapes),
+                ion_names=ion_names, emis_labels=emis_labels,
+                cool_labels=cool_labels)
+    # written last: a store without info.json is incomplete
+    f = open(os.path.join(path, "info.json"), "w")
+    json.dump(info, f)
+    f.close()
+    return radialStore(dir_, prefix)
+
+class radialStore(object):
+    '''
+    rs = radialStore(dir_, 'ZAU')
+    rs['Te']               Te of every zone of every model
+    rs.model(i, 'Te')      Te of the zones of the model at position i
+    rs.ion('H', 1)         H+ fraction of every zone
+    rs.emis('H__1_656285A')
+    rs['Te'][rs.front('H')]  Te at the H+ front of every model
+    '''
+    def __init__(self, dir_, prefix):
+        self.path = radialDir(dir_, prefix)
+        f = open(os.path.join(self.path, "info.json"), "r")
+        self.info = json.load(f)
+        f.close()
+        self.modnums = np.array(self.info["modnums"], dtype=int)
+        self.columns = [str(col) for col in self.info["columns"]]
+        self.ion_names = dict([(str(ele), [str(ion) for ion in ions])
+                               for ele, ions in self.info["ion_names"].items()])
+        self.emis_labels = [str(label) for label in self.info["emis_labels"]]
+        self.cool_labels = [str(label) for label in
+                            self.info.get("cool_labels", [])]
+        self.offsets = np.load(os.path.join(self.path, "offsets.npy"))
+        self.nmods = len(self.offsets) - 1
+        self.n_zones = np.diff(self.offsets)
+        self._cols = {}
+        return
+    @classmethod
+    def exists(cls, dir_, prefix):
+        return os.path.exists(os.path.join(radialDir(dir_, prefix),
+                                           "info.json"))
+    def __getitem__(self, col):
+        if col not in self._cols:
+            if col not in self.columns:
+                raise KeyError("{} is not in {}".format(col, self.path))
+            self._cols[col] = np.load(os.path.join(self.path, col+".npy"),
+                                      mmap_mode="r")
+        return self._cols[col]
+    @property
+    def zone_model(self):
+        '''
+        position of the model of each zone
+        '''
+        return segmentIds(self.offsets)
+    def model(self, i, col):
+        return self[col][self.offsets[i]:self.offsets[i+1]]
+    def ion(self, ele, ion):
+        '''
+        fraction of ion (0 = neutral) of ele in every zone
+        '''
+        return self['ion_'+ele][:, ion]
+    def emis(self, label):
+        return self['emis'][:, self.emis_labels.index(label)]
+    def cool(self, label):
+        return self['cool'][:, self.cool_labels.index(label)]
+    def front(self, ele='H', ion=1, level=0.5):
+        '''
+        flat index of the zone of each model where the fraction of ion
+        is nearest level (modObj.indH for H+, indHe for He+)
+        '''
+        return segmentArgmin(np.abs(self.ion(ele, ion)-level), self.offsets)
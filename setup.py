@@ -25,7 +25,7 @@ setup(name="cloudyfsps",
                    "astrodata":"cloudyfsps/astrodata"},
       package_data={
         "": ["README.rst", "LICENSE.rst", "AUTHORS.rst"],
-        "cloudyfsps":["data/*.dat"],
+        "cloudyfsps":["data/*.dat", "data/*.npy"],
         "astrodata":["data/*.dat", "data/*.npz"]
       },
       include_package_data=True,
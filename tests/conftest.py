@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import os
+import shutil
+import pytest
+import numpy as np
+
+# cloudyfsps refuses to import without CLOUDY_EXE; none of the tests
+# run Cloudy, so any path will do
+os.environ.setdefault('CLOUDY_EXE', 'cloudy.exe')
+
+###
+# A small synthetic Cloudy grid, ZAU1..ZAU8 (logZ x age x logU), with the
+# files modObj reads: .lineflux, .out (two iterations), .rad, .phys,
+# .ele_*, .emis, .heat and .cool. Zone counts differ between models, so
+# the radial structure is ragged.
+###
+grid_eles = {'H':['H', 'H+', 'H2'], 'He':['He', 'He+', 'He+2'],
+             'C':['C', 'C+', 'C+2', 'C+3'], 'N':['N', 'N+', 'N+2', 'N+3'],
+             'O':['O', 'O+', 'O+2', 'O+3'], 'S':['S', 'S+', 'S+2'],
+             'Si':['Si', 'Si+', 'Si+2'], 'Fe':['Fe', 'Fe+', 'Fe+2']}
+grid_cool = (['hvFB', 'Hvin', 'FFcm', 'H', 'He', 'N', 'O', 'S', 'Ne', 'C',
+              'Ar', 'Fe', 'Al', 'Si', 'Hfb']
+             + ['CE{}'.format(i) for i in range(30)])
+grid_heat = ['H  1', 'He 1', 'He 2', 'O  2', 'FeBF', 'BFH1']
+grid_emis = ['H  1 6562.85A', 'H  1 4861.36A', 'O  3 5007.00A',
+             'TOTL 4363.00A']
+
+def _table(fname, header, cols, fmt='{:.5e}'):
+    f = open(fname, 'w')
+    f.write('#'+'\t'.join(header)+'\n')
+    for row in np.array(cols).T:
+        f.write('\t'.join([fmt.format(x) for x in row])+'\n')
+    f.close()
+
+def _out_text(rng, par):
+    '''
+    a .out file with the summary blocks of two iterations; the second
+    has the values modObj should read
+    '''
+    logQ, logU = par[4], par[2]
+    text = [' '*20+'Cloudy 17.01\n', ' * input command\n',
+            ' '*20+'Hi-Con\n', ' Hi-Con SED summary\n',
+            '  Q(1.0-1.8):  {0:7.3f} Q(1.8-4.0):  {1:7.3f} Q(4.0-20):  '
+            '{2:7.3f} Q(20--):  {3:7.3f} Ion pht flx:1.000E+12\n'.format(
+                logQ-0.1, logQ-0.8, logQ-2.1, logQ-6.0)]
+    text += [' SED line {0}\n'.format(i+3) for i in range(5)]
+    for it in range(2):
+        for z in range(3):
+            text.append(' ####{0:3d}  Te:{1:10.3e} Hden:{2:10.3e}\n'.format(
+                z+1, *rng.rand(2)))
+        text += [
+            ' IONIZE PARMET:  U(1)= {0:.3f}  U(sp): {1:.3f}  Q(ion):  '
+            '{2:.3f}\n'.format(logU, logU-0.1*(it+1), logQ),
+            '         H :  0.0000  He: -1.0200  C : {0:.4f}  N : -4.1700  '
+            'O : -3.3100\n'.format(-3.5-0.01*it-rng.rand()),
+            ' Dust to gas ratio (by mass): 6.5e-03, AV(ext): 0.1{0} '
+            '(pnt): 0.456\n'.format(it),
+            ' ENERGY BUDGET:  Heat: {0:.3f}  Coolg: 38.120  Error:  0.1%  '
+            'Rec Lin: 37.500  F-F  H 0.000\n'.format(38.0+it+rng.rand()),
+            ' Cooling: HFBc  1.2345e+35:0.123 HFFc  2.3456e+34:0.045 Clin '
+            '912.000A:0.012 N  2 6584.00A:0.034 S II 6731.00A:0.021 S II '
+            '6716.00A:0.028 TOTL 3727.00A:0.111 S  3 9532.00A:0.043 O  3 '
+            '5007.00A:0.2{0} O  3 4959.00A:0.074\n'.format(it),
+            ' Heating: BFH1  3.4567e+35:0.8{0} BFHe 1.0e+34:0.100\n'.format(it),
+            ' HFBc'+' '*9+'1.2{0}e+35  4.56e+34\n'.format(it),
+            ' The geometry is spherical.\n']
+    text.append(' ###\n')
+    return ''.join(text)
+
+def writeGrid(dir_, prefix='ZAU', seed=1):
+    '''
+    writes the synthetic grid into dir_ (ending in /)
+    '''
+    rng = np.random.RandomState(seed)
+    pars = [(Z, a, U, 19.0, 49.0+U, 100.0, -1.0) for Z in [-1.0, 0.0]
+            for a in [1.0e6, 3.0e6] for U in [-3.0, -2.0]]
+    f = open(dir_+prefix+'.pars', 'w')
+    for i, p in enumerate(pars):
+        f.write('{0} {1:.2f} {2:.2e} {3:.2f} {4:.2f} {5:.2f} {6:.2f} '
+                '{7:.2f}\n'.format(i+1, *p))
+    f.close()
+    from cloudyfsps.lineRatios import named_lines
+    lam = np.sort(np.concatenate([list(named_lines.values()),
+                                  rng.uniform(900., 1.0e4, 40)]))
+    for i, par in enumerate(pars):
+        pr = '{0}{1}{2}'.format(dir_, prefix, i+1)
+        np.savetxt(pr+'.lineflux', np.column_stack([lam, 10.**rng.uniform(
+            -3., 1., len(lam))]), fmt=str('%4.6e'))
+        f = open(pr+'.out', 'w')
+        f.write(_out_text(rng, par))
+        f.close()
+        nz = rng.randint(20, 60)
+        dr = rng.uniform(1.0e15, 5.0e15, nz)
+        depth = np.cumsum(dr) - dr/2.
+        _table(pr+'.rad', ['zone', 'radius', 'depth', 'dr'],
+               [np.arange(nz)+1, 10.**par[3]+depth, depth, dr])
+        Te = rng.uniform(5.0e3, 1.5e4, nz)
+        nH = np.full(nz, par[5])
+        _table(pr+'.phys', ['depth', 'Te', 'Htot', 'nH', 'ne', 'fillfac'],
+               [depth, Te, rng.uniform(1.0e-20, 1.0e-19, nz), nH,
+                nH*rng.uniform(0.8, 1.2, nz), rng.uniform(0.5, 1., nz)])
+        for ele, ions in grid_eles.items():
+            # ionized inside, neutral outside, so the fronts are inside
+            frac = rng.dirichlet(np.ones(len(ions)), nz).T
+            if ele in ('H', 'He'):
+                x = np.linspace(0.99, 0.01, nz)
+                frac = np.array([1.-x, x, np.zeros(nz)])
+            _table(pr+'.ele_'+ele, ['depth']+ions, [depth]+list(frac))
+        _table(pr+'.emis', ['depth']+grid_emis,
+               [depth]+list(rng.uniform(-25., -20., (len(grid_emis), nz))))
+        ctot = rng.uniform(1.0e-20, 1.0e-19, nz)
+        _table(pr+'.cool', ['depth cm', 'Temp K', 'Htot erg/cm3/s',
+                            'Ctot(erg/cm3/s)', 'x']+grid_cool,
+               [depth, Te, ctot*1.01, ctot, ctot]
+               +list(rng.uniform(0., 0.1, (len(grid_cool), nz))))
+        f = open(pr+'.heat', 'w')
+        f.write('#depth cm\tTemp K\tHtot erg/cm3/s\tCtot erg/cm3/s\t'
+                'heat fracs\n')
+        for z in range(nz):
+            labs = [lab for lab in grid_heat if rng.rand() < 0.7] or ['H  1']
+            fr = rng.dirichlet(np.ones(len(labs)))
+            f.write('{0:.4e}\t{1:.2f}\t{2:.4e}\t{3:.4e}\t'.format(
+                depth[z], Te[z], ctot[z]*1.01, ctot[z])
+                    +'\t'.join(['{0}\t{1:.4f}'.format(lab, x)
+                                for lab, x in zip(labs, fr)])+'\n')
+        f.close()
+    return pars
+
+@pytest.fixture(scope='session')
+def synth_grid(tmp_path_factory):
+    dir_ = str(tmp_path_factory.mktemp('synth'))+'/'
+    writeGrid(dir_)
+    return dir_
+
+@pytest.fixture
+def grid_dir(synth_grid, tmp_path):
+    '''
+    a fresh copy of the synthetic grid (file mtimes kept), for tests
+    that write snapshots or stores next to it
+    '''
+    dir_ = str(tmp_path/'grid')
+    shutil.copytree(synth_grid, dir_)
+    return dir_+'/'
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import os
+import pytest
+import numpy as np
+from scipy.interpolate import interp1d
+from cloudyfsps.generalTools import air_to_vac
+from cloudyfsps.dataTools import getFSPSlam
+from cloudyfsps.cloudyOutputTools import getResampleOperator, resampleCont
+
+###
+# the resampling operator against the interp1d calls it replaced, which
+# interpolated the reversed Cloudy columns (descending in wavelength in
+# the file) onto the FSPS wavelengths, 0 outside the Cloudy mesh
+###
+def mesh(rng, n=2000, ndup=0):
+    '''
+    air wavelengths in Cloudy's file order, descending; ndup of them
+    repeated, as Cloudy does at the edges of its energy cells
+    '''
+    ang = np.sort(10.**rng.uniform(2.3, 6.5, n))
+    ang = np.sort(np.concatenate((ang, ang[rng.randint(1, n-1, ndup)])))
+    return ang[::-1]
+
+def old(ang, flux):
+    flux = np.asarray(flux)
+    fsps_lam = getFSPSlam()
+    cols = flux.reshape(len(ang), -1)
+    out = np.column_stack([interp1d(air_to_vac(ang[::-1]), col[::-1],
+                                    fill_value=0.0,
+                                    bounds_error=False)(fsps_lam)
+                           for col in cols.T])
+    return out.reshape((len(fsps_lam),)+flux.shape[1:])
+
+def close(a, b):
+    return np.allclose(a, b, rtol=1.0e-12, atol=1.0e-300)
+
+@pytest.mark.parametrize('ndup', [0, 40])
+def test_descending(ndup):
+    rng = np.random.RandomState(ndup)
+    ang = mesh(rng, ndup=ndup)
+    assert len(np.unique(ang)) == len(ang) - ndup
+    flux = rng.rand(len(ang))
+    assert close(resampleCont(ang, flux), old(ang, flux))
+
+@pytest.mark.parametrize('order', ['ascending', 'shuffled'])
+def test_any_order(order):
+    rng = np.random.RandomState(3)
+    ang = mesh(rng, ndup=20)
+    ang = ang[::-1] if order == 'ascending' else ang[rng.permutation(len(ang))]
+    flux = rng.rand(len(ang), 3)
+    assert close(resampleCont(ang, flux), old(ang, flux))
+
+def test_outside_and_stacked():
+    rng = np.random.RandomState(4)
+    ang = mesh(rng)
+    flux = 1.0 + rng.rand(len(ang), 2)
+    out = resampleCont(ang, flux)
+    fsps_lam = getFSPSlam()
+    ang_v = air_to_vac(ang)
+    outside = (fsps_lam < ang_v.min()) | (fsps_lam > ang_v.max())
+    assert outside.any() and (~outside).any()
+    assert (out[outside] == 0.).all() and (out[~outside] > 0.).all()
+    assert close(out[:, 1], resampleCont(ang, flux[:, 1]))
+    # one operator per mesh
+    assert getResampleOperator(ang) is getResampleOperator(ang.copy())
+    assert getResampleOperator(ang) is not getResampleOperator(ang[1:])
+
+def test_line_list_changed(tmp_path):
+    from cloudyfsps.cloudyInputTools import getLineList
+    from cloudyfsps.cloudyOutputTools import getLineWavs
+    from cloudyfsps.dataTools import getRefLines
+    labels = getLineList()
+    fname = str(tmp_path/'lines.dat')
+    open(fname, 'w').write('\n'.join(labels[:5])+'\n')
+    wl, sinds = getLineWavs(line_list=fname)
+    assert np.array_equal(wl, getRefLines(True)['wav'][:5])
+    assert getLineWavs(line_list=fname)[0] is wl
+    # the same file with other lines, written later
+    open(fname, 'w').write('\n'.join(labels[10:13])+'\n')
+    st = os.stat(fname)
+    os.utime(fname, (st.st_atime, st.st_mtime+10.))
+    wl, sinds = getLineWavs(line_list=fname)
+    assert np.array_equal(wl, getRefLines(True)['wav'][10:13])
+    assert np.array_equal(wl[sinds], np.sort(wl))
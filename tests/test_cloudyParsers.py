@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import pytest
+import numpy as np
+from cloudyfsps.cloudyParsers import (readLin, readCont, readSave, readTable,
+                                      validNames)
+
+###
+# Each reader against the np.genfromtxt call it replaced, on small
+# files with the layouts Cloudy writes, and on files that have to go
+# through the genfromtxt fallback.
+###
+def write(path, text):
+    f = open(str(path), 'w')
+    f.write(text)
+    f.close()
+    return str(path)
+
+def rows(rng, nrow, ncol, fmt='{0:.4e}', sep='\t'):
+    return ''.join([sep.join([fmt.format(x) for x in row])+'\n'
+                    for row in rng.rand(nrow, ncol)*10.**rng.randint(-30, 30, (nrow, ncol))])
+
+def same(a, b):
+    if a.dtype.names is None:
+        assert a.shape == b.shape
+        assert np.array_equal(a, b, equal_nan=True)
+    else:
+        assert a.dtype.names == b.dtype.names
+        assert a.shape == b.shape
+        for name in a.dtype.names:
+            assert np.array_equal(a[name], b[name], equal_nan=True)
+
+def test_readTable(tmp_path):
+    rng = np.random.RandomState(1)
+    fl = write(tmp_path/'a.lineflux', rows(rng, 20, 2, '{0:4.6e}', ' '))
+    same(readTable(fl), np.genfromtxt(fl))
+    fl = write(tmp_path/'b.pars', '# comment\n'+rows(rng, 5, 8)+'\n\n'
+               +rows(rng, 3, 8)+'# trailing\n')
+    same(readTable(fl), np.genfromtxt(fl))
+    fl = write(tmp_path/'c.out_lines', rows(rng, 1, 2))
+    same(readTable(fl), np.genfromtxt(fl))
+    fl = write(tmp_path/'d.lines', '#3 cols\n'+rows(rng, 4, 3, sep=' '))
+    same(readTable(fl, skip_header=1), np.genfromtxt(fl, skip_header=1))
+
+def test_readTable_fallback(tmp_path):
+    fl = write(tmp_path/'a.dat', '1 2 3\n4 nan 6\n7 8 9\n')
+    same(readTable(fl), np.genfromtxt(fl))
+    fl = write(tmp_path/'b.dat', '1 2 3\n4 abc 6\n')
+    same(readTable(fl), np.genfromtxt(fl))
+
+def test_readLin(tmp_path):
+    rng = np.random.RandomState(2)
+    labels = ['H  1 6562.81A', 'O  3 5006.84A', 'Blnd 1665.00A']
+    fl = write(tmp_path/'a.lin', '#lineslist\n#\n'+''.join(
+        ['{0}\t{1:.4e}\n'.format(lab, x)
+         for lab, x in zip(labels, rng.rand(3)*1.0e35)]))
+    dat = np.genfromtxt(fl, skip_header=2, delimiter='\t', dtype='S20,f8')
+    same(readLin(fl), np.array([d[1] for d in dat]))
+
+def test_readCont(tmp_path):
+    rng = np.random.RandomState(3)
+    fl = write(tmp_path/'a.outwcont', '#Cont  nu\tincident\ttrans\tDiffOut'
+               '\tnet trans\treflc\ttotal\n'+rows(rng, 50, 7, '{0:.3e}'))
+    same(readCont(fl), np.genfromtxt(fl, skip_header=1))
+
+def test_readSave(tmp_path):
+    rng = np.random.RandomState(4)
+    names = ['#depth', 'Te', 'Htot', 'nH', 'ne', 'net trans', 'O', 'O',
+             'H  1 6562.81A', 'print', '']
+    fl = write(tmp_path/'a.emis', '\t'.join(names)+'\n'
+               +rows(rng, 30, len(names)))
+    got = readSave(fl)
+    same(got, np.genfromtxt(fl, delimiter='\t', comments=';', names=True))
+    assert list(got.dtype.names) == validNames(['depth']+names[1:])
+    fl = write(tmp_path/'b.rad', '#depth\tradius\tdr\n'+rows(rng, 10, 3)
+               +';comment\n'+rows(rng, 10, 3))
+    same(readSave(fl), np.genfromtxt(fl, delimiter='\t', comments=';',
+                                     names=True))
+
+def test_validNames():
+    names = ['', 'a b', 'f0', '', 'file', 'x.y', 'a_b', '']
+    got = validNames(names)
+    ref = np.genfromtxt([' \t'.join(['1']*len(names))], delimiter='\t',
+                        names=names).dtype.names
+    assert tuple(got) == ref
+
+def test_readSave_fallback(tmp_path):
+    fl = write(tmp_path/'a.phys', '#depth\tTe\tnH\n1\t2\t3\n4\tx\t6\n')
+    same(readSave(fl), np.genfromtxt(fl, delimiter='\t', comments=';',
+                                     names=True))
+    fl = write(tmp_path/'b.phys', '#depth\tTe\tnH\n1\t2\t3\n4\t5\n')
+    with pytest.raises(ValueError):
+        np.genfromtxt(fl, delimiter='\t', comments=';', names=True)
+    with pytest.raises(ValueError):
+        readSave(fl)
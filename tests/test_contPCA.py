@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import os
+import pytest
+import numpy as np
+from cloudyfsps.gridStore import gridStore
+from cloudyfsps.contPCA import contPCA, pcaRows, storePCA
+
+###
+# contPCA holds every model within its tolerance with the fewest
+# components, and a store keeping only the PCA reads back the same
+###
+def continua(rng, nmod=120, nlam=300, ncomp=6, noise=0.003):
+    lam = np.linspace(0., 1., nlam)
+    shapes = np.array([np.cos(k*np.pi*lam) for k in range(ncomp)])
+    logc = -20.0 + rng.normal(size=(nmod, ncomp)).dot(shapes)
+    logc += noise*rng.normal(size=logc.shape)
+    return 10.**logc
+
+def max_err(pca, flux):
+    return np.abs(np.log10(pca.reconstruct()) - np.log10(flux)).max()
+
+@pytest.mark.parametrize('tol', [0.1, 0.01, 0.003])
+def test_tolerance(tol):
+    rng = np.random.RandomState(14)
+    flux = continua(rng)
+    pca = contPCA.fit(flux, tol=tol, chunk_size=50)
+    err = max_err(pca, flux)
+    assert err <= tol
+    assert np.isclose(err, pca.max_err, rtol=1.0e-8, atol=1.0e-12)
+    # the fewest components: one less is not within tol
+    fewer = contPCA(pca.mean, pca.basis[:-1],
+                    (np.log10(flux) - pca.mean).dot(pca.basis[:-1].T),
+                    pca.floor, tol, None)
+    assert max_err(fewer, flux) > tol
+    assert pca.ncomp < min(flux.shape)
+
+def test_chunks_and_floor():
+    rng = np.random.RandomState(15)
+    flux = continua(rng, nmod=40, nlam=100)
+    flux[3, :10] = 0.
+    pca = contPCA.fit(flux, tol=0.01)
+    assert pca.floor == flux[flux > 0.].min()
+    same = contPCA.fit(flux, tol=0.01, chunk_size=7)
+    assert same.ncomp == pca.ncomp
+    assert np.allclose(same.reconstruct(), pca.reconstruct(), rtol=1.0e-8)
+    # zeros come back as the floor, within tol
+    want = np.log10(np.maximum(flux, pca.floor))
+    assert np.abs(np.log10(pca.reconstruct()) - want).max() <= 0.01
+
+def test_basis_svd():
+    rng = np.random.RandomState(18)
+    flux = continua(rng, nmod=60, nlam=200)
+    pca = contPCA.fit(flux, tol=0.003, chunk_size=13)
+    assert np.allclose(pca.basis.dot(pca.basis.T), np.eye(pca.ncomp),
+                       atol=1.0e-12)
+    # the leading right singular vectors of all the centered rows
+    rows = np.log10(flux) - np.log10(flux).mean(axis=0)
+    vt = np.linalg.svd(rows, full_matrices=False)[2]
+    assert np.allclose(np.abs((pca.basis*vt[:pca.ncomp]).sum(axis=1)), 1.,
+                       atol=1.0e-8)
+
+def test_tolerance_not_met():
+    rng = np.random.RandomState(19)
+    flux = continua(rng, nmod=30, nlam=50)
+    with pytest.raises(ValueError):
+        contPCA.fit(flux, tol=0.0)
+    # fewer models than wavelengths: the full basis has nmod components
+    pca = contPCA.fit(flux, tol=1.0e-10)
+    assert pca.ncomp <= 30 and pca.max_err <= 1.0e-10
+
+def test_save_and_rows(tmp_path):
+    rng = np.random.RandomState(16)
+    flux = continua(rng, nmod=30, nlam=50)
+    pca = contPCA.fit(flux, tol=0.01)
+    fname = str(tmp_path/'pca.npz')
+    assert pca.ratio > 1.
+    pca.save(fname)
+    back = contPCA.load(fname)
+    for key in ['mean', 'basis', 'coeffs']:
+        assert np.array_equal(getattr(back, key), getattr(pca, key))
+    assert (back.floor, back.tol, back.max_err) == (pca.floor, pca.tol,
+                                                    pca.max_err)
+    rows = pcaRows(back)
+    full = pca.reconstruct()
+    assert rows.shape == full.shape and len(rows) == len(full)
+    assert np.array_equal(np.asarray(rows), full)
+    assert np.array_equal(rows[5], full[5])
+    assert np.array_equal(rows[[0, 5]], full[[0, 5]])
+    assert np.array_equal(rows[3:9], full[3:9])
+    assert np.array_equal(rows[:, 10], full[:, 10])
+    assert np.array_equal(rows[-1, 2:4], full[-1, 2:4])
+    assert np.allclose(pca.expand(pca.coeffs[5]), full[5])
+
+def test_store_round_trip(tmp_path):
+    rng = np.random.RandomState(17)
+    dir_ = str(tmp_path)+'/'
+    flux = continua(rng, nmod=20, nlam=80)
+    pars = np.column_stack([np.arange(1, 21), rng.rand(20, 2)])
+    store = gridStore.create(dir_, 'ZAU', pars, np.arange(3.),
+                             np.linspace(1.0e3, 1.0e4, 80))
+    for i, row in enumerate(flux):
+        store.write(i+1, lines=np.ones(3), cont=row, stamp=1.0)
+    store.flush()
+    del store
+    pca = storePCA(dir_, 'ZAU', tol=0.01, verbose=False)
+    # kept while the continua are not newer
+    mtime = os.path.getmtime(gridStore(dir_, 'ZAU').pca_file)
+    assert storePCA(dir_, 'ZAU', tol=0.01, verbose=False).ncomp == pca.ncomp
+    assert os.path.getmtime(gridStore(dir_, 'ZAU').pca_file) == mtime
+    storePCA(dir_, 'ZAU', tol=0.01, drop_cont=True, verbose=False)
+    store = gridStore(dir_, 'ZAU')
+    assert not os.path.exists(store._file('cont'))
+    assert isinstance(store.cont, pcaRows)
+    assert np.abs(np.log10(store.cont[:]) - np.log10(flux)).max() <= 0.01
+    assert np.array_equal(store.cont[4], pca.reconstruct(4))
+    assert storePCA(dir_, 'ZAU', tol=0.05, verbose=False).ncomp == pca.ncomp
+    with pytest.raises(ValueError):
+        storePCA(dir_, 'ZAU', tol=0.001, verbose=False)
+    with pytest.raises(ValueError):
+        gridStore(dir_, 'ZAU', mode='r+').write(1, cont=flux[0])
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import os
+import pytest
+import numpy as np
+from cloudyfsps.fspsTables import fspsTable, convertTable
+
+###
+# convertTable on small tables in the layout outputFormatting writes,
+# checked against the text read back line by line
+###
+logZ = [-1.0, 0.0]
+Age = [1.0e6, 2.0e6, 5.0e6]
+logU = [-3.0, -2.5, -2.0, -1.5]
+
+def write_table(fname, pars, flux, lam, more_info=False):
+    f = open(fname, 'w')
+    f.write('#{0} cols {1} rows {2} logZ {3} Age {4} logU\n'.format(
+        len(lam), len(pars), len(logZ), len(Age), len(logU)))
+    f.write(' '.join(['%1.6e' % x for x in lam])+'\n')
+    for n, (par, row) in enumerate(zip(pars, flux)):
+        if more_info:
+            par = [n+1]+list(par)+[19.0, 48.0, 100.0, -1.0]
+        f.write(' '.join(['%2.4e' % x for x in par])+'\n')
+        f.write(' '.join(['%.4g' % x for x in row])+'\n')
+    f.close()
+    return fname
+
+def read_text(fname):
+    '''
+    lam, pars, flux of a table, straight from the text
+    '''
+    rows = [np.array(line.split(), dtype=float)
+            for line in open(fname) if not line.startswith('#')]
+    return rows[0], np.array(rows[1::2]), np.array(rows[2::2])
+
+def grid(rng, drop=()):
+    pars = np.array([(z, a, u) for z in logZ for a in Age for u in logU])
+    keep = [i for i in range(len(pars)) if i not in drop]
+    pars = pars[keep]
+    # rows in an order other than the cube's
+    order = rng.permutation(len(pars))
+    return pars[order], rng.rand(len(pars), 5)*1.0e-20
+
+def test_cube(tmp_path):
+    rng = np.random.RandomState(5)
+    pars, flux = grid(rng, drop=(7,))
+    lam = np.linspace(1.0e3, 1.0e4, 5)
+    fname = write_table(str(tmp_path/'ZAU.lines'), pars, flux, lam)
+    tab = fspsTable(fname)
+    text_lam, text_pars, text_flux = read_text(fname)
+    assert np.array_equal(tab.lam, text_lam)
+    assert np.array_equal(tab.pars, text_pars)
+    assert np.array_equal(tab.flux, text_flux)
+    assert tab.labels == ['logZ', 'Age', 'logU']
+    assert tab.shape == (2, 3, 4)
+    assert tab.cube.shape == (2, 3, 4, 5)
+    for label, vals in zip(tab.labels, [logZ, Age, logU]):
+        assert np.array_equal(tab.coords[label], vals)
+    for par, row in zip(text_pars, text_flux):
+        ind = tab.index(logZ=par[0], Age=par[1], logU=par[2])
+        assert np.array_equal(tab.cube[ind], row)
+        assert np.array_equal(tab.get(logZ=par[0], Age=par[1], logU=par[2]),
+                              row)
+    # the model left out is NaN
+    assert np.isnan(tab.cube[0, 1, 3]).all()
+    assert np.isnan(tab.cube).sum() == len(lam)
+    assert tab.get(logZ=0.0, Age=2.0e6).shape == (4, 5)
+
+def test_sidecars_follow_text(tmp_path):
+    rng = np.random.RandomState(6)
+    pars, flux = grid(rng)
+    lam = np.arange(1.0, 6.0)
+    fname = write_table(str(tmp_path/'ZAU.cont'), pars, flux, lam)
+    tab = fspsTable(fname)
+    assert tab.isCurrent()
+    write_table(fname, pars, 2.0*flux, lam)
+    later = os.path.getmtime(fname+'.npy') + 10.0
+    os.utime(fname, (later, later))
+    assert not tab.isCurrent()
+    tab = fspsTable(fname)
+    assert np.array_equal(tab.flux, read_text(fname)[2])
+
+def test_more_info_raises(tmp_path):
+    rng = np.random.RandomState(7)
+    pars, flux = grid(rng)
+    fname = write_table(str(tmp_path/'ZAU.lines'), pars, flux,
+                        np.arange(1.0, 6.0), more_info=True)
+    with pytest.raises(ValueError, match='more_info'):
+        convertTable(fname)
+    assert not os.path.exists(fname+'.npy')
+
+def test_duplicate_raises(tmp_path):
+    rng = np.random.RandomState(8)
+    pars, flux = grid(rng)
+    pars[3] = pars[4]
+    fname = write_table(str(tmp_path/'ZAU.lines'), pars, flux,
+                        np.arange(1.0, 6.0))
+    with pytest.raises(ValueError, match='share parameters'):
+        convertTable(fname)
+    assert not os.path.exists(fname+'.npy')
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import os
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator, LinearNDInterpolator
+from cloudyfsps.gridStore import gridStore
+from cloudyfsps.gridEmulator import gridEmulator
+
+###
+# gridEmulator against scipy's interpolators of the same log fluxes:
+# RegularGridInterpolator on full grids, LinearNDInterpolator (over the
+# axes scaled to [0, 1]) on scattered and incomplete ones
+###
+logZ = np.array([-1.5, -1.0, -0.5, 0.0, 0.2])
+Age = np.array([1.0e6, 2.0e6, 3.0e6, 5.0e6, 1.0e7])
+logU = np.array([-4.0, -3.0, -2.5, -2.0, -1.0])
+
+def regular_pars():
+    Z, A, U = np.meshgrid(logZ, Age, logU, indexing='ij')
+    return dict(logZ=Z.ravel(), Age=A.ravel(), logU=U.ravel())
+
+def fluxes(rng, pars, nflux=7):
+    # smooth in the axes, so a missing model changes little
+    x = np.column_stack([pars['logZ'], np.log10(pars['Age']), pars['logU']])
+    return 10.**(x.dot(rng.normal(size=(3, nflux))) - 20.0
+                 + 0.1*rng.rand(len(x), nflux))
+
+def inside_points(rng, n):
+    return np.column_stack([rng.uniform(logZ[0], logZ[-1], n),
+                            10.**rng.uniform(6.0, 7.0, n),
+                            rng.uniform(logU[0], logU[-1], n)])
+
+def test_regular(tmp_path):
+    rng = np.random.RandomState(9)
+    pars = regular_pars()
+    flux = fluxes(rng, pars)
+    # model order other than the grid's
+    order = rng.permutation(len(flux))
+    emu = gridEmulator(dict([(k, v[order]) for k, v in pars.items()]),
+                       flux[order], chunk_size=64)
+    assert emu.regular
+    ref = RegularGridInterpolator((logZ, np.log10(Age), logU),
+                                  np.log10(flux).reshape(5, 5, 5, -1))
+    pts = inside_points(rng, 500)
+    # grid points and cell faces too
+    pts[:20] = np.column_stack([pars[k] for k in ['logZ', 'Age', 'logU']])[:20]
+    pts[20:40, 0] = logZ[2]
+    x = np.column_stack([pts[:,0], np.log10(pts[:,1]), pts[:,2]])
+    got = emu(pts)
+    assert np.allclose(np.log10(got), ref(x), rtol=0., atol=1.0e-10)
+    assert np.allclose(got[:20], flux[:20], rtol=1.0e-10, atol=0.)
+    by_name = emu(logZ=pts[:,0], Age=pts[:,1], logU=pts[:,2])
+    assert np.array_equal(by_name, got)
+
+def test_outside_and_fixed_axis():
+    rng = np.random.RandomState(10)
+    pars = regular_pars()
+    pars['nH'] = np.full(len(pars['logZ']), 100.0)
+    flux = fluxes(rng, pars)
+    emu = gridEmulator(pars, flux, axes=('logZ', 'Age', 'logU', 'nH'))
+    assert emu.axes == ['logZ', 'Age', 'logU']
+    assert emu.fixed == {'nH':100.0}
+    got = emu([[0.5, 1.0e6, -2.0], [0.0, 1.0e8, -2.0], [0.0, 2.0e6, np.nan],
+               [0.0, 2.0e6, -2.0]])
+    assert np.isnan(got[:3]).all()
+    assert np.isfinite(got[3]).all()
+
+def test_scattered():
+    rng = np.random.RandomState(11)
+    n = 300
+    pars = dict(logZ=rng.uniform(logZ[0], logZ[-1], n),
+                Age=10.**rng.uniform(6.0, 7.0, n),
+                logU=rng.uniform(logU[0], logU[-1], n))
+    flux = fluxes(rng, pars)
+    emu = gridEmulator(pars, flux, chunk_size=100)
+    assert not emu.regular
+    x = np.column_stack([pars['logZ'], np.log10(pars['Age']), pars['logU']])
+    lo, span = x.min(axis=0), x.max(axis=0) - x.min(axis=0)
+    ref = LinearNDInterpolator((x - lo)/span, np.log10(flux))
+    pts = inside_points(rng, 1000)
+    px = np.column_stack([pts[:,0], np.log10(pts[:,1]), pts[:,2]])
+    want = ref((px - lo)/span)
+    got = np.log10(emu(pts))
+    # outside the hull of the models for both
+    assert np.array_equal(np.isnan(got), np.isnan(want))
+    ok = np.isfinite(want[:,0])
+    assert ok.sum() > 500
+    assert np.allclose(got[ok], want[ok], rtol=0., atol=1.0e-8)
+
+def test_incomplete():
+    rng = np.random.RandomState(12)
+    pars = regular_pars()
+    keep = np.ones(len(pars['logZ']), dtype=bool)
+    keep[rng.choice(len(keep), 10, replace=False)] = False
+    pars = dict([(k, v[keep]) for k, v in pars.items()])
+    flux = fluxes(rng, pars)
+    emu = gridEmulator(pars, flux)
+    assert not emu.regular
+    x = np.column_stack([pars['logZ'], np.log10(pars['Age']), pars['logU']])
+    lo, span = x.min(axis=0), x.max(axis=0) - x.min(axis=0)
+    # same triangulation as the emulator, whose simplices are found by
+    # its own bucket search rather than Delaunay.find_simplex
+    ref = LinearNDInterpolator(emu._tri, np.log10(flux))
+    pts = inside_points(rng, 1000)
+    px = np.column_stack([pts[:,0], np.log10(pts[:,1]), pts[:,2]])
+    want = ref((px - lo)/span)
+    got = np.log10(emu(pts))
+    assert np.array_equal(np.isnan(got), np.isnan(want))
+    ok = np.isfinite(want[:,0])
+    assert np.allclose(got[ok], want[ok], rtol=0., atol=1.0e-8)
+
+def make_store(dir_, rng, pars, nline=6, nlam=200):
+    names = ['logZ', 'Age', 'logU']
+    table = np.column_stack([np.arange(1, len(pars['logZ'])+1)]
+                            + [pars[k] for k in names])
+    store = gridStore.create(dir_, 'ZAU', table,
+                             np.linspace(1.0e3, 1.0e4, nline),
+                             np.linspace(1.0e3, 1.0e5, nlam))
+    lines = fluxes(rng, pars, nline)
+    lam = np.linspace(0., 1., nlam)
+    x = np.column_stack([pars['logZ'], np.log10(pars['Age']), pars['logU']])
+    logc = -20.0 + x.dot(rng.normal(size=(3, 4))).dot(
+        [np.sin(k*np.pi*lam) for k in range(1, 5)])
+    # and some structure that the PCA leaves out within tol
+    logc += 0.002*rng.normal(size=logc.shape)
+    for i in range(len(lines)):
+        store.write(i+1, lines=lines[i], cont=10.**logc[i], stamp=1.0)
+    store.flush()
+    return lines, 10.**logc
+
+def test_fromStore(tmp_path):
+    rng = np.random.RandomState(13)
+    dir_ = str(tmp_path)+'/'
+    pars = regular_pars()
+    lines, cont = make_store(dir_, rng, pars)
+    names = ['mod_num', 'logZ', 'Age', 'logU']
+    pts = inside_points(rng, 300)
+    emu = gridEmulator.fromStore(dir_, 'ZAU', 'lines', names=names)
+    assert np.allclose(emu(pts), gridEmulator(pars, lines)(pts),
+                       rtol=1.0e-12, atol=0.)
+    # exact by default, without fitting a PCA into the store
+    full = gridEmulator.fromStore(dir_, 'ZAU', 'cont', names=names)
+    assert full.pca is None
+    assert not os.path.exists(gridStore(dir_, 'ZAU').pca_file)
+    pca = gridEmulator.fromStore(dir_, 'ZAU', 'cont', names=names, tol=0.01)
+    assert pca.pca is not None
+    assert np.allclose(full(pts), gridEmulator(pars, cont)(pts),
+                       rtol=1.0e-12, atol=0.)
+    # interpolation is linear in log flux, so the PCA route is within
+    # the tolerance of the full continua
+    err = np.abs(np.log10(pca(pts)) - np.log10(full(pts))).max()
+    assert err <= pca.pca.max_err + 1.0e-10
+    assert 0. < pca.pca.max_err <= 0.01
+    assert pca.pca.ncomp < min(cont.shape)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import itertools
+import pytest
+import numpy as np
+from cloudyfsps.gridIndex import gridIndex
+
+###
+# gridIndex.select and table against a scan over the models for the
+# first one matching, on random grids: irregular (cells missing),
+# shuffled, with duplicate models and parameters that are functions of
+# the axes or constant
+###
+names = ['logZ', 'age', 'logU', 'logR', 'logQ', 'nH']
+
+def random_grid(rng, missing=0.2, ndup=10):
+    logZ = np.round(rng.uniform(-2., 0.5, rng.randint(2, 5)), 2)
+    age = np.unique(np.round(10.**rng.uniform(5.5, 7., rng.randint(2, 5)), -4))
+    logU = np.arange(-4., -0.9, rng.choice([0.5, 1.0]))
+    logR = np.array([18., 19.])[:rng.randint(1, 3)]
+    rows = [p for p in itertools.product(logZ, age, logU, logR)
+            if rng.rand() >= missing]
+    rows = [rows[i] for i in rng.permutation(len(rows))]
+    rows += [rows[i] for i in rng.randint(len(rows), size=ndup)]
+    pars = np.array(rows)
+    # logQ follows from logU and logR; nH is the same for every model
+    pars = np.column_stack([pars, pars[:,2]+2.*pars[:,3]+11.,
+                            np.full(len(pars), 100.)])
+    return dict([(name, pars[:,i]) for i, name in enumerate(names)])
+
+def scan(pars, **constraints):
+    '''
+    the first model matching every constraint, -1 if none
+    '''
+    n = len(pars[names[0]])
+    for i in range(n):
+        if all([pars[name][i] == val for name, val in constraints.items()]):
+            return i
+    return -1
+
+def brute_select(ind, pars, **constraints):
+    free = [name for name in ind.axes if name not in constraints]
+    out = np.full([len(ind.values[name]) for name in free], -1, dtype=int)
+    for cell in itertools.product(*[range(len(ind.values[name]))
+                                    for name in free]):
+        cons = dict(constraints)
+        cons.update([(name, ind.values[name][i])
+                     for name, i in zip(free, cell)])
+        out[cell] = scan(pars, **cons)
+    return out
+
+def brute_table(pars, x_name, y_name, x_vals, y_vals, **constraints):
+    out = np.full((len(y_vals), len(x_vals)), -1, dtype=int)
+    for (j, y), (i, x) in itertools.product(enumerate(y_vals),
+                                            enumerate(x_vals)):
+        cons = dict(constraints)
+        cons.update([(x_name, x), (y_name, y)])
+        out[j, i] = scan(pars, **cons)
+    return out
+
+def some_constraints(rng, ind, pars):
+    '''
+    constraints on axes, on logQ and nH, and with values not in the grid
+    '''
+    def value(name):
+        return rng.choice(ind.values[name])
+    cons = [{}, {'logZ':value('logZ')}, {'age':value('age'),
+                                          'logU':value('logU')},
+            {'logQ':value('logQ')}, {'nH':100.}, {'nH':30.},
+            {'logZ':value('logZ'), 'logQ':value('logQ')},
+            {'logU':-2.25}, {'age':value('age'), 'logR':17.}]
+    i = rng.randint(len(pars['logZ']))
+    cons.append(dict([(name, pars[name][i]) for name in names]))
+    return cons
+
+@pytest.mark.parametrize('seed', range(8))
+def test_select(seed):
+    rng = np.random.RandomState(seed)
+    pars = random_grid(rng)
+    ind = gridIndex(pars, names)
+    assert 'logQ' not in ind.axes and 'nH' not in ind.axes
+    assert not ind.unique
+    for cons in some_constraints(rng, ind, pars):
+        assert np.array_equal(ind.select(**cons),
+                              brute_select(ind, pars, **cons)), cons
+
+@pytest.mark.parametrize('seed', range(8))
+def test_table(seed):
+    rng = np.random.RandomState(100+seed)
+    pars = random_grid(rng)
+    ind = gridIndex(pars, names)
+    for x_name, y_name in [('logZ', 'age'), ('logU', 'logZ'),
+                           ('logQ', 'age')]:
+        # every value, and a subset in another order with values the
+        # grid does not have
+        x_all, y_all = ind.values[x_name], ind.values[y_name]
+        x_some = np.append(x_all[::-1][:2], x_all.max()+1.)
+        y_some = np.insert(y_all[1:], 0, -7.)
+        for x_vals, y_vals in [(None, None), (x_some, y_some)]:
+            xv = x_all if x_vals is None else x_vals
+            yv = y_all if y_vals is None else y_vals
+            for cons in some_constraints(rng, ind, pars):
+                cons = dict([(k, v) for k, v in cons.items()
+                             if k not in (x_name, y_name)])
+                got = ind.table(x_name, y_name, x_vals, y_vals, **cons)
+                want = brute_table(pars, x_name, y_name, xv, yv, **cons)
+                assert np.array_equal(got, want), (x_name, y_name, cons)
+
+def test_positions_and_grid():
+    rng = np.random.RandomState(7)
+    pars = random_grid(rng, missing=0., ndup=0)
+    ind = gridIndex(pars, names)
+    assert ind.unique and ind.regular
+    assert ind.axes == [name for name in names[:4]
+                        if len(ind.values[name]) > 1]
+    for name in names:
+        for val in ind.values[name]:
+            assert np.array_equal(ind.positions(name, val),
+                                  np.nonzero(pars[name] == val)[0])
+    assert len(ind.positions('logZ', 9.)) == 0
+    with pytest.raises(KeyError):
+        ind.code('fbhb', 0.)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import shutil
+import pytest
+import numpy as np
+
+pytest.importorskip('fsps')
+from cloudyfsps.outObj import allmods, cool_agents
+from cloudyfsps.gridIntegrals import gridIntegrals
+
+###
+# gridIntegrals of the synthetic grid against each model's own modObj
+# integrals (T0, Tpiem, get_emis_vol, _init_cool)
+###
+@pytest.fixture(scope='module')
+def grid(synth_grid, tmp_path_factory):
+    # a copy, since mods.radial() writes ZAU.radial/ next to the models
+    dir_ = str(tmp_path_factory.mktemp('integrals')/'grid')
+    shutil.copytree(synth_grid, dir_)
+    mods = allmods(dir_+'/', 'ZAU', read_out=True, read_rad=True,
+                   read_emis=True, read_cool=True, snapshot=False)
+    return mods, mods.integrals()
+
+def close(a, b):
+    return np.allclose(a, b, rtol=1.0e-12, atol=0.)
+
+def test_temperatures(grid):
+    mods, gi = grid
+    assert close(gi.T0, [mod.T0 for mod in mods.mods])
+    assert close(gi.Tpiem, [mod.Tpiem for mod in mods.mods])
+    for ele, ion in [('H', 1), ('O', 2), ('He', 0)]:
+        want = [mod._vol_mean(mod.Te, mod.nenH*mod.ion_arr[ele][ion])
+                for mod in mods.mods]
+        assert close(gi.ion_temp(ele, ion), want)
+
+def test_emis(grid):
+    mods, gi = grid
+    labels = [str(label) for label in mods.mods[0].emis_labels]
+    assert gi.rs.emis_labels == labels
+    want = np.array([[mod.get_emis_vol(label) for label in labels]
+                     for mod in mods.mods])
+    assert close(gi.emis_vol(), want)
+    assert close(gi.emis_vol(labels[1]), want[:,1])
+
+def test_cooling(grid):
+    mods, gi = grid
+    cool = gi.cooling()
+    for key in ['Ctot', 'cool_CE', 'frac_cool_CE']:
+        assert close(cool[key], [getattr(mod, key) for mod in mods.mods])
+    for att in cool_agents:
+        assert close(cool['frac_'+att],
+                     [getattr(mod, 'frac_'+att) for mod in mods.mods])
+
+def test_cached_and_plain_store(grid):
+    mods, gi = grid
+    assert gi.T0 is gi.T0
+    assert mods.integrals() is gi
+    # without modObj's agent names, agents are keyed by .cool label
+    plain = gridIntegrals(mods.radial())
+    assert close(plain.cooling()['frac_O'], gi.cooling()['frac_cool_O'])
+    assert close(plain.vol_integ(np.ones(plain.offsets[-1])),
+                 [mod._vol_integ(np.ones(mod.n_zones)) for mod in mods.mods])
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import numpy as np
+from cloudyfsps.gridMatcher import gridMatcher
+
+###
+# gridMatcher against a scan of every model for each object, on the
+# ratios each object has and the models with those ratios finite
+###
+names = ['log_NII_Ha', 'log_OIII_Hb', 'log_SII_Ha']
+
+def brute(points, x, k):
+    dist = np.full((len(x), k), np.inf)
+    inds = np.full((len(x), k), -1, dtype=int)
+    for n, row in enumerate(x):
+        f = np.isfinite(row)
+        if not f.any():
+            continue
+        good = np.nonzero(np.isfinite(points[:,f]).all(axis=1))[0]
+        d = np.sqrt(((points[good][:,f] - row[f])**2).sum(axis=1))
+        order = np.argsort(d)[:k]
+        dist[n, :len(order)] = d[order]
+        inds[n, :len(order)] = good[order]
+    return dist, inds
+
+def ratios(rng, n):
+    return dict([(name, rng.uniform(-2.0, 1.0, n)) for name in names])
+
+def test_match():
+    rng = np.random.RandomState(21)
+    mods, obs = ratios(rng, 2000), ratios(rng, 500)
+    mods['log_SII_Ha'][::50] = np.nan
+    mods['log_NII_Ha'][3] = -np.inf
+    obs['log_SII_Ha'][::10] = np.nan
+    obs['log_OIII_Hb'][::7] = np.inf
+    obs['log_NII_Ha'][5] = obs['log_OIII_Hb'][5] = np.nan
+    obs['log_SII_Ha'][5] = np.nan
+    scale = [0.5, 1.0, 2.0]
+    gm = gridMatcher(mods, names, scale=scale)
+    dist, inds = gm.match(obs, k=5)
+    points = np.column_stack([mods[name] for name in names])/scale
+    x = np.column_stack([obs[name] for name in names])/scale
+    ref_dist, ref_inds = brute(points, x, 5)
+    assert np.array_equal(inds, ref_inds)
+    assert np.allclose(dist, ref_dist, rtol=1.0e-12, atol=0.)
+    assert np.array_equal(gm.ndim, np.isfinite(x).sum(axis=1))
+    assert (inds[5] == -1).all() and np.isinf(dist[5]).all()
+    # the same again from the cached trees, and one object at a time
+    assert np.array_equal(gm.match(obs, k=5)[1], inds)
+    one = dict([(name, obs[name][:1]) for name in names])
+    assert np.array_equal(gm.match(one, k=5)[1], inds[:1])
+
+def test_fewer_models_than_k():
+    rng = np.random.RandomState(22)
+    mods, obs = ratios(rng, 4), ratios(rng, 20)
+    mods['log_OIII_Hb'][1] = np.nan
+    gm = gridMatcher(mods, names[:2])
+    dist, inds = gm.match(obs, k=6)
+    points = np.column_stack([mods[name] for name in names[:2]])
+    x = np.column_stack([obs[name] for name in names[:2]])
+    ref_dist, ref_inds = brute(points, x, 6)
+    assert np.array_equal(inds, ref_inds)
+    assert np.allclose(dist, ref_dist, rtol=1.0e-12, atol=0.)
+    assert (inds[:, 3:] == -1).all() and np.isinf(dist[:, 3:]).all()
+
+def test_k1():
+    rng = np.random.RandomState(23)
+    mods, obs = ratios(rng, 300), ratios(rng, 50)
+    dist, inds = gridMatcher(mods, names).match(obs)
+    points = np.column_stack([mods[name] for name in names])
+    x = np.column_stack([obs[name] for name in names])
+    ref_dist, ref_inds = brute(points, x, 1)
+    assert inds.shape == (50, 1)
+    assert np.array_equal(inds, ref_inds)
+    assert np.allclose(dist, ref_dist, rtol=1.0e-12, atol=0.)
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import pytest
+import numpy as np
+from cloudyfsps.lineRatios import (named_lines, ratio_defs, registerRatio,
+                                   getLineIndex, lineColumns, ratioTable)
+
+###
+# ratioTable against the ratios as they were written out by hand in
+# modObj.load_lines, sdss.load_spec and vanzee.plot_bpt: the values must
+# be the same to the last bit
+###
+def same(a, b):
+    a, b = np.asarray(a), np.asarray(b)
+    assert a.shape == b.shape
+    assert np.array_equal(a, b, equal_nan=True)
+
+def model_lines(rng, n):
+    lines = dict([(name, 10.**rng.uniform(-3., 1., n)) for name in named_lines])
+    # a line Cloudy did not produce, and an object without Hb
+    lines['OI'][0] = 0.
+    lines['Hb'][1] = 0.
+    return lines
+
+def modobj_ratios(l):
+    # modObj.load_lines, before lineRatios
+    def logify(a, b):
+        return np.log10(a/b)
+    def logHa(x):
+        return np.log10(x/l['Ha'])
+    def logHb(x):
+        return np.log10(x/l['Hb'])
+    return {'HaHb':l['Ha']/l['Hb'],
+            'log_NII_Ha':logHa(l['NIIa']+l['NIIb']),
+            'log_SII_Ha':logHa(l['SIIa']+l['SIIb']),
+            'log_OIII_Hb':logHb(l['OIIIa']+l['OIIIb']),
+            'log_NIIa_Ha':logHa(l['NIIa']),
+            'log_NIIb_Ha':logHa(l['NIIb']),
+            'log_SIIa_Ha':logHa(l['SIIa']),
+            'log_SIIb_Ha':logHa(l['SIIb']),
+            'log_OIIIa_Hb':logHb(l['OIIIa']),
+            'log_OIIIb_Hb':logHb(l['OIIIb']),
+            'log_OIII_OII':logify(l['OIIIa']+l['OIIIb'], l['OIIa']+l['OIIb']),
+            'log_OIIIa_OII':logify(l['OIIIa'], l['OIIa']+l['OIIb']),
+            'log_OIIIb_OII':logify(l['OIIIb'], l['OIIa']+l['OIIb']),
+            'log_OI_Ha':logHa(l['OI']),
+            'log_NII_OII':logify(l['NIIa']+l['NIIb'], l['OIIa']+l['OIIb']),
+            'R23':logHb(l['OIIa']+l['OIIb']+l['OIIIa']+l['OIIIb'])}
+
+def test_model_ratios():
+    rng = np.random.RandomState(18)
+    lines = model_lines(rng, 200)
+    rt = ratioTable(lines)
+    with np.errstate(all='ignore'):
+        old = modobj_ratios(lines)
+    for name, val in old.items():
+        same(rt[name], val)
+    assert set(old) <= set(rt.names)
+    # no [O I] 6364 among the model lines
+    assert 'log_OIa_Ha' not in rt
+    with pytest.raises(KeyError):
+        rt['log_OIa_Ha']
+    with pytest.raises(KeyError):
+        rt['log_Foo_Ha']
+    # one model at a time, as modObj.ratios
+    for i in [0, 1, 7]:
+        one = ratioTable(dict([(k, v[i]) for k, v in lines.items()]))
+        for name in old:
+            same(one[name], rt[name][i])
+
+def test_line_columns():
+    rng = np.random.RandomState(19)
+    lam = np.sort(np.concatenate([rng.uniform(1.0e3, 1.0e4, 300),
+                                  [named_lines['Ha']+0.01]*2,
+                                  [named_lines['Hb']-0.5,
+                                   named_lines['Hb']+0.5]]))
+    flux = rng.rand(5, len(lam))
+    cols = lineColumns(flux, lam)
+    for name, wav in named_lines.items():
+        ind = np.argmin(np.abs(lam-wav))
+        assert getLineIndex(lam, {name:wav})[name] == ind
+        same(cols[name], flux[:,ind])
+    # unsorted wavelengths fall back to argmin
+    perm = rng.permutation(len(lam))
+    for name, ind in getLineIndex(lam[perm], named_lines).items():
+        assert ind == np.argmin(np.abs(lam[perm]-named_lines[name]))
+
+def test_sdss():
+    sdss = pytest.importorskip('cloudyfsps.astrodata.sdss')
+    import pkg_resources
+    data = np.load(pkg_resources.resource_filename(
+        'cloudyfsps.astrodata', 'data/sdss_data_ls.npz'))
+    i, = np.where((data['lineindex_cln'] == 4) | (data['lineindex_cln'] == 5))
+    def s(key):
+        return data['strength_'+key][i]
+    with np.errstate(all='ignore'):
+        old = {'log_OIII_OII':np.log10(s('OIII')/s('OII')),
+               'log_NII_OII':np.log10(s('NII')/s('OII')),
+               'log_OIII_Hb':np.log10(s('OIII')/s('Hb')),
+               'log_OIIIb_Hb':np.log10(s('OIIIb')/s('Hb')),
+               'log_NII_Ha':np.log10(s('NII')/s('Ha')),
+               'log_NIIb_Ha':np.log10(s('NIIb')/s('Ha')),
+               'log_SII_Ha':np.log10(s('SII')/s('Ha')),
+               'log_OI_Ha':np.log10(s('OI')/s('Ha')),
+               'log_OIa_Ha':np.log10(s('OIa')/s('Ha')),
+               'log_OII_Ha':np.log10(s('OII')/s('Ha')),
+               'HaHb':s('Ha')/s('Hb'),
+               'R23':np.log10((s('OII') + s('OIII'))/s('Hb'))}
+    spec = sdss.load_spec()
+    assert set(old) == set(sdss.sdss_ratios)
+    for name, val in old.items():
+        same(spec[name], val)
+
+def test_vanzee():
+    vanzee = pytest.importorskip('cloudyfsps.astrodata.vanzee')
+    d = vanzee.get_vz_lines()
+    rt = vanzee.vz_ratios(d)
+    # vanzee.plot_bpt, before lineRatios (lines relative to Hb)
+    same(rt['log_OIII_Hb'], np.log10(d['OIII']))
+    same(rt['log_NII_Ha'], np.log10(d['NII']/d['Ha']))
+    same(rt['log_SII_Ha'], np.log10(d['SII']/d['Ha']))
+    same(rt['log_OI_Ha'], np.log10(d['OI']/d['Ha']))
+    same(rt['log_OIII_OII'], np.log10(d['OIII']/d['OII']))
+    same(rt['log_NII_OII'], np.log10(d['NII']/d['OII']))
+    same(rt['log_NeIIIb_OII'], np.log10(d['NeIII']/d['OII']))
+    same(rt['R23'], np.log10(d['OII'] + d['OIII']))
+
+def test_register_and_groups():
+    rng = np.random.RandomState(20)
+    lines = model_lines(rng, 10)
+    try:
+        registerRatio('log_HeII_Hb', ['HeII'], ['Hb'])
+        registerRatio('NII_lin', ['NII'], log=False)
+        rt = ratioTable(lines)
+        with np.errstate(all='ignore'):
+            same(rt['log_HeII_Hb'], np.log10(lines['HeII']/lines['Hb']))
+        same(rt['NII_lin'], lines['NIIa']+lines['NIIb'])
+        assert 'log_HeII_Hb' in rt.all()
+    finally:
+        ratio_defs.pop('log_HeII_Hb')
+        ratio_defs.pop('NII_lin')
+    # a catalog's own doublet sum is used over its members
+    nii = lines['NIIa']+lines['NIIb']+1.
+    rt = ratioTable(dict(lines, NII=nii))
+    same(rt['log_NII_Ha'], np.log10(nii/lines['Ha']))
+    same(rt['log_NIIa_Ha'], np.log10(lines['NIIa']/lines['Ha']))
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import os
+from collections import OrderedDict
+import pytest
+import numpy as np
+
+pytest.importorskip('fsps')
+from cloudyfsps.cloudyParsers import readTable
+from cloudyfsps import outObj
+from cloudyfsps.outObj import modObj, allmods, _read_heat
+
+###
+# modObj and allmods on the synthetic grid of conftest.writeGrid
+###
+def parline(dir_, n, prefix='ZAU'):
+    return readTable(dir_+prefix+'.pars')[n-1]
+
+def test_failed_init_runs_again(grid_dir):
+    fname = grid_dir+'ZAU3.phys'
+    good = open(fname).read()
+    # no fillfac column: _init_phys fails after setting ne_all, Te, ...
+    bad = '\n'.join(['\t'.join(line.split('\t')[:-1])
+                     for line in good.rstrip('\n').split('\n')])+'\n'
+    open(fname, 'w').write(bad)
+    mod = modObj(grid_dir, 'ZAU', parline(grid_dir, 3))
+    with pytest.raises(ValueError):
+        mod.Te
+    assert '_init_phys' not in mod._loaded
+    for att in ['ne_all', 'nH_all', 'nenH', 'Te']:
+        assert att not in mod.__dict__
+    open(fname, 'w').write(good)
+    Te = readTable(fname, skip_header=1)[:,1]
+    assert np.array_equal(mod.Te, Te)
+    assert '_init_phys' in mod._loaded
+
+###
+# allmods snapshots, PREFIX.allmods.npz
+###
+read_all = dict(read_out=True, read_rad=True, read_emis=True,
+                read_heat=True, read_cool=True)
+
+def same(a, b):
+    '''
+    a == b for model attributes: dicts, arrays and scalars, NaN == NaN
+    '''
+    if isinstance(a, dict) or isinstance(b, dict):
+        return (isinstance(a, dict) and isinstance(b, dict) and
+                sorted(a) == sorted(b) and all([same(a[k], b[k]) for k in a]))
+    if a is None or b is None:
+        return a is None and b is None
+    a, b = np.asarray(a), np.asarray(b)
+    if a.shape != b.shape:
+        return False
+    if a.dtype.kind == 'O' or b.dtype.kind == 'O':
+        return all([same(x, y) for x, y in zip(a.ravel(), b.ravel())])
+    if a.dtype.kind in 'fc' or b.dtype.kind in 'fc':
+        return np.array_equal(a, b, equal_nan=True)
+    return np.array_equal(a, b)
+
+@pytest.fixture
+def parses(monkeypatch):
+    '''
+    counts the grids parsed from the model files
+    '''
+    calls = []
+    load_mods = allmods.load_mods
+    def counted(self, *args, **kwargs):
+        calls.append(1)
+        return load_mods(self, *args, **kwargs)
+    monkeypatch.setattr(allmods, 'load_mods', counted)
+    return calls
+
+def test_snapshot_round_trip(grid_dir, parses):
+    mods = allmods(grid_dir, 'ZAU', **read_all)
+    assert len(parses) == 1
+    assert os.path.exists(grid_dir+'ZAU.allmods.npz')
+    again = allmods(grid_dir, 'ZAU', **read_all)
+    assert len(parses) == 1
+    assert sorted(again.cols) == sorted(mods.cols)
+    for name in mods.cols:
+        assert same(again.cols[name], mods.cols[name]), name
+    assert again.loaded == mods.loaded
+    assert again.unstored == mods.unstored
+    assert np.array_equal(again.line_flux, mods.line_flux)
+    assert np.array_equal(again.line_lam, mods.line_lam)
+    for i in range(mods.nmods):
+        for name in mods._readers:
+            assert same(getattr(again.mods[i], name),
+                        getattr(mods.mods[i], name)), name
+    assert same(again.Te, mods.Te)
+
+def test_snapshot_touched_file(grid_dir, parses):
+    allmods(grid_dir, 'ZAU', **read_all)
+    fname = grid_dir+'ZAU5.cool'
+    st = os.stat(fname)
+    os.utime(fname, (st.st_atime, st.st_mtime+10.))
+    allmods(grid_dir, 'ZAU', **read_all)
+    assert len(parses) == 2
+    # written again, so valid for the touched file
+    allmods(grid_dir, 'ZAU', **read_all)
+    assert len(parses) == 2
+
+def test_snapshot_version(grid_dir, parses, monkeypatch):
+    allmods(grid_dir, 'ZAU', read_out=True)
+    monkeypatch.setattr(outObj, '_snapshot_version',
+                        outObj._snapshot_version+1)
+    allmods(grid_dir, 'ZAU', read_out=True)
+    assert len(parses) == 2
+
+def test_snapshot_missing_product(grid_dir, parses):
+    allmods(grid_dir, 'ZAU', read_out=True)
+    allmods(grid_dir, 'ZAU', read_out=True, read_cool=True)
+    assert len(parses) == 2
+    allmods(grid_dir, 'ZAU', read_out=True)
+    assert len(parses) == 2
+
+def test_snapshot_not_written(grid_dir):
+    mods = allmods(grid_dir, 'ZAU', read_out=True, snapshot=False)
+    assert not os.path.exists(grid_dir+'ZAU.allmods.npz')
+    with pytest.warns(UserWarning, match='could not write'):
+        mods.save_snapshot(grid_dir+'missing/', 'ZAU')
+
+###
+# mods.mods[i], a modView over the columns, against a modObj parsed
+# directly from the files
+###
+def direct(dir_, n, **kwargs):
+    return modObj(dir_, 'ZAU', parline(dir_, n), **kwargs)
+
+@pytest.mark.parametrize('snapshot', [False, True])
+def test_modView_attributes(grid_dir, snapshot):
+    # a heating agent only model 4 has, so heatfracs keys differ
+    fname = grid_dir+'ZAU4.heat'
+    heat = open(fname).read()
+    assert 'FeBF' in heat
+    open(fname, 'w').write(heat.replace('FeBF', 'Fe 2'))
+    mods = allmods(grid_dir, 'ZAU', snapshot=snapshot, **read_all)
+    if snapshot:
+        # from PREFIX.allmods.npz this time
+        mods = allmods(grid_dir, 'ZAU', **read_all)
+    # ragged zone arrays are flat columns, dicts are attr/key columns
+    assert 'Te@flat' in mods.cols and 'ion_arr/O@flat' in mods.cols
+    assert 'heatfracs@dict' in mods.cols
+    for i, view in enumerate(mods.mods):
+        mod = direct(grid_dir, i+1, products=mods.products, **read_all)
+        names = [name for name in mod.__dict__ if not name.startswith('_')
+                 and name not in outObj._skip_state]
+        assert 'heatfracs' in names and 'Te' in names
+        for name in names:
+            assert same(getattr(view, name), getattr(mod, name)), name
+        assert np.array_equal(view.line_flu, mod.line_flu)
+        # every attribute came from the columns
+        assert view._obj is None
+    lens = [len(view.Te) for view in mods.mods]
+    assert len(set(lens)) > 1
+    assert 'Fe 2' in mods.mods[3].heatfracs
+    assert 'Fe 2' not in mods.mods[2].heatfracs
+
+def test_modView_fallback(grid_dir):
+    mods = allmods(grid_dir, 'ZAU', read_out=True, snapshot=False)
+    view, mod = mods.mods[2], direct(grid_dir, 3)
+    assert view._obj is None
+    # not loaded by allmods: read by the rebuilt modObj from the files
+    assert same(view.Te, mod.Te)
+    assert isinstance(view._obj, modObj)
+    assert same(view.heatfracs, mod.heatfracs)
+    label = str(mod.emis_labels[0])
+    assert same(view.get_emis_vol(label), mod.get_emis_vol(label))
+    # not stored: the raw .out lines are read again
+    assert view.out == mod.out
+    assert same(view.Qh, mod.Qh)
+
+###
+# _read_heat against the dict-based parser it replaced
+###
+def old_read_heat(fname):
+    htots, outfs, heat_labs = [], [], []
+    for line in open(fname):
+        if line[0] == '#':
+            continue
+        lps = line.split('\n')[0].split('\t')
+        htots.append(lps[2])
+        x = lps[4::]
+        outfs.append(dict([(k, float(v)) for k, v in zip(x[0::2], x[1::2])]))
+        for lab in x[0::2]:
+            if lab not in heat_labs:
+                heat_labs.append(lab)
+    hf = OrderedDict([(lab, np.array([outf.get(lab, 0.0) for outf in outfs]))
+                      for lab in heat_labs])
+    return np.array([float(h) for h in htots]), hf
+
+def same_heat(new, old):
+    return (np.array_equal(new[0], old[0]) and list(new[1]) == list(old[1])
+            and all([np.array_equal(new[1][k], old[1][k]) for k in old[1]]))
+
+def test_read_heat_grid(synth_grid):
+    for n in range(1, 9):
+        fname = '{0}ZAU{1}.heat'.format(synth_grid, n)
+        assert same_heat(_read_heat(fname), old_read_heat(fname))
+
+def test_read_heat_cases(tmp_path):
+    fname = str(tmp_path/'x.heat')
+    head = '#depth\tTe\tHtot\tCtot\theat fracs\n'
+    # an agent listed twice in a zone (the last fraction is kept),
+    # agents missing from some zones, a single agent
+    open(fname, 'w').write(head+
+        '1\t2\t3.5e-20\t3e-20\tH  1\t0.5\tHe 1\t0.25\tH  1\t0.7\n'
+        '2\t2\t4e-20\t3e-20\tFe 2\t0.1\tHe 1\t0.9\n'
+        '3\t2\t5e-20\t1\tC  1\t0.3\n')
+    Htots, hf = _read_heat(fname)
+    assert same_heat((Htots, hf), old_read_heat(fname))
+    assert np.array_equal(hf['H  1'], [0.7, 0., 0.])
+    # a label without a fraction after it: the old parser made it an
+    # agent with 0 in every zone, _read_heat leaves it out
+    open(fname, 'w').write(head+
+        '1\t2\t3.5e-20\t3e-20\tH  1\t0.5\tGrn \n'
+        '2\t2\t4e-20\t3e-20\tH  1\t0.6\n')
+    Htots, hf = _read_heat(fname)
+    old = old_read_heat(fname)
+    assert list(old[1]) == ['H  1', 'Grn ']
+    assert not old[1]['Grn '].any()
+    del old[1]['Grn ']
+    assert same_heat((Htots, hf), old)
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import pytest
+import numpy as np
+
+pytest.importorskip('fsps')
+from cloudyfsps.outObj import _scan_out, parseOut, sextract, line_cool
+
+###
+# _scan_out + parseOut against the line-by-line scan and sextract calls
+# of the old modObj._read_out (copied below)
+###
+def old_scan(filename):
+    out = {}
+    file_ = open(filename, 'r')
+    for line in file_:
+        line = line.split('\n')[0]
+        if line[0:8] == ' ####  1':
+            out['###First'] = line
+        elif line[0:5] == ' ###':
+            out['###Last'] = line
+        elif 'Hi-Con' in line:
+            for i in range(7):
+                out['SED' + str(i+1)] = next(file_)
+        elif line[0:15] == ' IONIZE PARMET:':
+            out['INZ'] = line
+        elif 'H :' in line:
+            out['gascomp'] = line
+        elif 'Dust to gas ratio' in line:
+            out['dust'] = line
+        elif 'ENERGY BUDGET' in line:
+            out['energy'] = line
+        elif 'Cooling:' in line:
+            out['cool'] = line
+        elif 'Heating:' in line:
+            out['heat'] = line
+        elif line[0:5] == ' HFBc':
+            out['HFBc'] = line
+        elif 'The geometry is' in line:
+            out['geometry'] = line
+    file_.close()
+    return out
+
+def old_bands(out, name):
+    '''
+    Qarr or Phiarr as the old _read_out set it; True if it was complete
+    '''
+    bands = ['1.0-1.8', '1.8-4.0', '4.0-20', '20--']
+    arr = np.zeros(4)
+    try:
+        for i, band in enumerate(bands):
+            nxt = ('{0}({1}):'.format(name, bands[i+1]) if i < 3
+                   else 'Ion pht')
+            arr[i] = float(sextract(out['SED2'], '{0}({1}):'.format(name,
+                                                                    band),
+                                    nxt))
+        return pow(10., arr), True
+    except:
+        return arr, False
+
+def old_fields(out):
+    d = dict()
+    try:
+        d['H_Rec_Lum'] = float(sextract(sextract(out['HFBc'], 'HFBc', 18),
+                                        9, 8))
+    except:
+        d['H_Rec_Lum'] = 0.0
+    d['strom_logU'] = float(sextract(out['INZ'], 'U(sp):', 'Q(ion):'))
+    d['Qarr'], q_ok = old_bands(out, 'Q')
+    d['Phiarr'], phi_ok = old_bands(out, 'phi')
+    d['input_lum'] = False if phi_ok else (True if q_ok else None)
+    for key, keyattr in line_cool:
+        try:
+            if key[0] == 'H':
+                val = float(sextract(sextract(out['cool'], key, 14), ':', 5))
+            else:
+                val = float(sextract(out['cool'], key, 5))
+        except:
+            val = 0.0
+        d['Cool_'+keyattr] = val
+    try:
+        d['Heat_BF'] = float(sextract(sextract(out['heat'], 'BFH1', 14),
+                                      ':', 5))
+    except:
+        d['Heat_BF'] = 0.0
+    d['Heat'] = float(sextract(out['energy'], 'Heat:', 'Coolg:'))
+    d['Cool'] = float(sextract(out['energy'], 'Coolg:', 'Error:'))
+    d['RecLin'] = float(sextract(out['energy'], 'Rec Lin:', 8))
+    d['gasC'] = float(sextract(out['gascomp'], 'C :', 8))
+    d['gasN'] = float(sextract(out['gascomp'], 'N :', 8))
+    d['gasO'] = float(sextract(out['gascomp'], 'O :', 8))
+    if 'dust' in out:
+        d['DGR'] = float(sextract(out['dust'], '(by mass):', ','))
+        d['Av_ex'] = float(sextract(out['dust'], 'AV(ext):', '(pnt)'))
+        d['Av_pt'] = float(sextract(out['dust'], ' (pnt):'))
+    else:
+        d['DGR'] = d['Av_ex'] = d['Av_pt'] = None
+    return d
+
+def check(fname):
+    out = old_scan(fname)
+    assert _scan_out(fname) == out
+    rec = parseOut(out)
+    for key, val in old_fields(out).items():
+        if val is None:
+            assert rec.__getattribute__(key) is None, key
+        else:
+            assert np.array_equal(val, rec.__getattribute__(key)), key
+    return rec
+
+def iteration(it):
+    '''
+    the summary lines of iteration it
+    '''
+    return [' ####  1  Te: 1.000e+04 Hden: 1.000e+02\n',
+            ' ####  2  Te: 9.000e+03 Hden: 1.000e+02\n',
+            ' IONIZE PARMET:  U(1)= -2.000  U(sp): {0:.3f}  Q(ion):'
+            '  50.000\n'.format(-2.1-0.01*it),
+            '         H :  0.0000  He: -1.0200  C : {0:.4f}  N : -4.1700'
+            '  O : -3.3100\n'.format(-3.5-0.01*it),
+            ' Dust to gas ratio (by mass): 6.5e-03, AV(ext): 0.1{0}'
+            ' (pnt): 0.456\n'.format(it),
+            ' ENERGY BUDGET:  Heat: {0:.3f}  Coolg: 38.120  Error:  0.1%'
+            '  Rec Lin: 37.500  F-F  H 0.000\n'.format(38.0+it),
+            ' Cooling: HFBc  1.2345e+35:0.123 HFFc  2.3456e+34:0.045 Clin'
+            ' 912.000A:0.012 N  2 6584.00A:0.034 S II 6731.00A:0.021 S II'
+            ' 6716.00A:0.028 TOTL 3727.00A:0.111 S  3 9532.00A:0.043 O  3'
+            ' 5007.00A:0.2{0} O  3 4959.00A:0.074\n'.format(it),
+            ' Heating: BFH1  3.4567e+35:0.8{0} BFHe 1.0e+34:0.100\n'.format(it),
+            ' HFBc'+' '*9+'1.2{0}e+35  4.56e+34\n'.format(it),
+            ' The geometry is spherical.\n']
+
+q_line = ('  Q(1.0-1.8):  49.900 Q(1.8-4.0):  49.200 Q(4.0-20):  47.900'
+          ' Q(20--):  44.000 Ion pht flx:1.000E+12\n')
+phi_line = ('  phi(1.0-1.8):  12.900 phi(1.8-4.0):  12.200 phi(4.0-20):'
+            '  10.900 phi(20--):   7.000 Ion pht flx:1.000E+12\n')
+
+def write(tmp_path, sed=None, niter=3, tail=()):
+    '''
+    a .out file with niter iterations; sed is the lines after Hi-Con
+    (None for no Hi-Con block)
+    '''
+    text = [' '*20+'Cloudy 17.01\n', ' * input command\n']
+    if sed is not None:
+        text += [' '*20+'Hi-Con\n']+list(sed)
+    for it in range(niter):
+        text += iteration(it)
+    text += list(tail)
+    fname = str(tmp_path/'x.out')
+    open(fname, 'w').write(''.join(text))
+    return fname
+
+def sed_block(line2):
+    return [' Hi-Con SED summary\n', line2]+[' SED line {0}\n'.format(i+3)
+                                             for i in range(5)]
+
+def test_grid(synth_grid):
+    for n in range(1, 9):
+        rec = check('{0}ZAU{1}.out'.format(synth_grid, n))
+        assert rec.input_lum is True
+
+def test_iterations(tmp_path):
+    # the last iteration's lines are kept
+    rec = check(write(tmp_path, sed_block(q_line), niter=4))
+    assert rec.strom_logU == -2.13
+    assert rec.Av_ex == 0.13
+    assert rec.Heat == 41.0
+
+def test_phi(tmp_path):
+    rec = check(write(tmp_path, sed_block(phi_line)))
+    assert rec.input_lum is False
+    assert np.allclose(rec.Phiarr, 10.**np.array([12.9, 12.2, 10.9, 7.0]))
+    assert not rec.Qarr.any()
+
+def test_missing_sed(tmp_path):
+    # no Hi-Con block, so no SED2
+    rec = check(write(tmp_path))
+    assert rec.input_lum is None
+    assert not rec.Qarr.any() and not rec.Phiarr.any()
+    # SED2 without Q(20--): the log values before the band that needs it
+    rec = check(write(tmp_path, sed_block(q_line.split(' Q(20--)')[0]+'\n')))
+    assert rec.input_lum is None
+    assert np.array_equal(rec.Qarr, [49.9, 49.2, 0., 0.])
+
+def test_sed_lines_with_keys(tmp_path):
+    # lines of the SED block are not read as summary lines, even when
+    # they look like them
+    sed = [' Hi-Con SED summary\n', q_line,
+           '         H :  9.9999  He: -9.0000  C : -9.9900  N : -9.9900'
+           '  O : -9.9900\n',
+           ' Cooling: HFBc  9.9e+35:0.999\n',
+           ' ENERGY BUDGET:  Heat: 99.000  Coolg: 99.000  Error:  9.9%\n',
+           ' SED line 6\n', ' SED line 7\n']
+    rec = check(write(tmp_path, sed, niter=1))
+    assert rec.gasC == -3.5
+    rec = check(write(tmp_path, sed, niter=0, tail=iteration(5)[2:]))
+    assert rec.Heat == 43.0
+
+def test_missing_dust(tmp_path):
+    lines = [line for line in iteration(1) if 'Dust' not in line]
+    rec = check(write(tmp_path, sed_block(q_line), niter=0, tail=lines))
+    assert rec.DGR is None and rec.Av_ex is None and rec.Av_pt is None
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from __future__ import (division, print_function, absolute_import,
+                        unicode_literals)
+
+import shutil
+import pytest
+import numpy as np
+from cloudyfsps.cloudyParsers import readTable
+from cloudyfsps.radialStore import (buildRadial, segmentIds, segmentSum,
+                                    segmentArgmin)
+
+###
+# the segment reductions against a loop over the segments, and a store
+# built from the synthetic grid against modObj
+###
+def random_segments(rng, nseg=200, ndim=None):
+    '''
+    values and offsets of nseg segments, a fifth of them empty; values
+    are small integers, so segments have ties
+    '''
+    counts = rng.randint(0, 8, nseg)
+    counts[rng.rand(nseg) < 0.2] = 0
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    shape = (offsets[-1],) if ndim is None else (offsets[-1], ndim)
+    return rng.randint(0, 4, shape).astype(float), offsets
+
+def segments(values, offsets):
+    return [values[offsets[i]:offsets[i+1]] for i in range(len(offsets)-1)]
+
+def test_segmentIds():
+    offsets = np.array([0, 2, 2, 5, 6])
+    assert np.array_equal(segmentIds(offsets), [0, 0, 2, 2, 2, 3])
+
+@pytest.mark.parametrize('ndim', [None, 3])
+def test_segmentSum(ndim):
+    rng = np.random.RandomState(0)
+    values, offsets = random_segments(rng, ndim=ndim)
+    values += rng.rand(*values.shape)
+    want = [seg.sum(axis=0) for seg in segments(values, offsets)]
+    got = segmentSum(values, offsets)
+    assert got.shape == (len(offsets)-1,)+values.shape[1:]
+    assert np.allclose(got, want, rtol=1.0e-12, atol=0.)
+    assert (got[np.diff(offsets) == 0] == 0).all()
+
+def test_segmentSum_all_empty():
+    got = segmentSum(np.zeros(0), [0, 0, 0])
+    assert np.array_equal(got, [0., 0.])
+
+def test_segmentArgmin():
+    rng = np.random.RandomState(1)
+    values, offsets = random_segments(rng)
+    values[rng.rand(len(values)) < 0.1] = np.nan
+    want = [offsets[i]+np.argmin(seg) if len(seg) else -1
+            for i, seg in enumerate(segments(values, offsets))]
+    assert np.array_equal(segmentArgmin(values, offsets), want)
+
+def test_segmentArgmin_cases():
+    nan = np.nan
+    values = np.array([2., 1., 1., 3., nan, 0., nan, 5., 5.])
+    offsets = [0, 4, 4, 7, 9, 9]
+    # first of tied minima, first NaN, empty segments -1
+    assert np.array_equal(segmentArgmin(values, offsets), [1, -1, 4, 7, -1])
+
+@pytest.fixture(scope='module')
+def store(synth_grid, tmp_path_factory):
+    dir_ = str(tmp_path_factory.mktemp('radial')/'grid')+'/'
+    shutil.copytree(synth_grid, dir_)
+    modnums = readTable(dir_+'ZAU.pars')[:,0]
+    return dir_, buildRadial(dir_, 'ZAU', modnums)
+
+def test_store_columns(store):
+    dir_, rs = store
+    assert rs.nmods == 8
+    for i in range(rs.nmods):
+        rad = readTable('{0}ZAU{1}.rad'.format(dir_, i+1), skip_header=1)
+        phys = readTable('{0}ZAU{1}.phys'.format(dir_, i+1), skip_header=1)
+        assert rs.n_zones[i] == len(rad)
+        assert np.array_equal(rs.model(i, 'radius'), rad[:,1])
+        assert np.array_equal(rs.model(i, 'Te'), phys[:,1])
+        assert np.array_equal(rs.zone_model[rs.offsets[i]:rs.offsets[i+1]],
+                              np.full(len(rad), i))
+
+def test_front(store):
+    dir_, rs = store
+    for ele, ion in [('H', 1), ('He', 1), ('O', 2)]:
+        front = rs.front(ele, ion)
+        for i in range(rs.nmods):
+            frac = np.asarray(rs.model(i, 'ion_'+ele))[:, ion]
+            assert front[i] == rs.offsets[i]+np.argmin(np.abs(frac-0.5))
+
+def test_front_modObj(store):
+    pytest.importorskip('fsps')
+    from cloudyfsps.outObj import modObj
+    dir_, rs = store
+    pars = readTable(dir_+'ZAU.pars')
+    indH, indHe = rs.front('H'), rs.front('He')
+    for i in range(rs.nmods):
+        mod = modObj(dir_, 'ZAU', pars[i], read_rad=True)
+        assert indH[i]-rs.offsets[i] == mod.indH
+        assert indHe[i]-rs.offsets[i] == mod.indHe
+        assert rs['Te'][indH[i]] == mod.Te[mod.indH]